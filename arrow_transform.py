@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+Vectorized transform of dataset record batches into product documents.
+Validates product names and categories, splits categories and labels and builds the
+search_string and scoring fields with Arrow compute functions instead of a Python loop per record.
+The output is identical to is_valid_product() / build_product() in download_products.
+"""
+
+import sys
+from functools import lru_cache
+from typing import Tuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# Product document fields in the order used by build_product(), with their source columns
+PRODUCT_FIELDS = [
+    ('_id', 'code'),
+    ('lang', 'lang'),
+    ('product_name', 'product_name'),
+    ('brands', 'brands'),
+    ('food_groups_tags', 'food_groups_tags'),
+    ('product_quantity_unit', 'product_quantity_unit'),
+    ('product_quantity', 'product_quantity'),
+    ('quantity', 'quantity'),
+    ('categories_tags', 'categories_tags'),
+    ('categories', None),
+    ('labels_tags', 'labels_tags'),
+    ('labels', None),
+    ('popularity_key', 'popularity_key'),
+    ('popularity_tags', 'popularity_tags'),
+    ('nutriscore_grade', 'nutriscore_grade'),
+    ('nutriscore_score', 'nutriscore_score'),
+    ('search_string', None),
+    ('given_name', None),
+    ('scoring', None),
+]
+
+# Text columns appended to the product names in the search_string, in order
+SEARCH_STRING_COLUMNS = ['quantity', 'brands', 'categories', 'labels']
+
+
+class ArrowTransformResult:
+    """Products and aggregate contributions of one transformed record batch."""
+
+    def __init__(self):
+        self.products = []  # (position, product) tuples, without content_hash
+        self.fallback_records = []  # (position, record) tuples to transform per record
+        self.skipped_codes = []
+        self.food_groups = set()
+        self.categories = set()
+        self.last_categories = {}  # last category -> (full path, position)
+        self.langs = {}
+
+
+def supports_table(table: pa.Table) -> bool:
+    """
+    Check whether a record batch has the column types the vectorized transform expects.
+
+    Args:
+        table: Record batch as a pyarrow.Table
+
+    Returns:
+        bool: True if transform_table() can process the table
+    """
+    schema = table.schema
+    for name in ['code', 'lang'] + SEARCH_STRING_COLUMNS:
+        if name in schema.names and not _is_string(schema.field(name).type):
+            return False
+
+    if 'product_name' in schema.names:
+        names_type = schema.field('product_name').type
+        if not (pa.types.is_list(names_type) or pa.types.is_large_list(names_type)):
+            return False
+        item_type = names_type.value_type
+        if not pa.types.is_struct(item_type) or item_type.get_field_index('text') < 0:
+            return False
+        if not _is_string(item_type.field('text').type):
+            return False
+
+    if 'food_groups_tags' in schema.names:
+        tags_type = schema.field('food_groups_tags').type
+        if not (pa.types.is_list(tags_type) or pa.types.is_large_list(tags_type)):
+            return False
+
+    if 'categories_tags' in schema.names:
+        tags_type = schema.field('categories_tags').type
+        if not (pa.types.is_list(tags_type) or pa.types.is_large_list(tags_type)):
+            return False
+        if not _is_string(tags_type.value_type):
+            return False
+    return True
+
+
+def transform_table(table: pa.Table, start_position: int = 0, positions=None) -> ArrowTransformResult:
+    """
+    Validate and transform a record batch into product documents.
+
+    Arrow's lowercase mapping differs from Python's str.lower() for a few characters
+    (the context-dependent final sigma and code points from newer Unicode versions).
+    Rows containing them are returned as fallback_records so the caller can transform
+    them per record and keep the output identical.
+
+    Args:
+        table: Record batch with the dataset columns (see supports_table())
+        start_position: Dataset position of the first row
+        positions: Dataset positions of the rows, for rows that are not consecutive
+                   (e.g. one language of a batch); overrides start_position
+
+    Returns:
+        ArrowTransformResult with the valid products, skipped codes and aggregates
+    """
+    result = ArrowTransformResult()
+    if positions is None:
+        positions = np.arange(start_position, start_position + table.num_rows)
+    else:
+        positions = np.asarray(positions, dtype=np.int64)
+
+    fallback = _lowercase_fallback_mask(table)
+    if fallback.any():
+        fallback_rows = table.filter(pa.array(fallback))
+        result.fallback_records = list(zip(positions[fallback].tolist(), fallback_rows.to_pylist()))
+        table = table.filter(pa.array(~fallback))
+        positions = positions[~fallback]
+
+    # Product names: non-blank names validate the record, unique non-empty names go to the search_string
+    name_texts, name_rows = _flatten_names(table)
+    valid = _rows_with(name_rows[_is_not_blank(name_texts)], table.num_rows)
+
+    # Categories: at least one non-blank category without ':' validates the record
+    categories = _column(table, 'categories')
+    category_values, category_rows = _split_and_strip(categories)
+    category_lengths = pc.utf8_length(category_values).to_numpy(zero_copy_only=False)
+    has_colon = pc.match_substring(category_values, ':').to_numpy(zero_copy_only=False)
+    path_categories = (category_lengths > 0) & ~has_colon
+    valid &= _rows_with(category_rows[path_categories], table.num_rows)
+
+    result.skipped_codes = _column(table, 'code').filter(pa.array(~valid)).to_pylist()
+    if not valid.any():
+        return result
+
+    row_map = np.cumsum(valid) - 1  # Index of each valid row among the valid rows
+    table = table.filter(pa.array(valid))
+    positions = positions[valid].tolist()
+    num_rows = table.num_rows
+
+    keep = valid[name_rows]
+    name_texts, name_rows = name_texts.filter(pa.array(keep)), row_map[name_rows[keep]]
+    keep = valid[category_rows]
+    category_values, category_rows = category_values.filter(pa.array(keep)), row_map[category_rows[keep]]
+    category_lengths, path_categories = category_lengths[keep], path_categories[keep]
+
+    labels = _column(table, 'labels')
+    label_values, label_rows = _split_and_strip(labels)
+
+    # Valid rows always have a category without ':', so given_name is their last such category
+    path_values = category_values.filter(pa.array(path_categories))
+    path_rows = category_rows[path_categories]
+    last_indices = np.cumsum(np.bincount(path_rows, minlength=num_rows)) - 1
+    last_categories = path_values.take(pa.array(last_indices))
+
+    product_lists = {
+        'categories': _build_lists(category_values, category_rows, num_rows).to_pylist(),
+        'labels': _build_lists(label_values, label_rows, num_rows).to_pylist(),
+        'search_string': _build_search_strings(table, name_texts, name_rows).to_pylist(),
+        'given_name': last_categories.to_pylist(),
+        'scoring': _build_scoring_fields(table, name_texts, name_rows, category_values, category_rows,
+                                         label_values, label_rows).to_pylist(),
+    }
+    columns = [product_lists[field] if source is None else _column(table, source).to_pylist()
+               for field, source in PRODUCT_FIELDS]
+    field_names = [field for field, _ in PRODUCT_FIELDS]
+    result.products = [(position, dict(zip(field_names, values)))
+                       for position, values in zip(positions, zip(*columns))]
+
+    # Aggregates
+    result.categories = set(pc.unique(category_values.filter(pa.array(category_lengths > 0))).to_pylist())
+    paths = pc.binary_join(_build_lists(path_values, path_rows, num_rows), ' > ').to_pylist()
+    for last_category, full_path, position in zip(product_lists['given_name'], paths, positions):
+        result.last_categories[last_category] = (full_path, position)
+
+    if 'food_groups_tags' in table.column_names:
+        food_groups = pc.list_flatten(table.column('food_groups_tags').combine_chunks())
+        result.food_groups = set(pc.unique(food_groups).to_pylist())
+
+    if 'lang' in table.column_names:
+        for entry in pc.value_counts(table.column('lang')).to_pylist():
+            result.langs[entry['values']] = entry['counts']
+    else:
+        result.langs['None_LANG_ATTRIBUTE'] = num_rows
+    return result
+
+
+def _is_string(data_type) -> bool:
+    """Check for a (large) string type, or a null type from an all-null column."""
+    return pa.types.is_string(data_type) or pa.types.is_large_string(data_type) or pa.types.is_null(data_type)
+
+
+def _column(table: pa.Table, name: str) -> pa.Array:
+    """Return a column as a single array, or an all-null string array if the column is missing."""
+    if name not in table.column_names:
+        return pa.nulls(table.num_rows, type=pa.string())
+    column = table.column(name)
+    if pa.types.is_null(column.type):
+        return pa.nulls(table.num_rows, type=pa.string())
+    return column.combine_chunks()
+
+
+def _flatten_names(table: pa.Table) -> Tuple[pa.Array, np.ndarray]:
+    """Return the product name texts of all rows and the row index of each text."""
+    if 'product_name' not in table.column_names or table.num_rows == 0:
+        return pa.array([], type=pa.string()), np.array([], dtype=np.int64)
+    names = _column(table, 'product_name')
+    texts = pc.struct_field(pc.list_flatten(names), 'text')
+    return texts, pc.list_parent_indices(names).to_numpy()
+
+
+def _split_and_strip(values: pa.Array) -> Tuple[pa.Array, np.ndarray]:
+    """
+    Split comma-separated strings and strip each part, like [c.strip() for c in s.split(',')].
+
+    Null and empty strings produce no parts.
+
+    Returns:
+        Tuple of (stripped parts, row index of each part)
+    """
+    if len(values) == 0:
+        return pa.array([], type=pa.string()), np.array([], dtype=np.int64)
+    present = pc.fill_null(pc.greater(pc.utf8_length(values), 0), False).to_numpy(zero_copy_only=False)
+    parts = pc.split_pattern(values, ',')
+    rows = pc.list_parent_indices(parts).to_numpy()
+    stripped = pc.utf8_trim_whitespace(pc.list_flatten(parts))
+    keep = present[rows]
+    return stripped.filter(pa.array(keep)), rows[keep]
+
+
+def _is_not_blank(texts: pa.Array) -> np.ndarray:
+    """Mask of strings that are not null and not only whitespace."""
+    not_blank = pc.greater(pc.utf8_length(pc.utf8_trim_whitespace(texts)), 0)
+    return pc.fill_null(not_blank, False).to_numpy(zero_copy_only=False)
+
+
+def _rows_with(rows: np.ndarray, num_rows: int) -> np.ndarray:
+    """Mask of rows that appear at least once in `rows`."""
+    return np.bincount(rows, minlength=num_rows)[:num_rows] > 0
+
+
+def _build_lists(values: pa.Array, rows: np.ndarray, num_rows: int) -> pa.Array:
+    """Group values into one list per row, given the (sorted) row index of each value."""
+    offsets = np.zeros(num_rows + 1, dtype=np.int32)
+    np.cumsum(np.bincount(rows, minlength=num_rows), out=offsets[1:])
+    return pa.ListArray.from_arrays(pa.array(offsets), values)
+
+
+def _build_search_strings(table: pa.Table, name_texts: pa.Array, name_rows: np.ndarray) -> pa.Array:
+    """
+    Build the search_string of every row: unique product names, quantity, brands,
+    categories and labels joined with spaces, lowercased, with commas replaced by spaces.
+    """
+    num_rows = table.num_rows
+
+    names = pc.binary_join(_unique_lists(name_texts, name_rows, num_rows), ' ')
+
+    components = [_empty_to_null(names)]
+    components += [_empty_to_null(_column(table, name).cast(pa.string())) for name in SEARCH_STRING_COLUMNS]
+    joined = pc.binary_join_element_wise(*components, ' ', null_handling='skip')
+    return pc.replace_substring(pc.utf8_lower(joined), ',', ' ')
+
+
+def _build_scoring_fields(table: pa.Table, name_texts: pa.Array, name_rows: np.ndarray,
+                          category_values: pa.Array, category_rows: np.ndarray,
+                          label_values: pa.Array, label_rows: np.ndarray) -> pa.Array:
+    """
+    Build the scoring fields of every row, like utils.prepare_scoring_fields(): lowercased
+    unique names, brands, quantity, non-empty categories and labels, and cleaned category tags.
+    """
+    num_rows = table.num_rows
+    tag_texts, tag_rows = _flatten_category_tags(table)
+    present = pc.fill_null(pc.greater(pc.utf8_length(tag_texts), 0), False).to_numpy(zero_copy_only=False)
+    tag_texts, tag_rows = tag_texts.filter(pa.array(present)), tag_rows[present]
+    tag_texts = pc.replace_substring(pc.replace_substring_regex(tag_texts, '^[a-z]{2}:', ''), '-', ' ')
+
+    fields = {
+        'names': _unique_lists(pc.utf8_lower(name_texts), name_rows, num_rows),
+        'brands': pc.utf8_lower(pc.fill_null(_column(table, 'brands').cast(pa.string()), '')),
+        'quantity': pc.utf8_lower(pc.fill_null(_column(table, 'quantity').cast(pa.string()), '')),
+        'categories': _non_empty_lists(pc.utf8_lower(category_values), category_rows, num_rows),
+        'category_tags': _build_lists(pc.utf8_lower(tag_texts), tag_rows, num_rows),
+        'labels': _non_empty_lists(pc.utf8_lower(label_values), label_rows, num_rows),
+    }
+    return pa.StructArray.from_arrays(list(fields.values()), names=list(fields))
+
+
+def _flatten_category_tags(table: pa.Table) -> Tuple[pa.Array, np.ndarray]:
+    """Return the category tags of all rows and the row index of each tag."""
+    if 'categories_tags' not in table.column_names or table.num_rows == 0:
+        return pa.array([], type=pa.string()), np.array([], dtype=np.int64)
+    tags = table.column('categories_tags').combine_chunks()
+    return pc.list_flatten(tags).cast(pa.string()), pc.list_parent_indices(tags).to_numpy()
+
+
+def _unique_lists(texts: pa.Array, rows: np.ndarray, num_rows: int) -> pa.Array:
+    """Group the unique non-empty texts of each row into a list, in order of first occurrence."""
+    non_empty = pc.fill_null(pc.greater(pc.utf8_length(texts), 0), False).to_numpy(zero_copy_only=False)
+    indices = np.flatnonzero(non_empty)
+    first = pa.table({'row': rows[indices], 'text': texts.take(pa.array(indices)), 'index': indices})
+    first = first.group_by(['row', 'text'], use_threads=False).aggregate([('index', 'min')])
+    unique = np.sort(first.column('index_min').to_numpy())
+    return _build_lists(texts.take(pa.array(unique)), rows[unique], num_rows)
+
+
+def _non_empty_lists(values: pa.Array, rows: np.ndarray, num_rows: int) -> pa.Array:
+    """Group the non-empty values of each row into a list."""
+    non_empty = pc.fill_null(pc.greater(pc.utf8_length(values), 0), False).to_numpy(zero_copy_only=False)
+    return _build_lists(values.filter(pa.array(non_empty)), rows[non_empty], num_rows)
+
+
+def _empty_to_null(values: pa.Array) -> pa.Array:
+    """Replace empty strings with nulls so they are skipped when joining."""
+    return pc.if_else(pc.equal(values, ''), pa.scalar(None, type=values.type), values)
+
+
+def _lowercase_fallback_mask(table: pa.Table) -> np.ndarray:
+    """Mask of rows whose search_string or scoring text Arrow would lowercase differently from Python."""
+    mask = np.zeros(table.num_rows, dtype=bool)
+    pattern = _lowercase_fallback_pattern()
+
+    texts, rows = _flatten_names(table)
+    matches = pc.fill_null(pc.match_substring_regex(texts, pattern), False).to_numpy(zero_copy_only=False)
+    mask[rows[matches]] = True
+
+    texts, rows = _flatten_category_tags(table)
+    matches = pc.fill_null(pc.match_substring_regex(texts, pattern), False).to_numpy(zero_copy_only=False)
+    mask[rows[matches]] = True
+
+    for name in SEARCH_STRING_COLUMNS:
+        values = _column(table, name).cast(pa.string())
+        mask |= pc.fill_null(pc.match_substring_regex(values, pattern), False).to_numpy(zero_copy_only=False)
+    return mask
+
+
+@lru_cache(maxsize=None)
+def _lowercase_fallback_pattern() -> str:
+    """
+    Regex character class of the characters Arrow lowercases differently from Python.
+
+    Includes the capital sigma, whose Python lowercase depends on its position in a word.
+    """
+    code_points = [c for c in range(sys.maxunicode + 1) if not 0xD800 <= c <= 0xDFFF]
+    characters = [chr(c) for c in code_points]
+    arrow_lower = pc.utf8_lower(pa.array(characters)).to_pylist()
+    differing = {c for c, character, lowered in zip(code_points, characters, arrow_lower)
+                 if character.lower() != lowered}
+    differing.add(ord('Σ'))
+    return '[' + ''.join(f'\\x{{{c:x}}}' for c in sorted(differing)) + ']'
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the vectorized Arrow-batch transform against the per-record transform.
+Transforms the same records both ways, checks that the products are identical and
+prints the throughput of each.
+"""
+
+import argparse
+import random
+import time
+
+import pyarrow as pa
+
+from arrow_transform import transform_table
+from download_products import build_product, compute_product_hash, is_valid_product
+from parquet_source import FileRecordSource, list_local_files
+
+NAMES = ['Mleko', 'Ser żółty', 'Jogurt naturalny', 'Kawa mielona', 'Sok pomarańczowy', 'Chleb żytni', 'Masło']
+CATEGORIES = ['Nabiał', 'Sery', 'Napoje', 'Soki', 'Pieczywo', 'Produkty śniadaniowe', 'en:dairies', 'fr:boissons']
+LABELS = ['Bio', 'EKO', 'Bez glutenu', 'Vegan', 'Fair Trade']
+
+
+def generate_table(count: int, seed: int = 0) -> pa.Table:
+    """
+    Generate synthetic records in the dataset schema.
+
+    Args:
+        count: Number of records
+        seed: Random seed
+
+    Returns:
+        pyarrow.Table with the generated records
+    """
+    rng = random.Random(seed)
+    records = []
+    for i in range(count):
+        names = rng.sample(NAMES, rng.randint(0, 3))
+        records.append({
+            'code': str(5900000000000 + i),
+            'lang': 'pl',
+            'product_name': [{'lang': lang, 'text': name} for lang in ('main', 'pl') for name in names],
+            'brands': rng.choice(['Łaciate', 'Mlekovita', 'Tymbark', None]),
+            'food_groups_tags': ['en:milk-and-dairy-products', 'en:cheese'][:rng.randint(0, 2)],
+            'quantity': rng.choice(['1 l', '500 g', '200 ml', '']),
+            'categories': ','.join(rng.sample(CATEGORIES, rng.randint(0, 4))),
+            'labels': ', '.join(rng.sample(LABELS, rng.randint(0, 3))) or None,
+            'nutriscore_grade': rng.choice(['a', 'b', 'c', 'unknown']),
+            'nutriscore_score': rng.randint(-5, 20),
+        })
+    return pa.Table.from_pylist(records)
+
+
+def load_table(path: str, limit: int) -> pa.Table:
+    """Read up to `limit` Polish records of a local snapshot into one table."""
+    batches = []
+    rows = 0
+    for batch in FileRecordSource(list_local_files(path), languages=['pl']).iter_batches(limit):
+        if isinstance(batch, list):
+            batch = pa.Table.from_pylist(batch)
+        batches.append(batch.slice(0, limit - rows))
+        rows += batches[-1].num_rows
+        if rows >= limit:
+            break
+    return pa.concat_tables(batches, promote_options='default')
+
+
+def run_per_record(table: pa.Table, batch_size: int) -> list:
+    """Transform the table record by record, as the pipeline does without the vectorized path."""
+    products = []
+    for offset in range(0, table.num_rows, batch_size):
+        records = table.slice(offset, batch_size).to_pylist()
+        for position, record in enumerate(records, offset):
+            if is_valid_product(record):
+                products.append((position, build_product(record)))
+    return products
+
+
+def run_vectorized(table: pa.Table, batch_size: int) -> list:
+    """Transform the table in Arrow batches, as the pipeline does on the vectorized path."""
+    products = []
+    for offset in range(0, table.num_rows, batch_size):
+        result = transform_table(table.slice(offset, batch_size), offset)
+        for _, product in result.products:
+            product['content_hash'] = compute_product_hash(product)
+        batch_products = result.products + [(position, build_product(record))
+                                            for position, record in result.fallback_records
+                                            if is_valid_product(record)]
+        products.extend(sorted(batch_products, key=lambda item: item[0]))
+    return products
+
+
+def benchmark(name: str, transform, table: pa.Table, batch_size: int, repeat: int):
+    """Run a transform `repeat` times and print the best throughput."""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        products = transform(table, batch_size)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{name:<12} {table.num_rows / best:>12,.0f} records/s ({best:.3f}s)")
+    return products, best
+
+
+def main():
+    """Main function to run the benchmark."""
+    parser = argparse.ArgumentParser(description='Benchmark the vectorized ingest transform')
+    parser.add_argument('-n', '--records', type=int, default=100000, help='Number of records (default: 100000)')
+    parser.add_argument('-b', '--batch-size', type=int, default=2000, help='Records per batch (default: 2000)')
+    parser.add_argument('-r', '--repeat', type=int, default=3, help='Number of runs, the best is reported (default: 3)')
+    parser.add_argument('-i', '--input', help='Local snapshot to read records from instead of generating them')
+    args = parser.parse_args()
+
+    table = load_table(args.input, args.records) if args.input else generate_table(args.records)
+    print(f"Transforming {table.num_rows} records in batches of {args.batch_size}")
+
+    # Warm up the cached lowercase fallback pattern outside of the measurements
+    transform_table(table.slice(0, 1))
+
+    per_record, per_record_time = benchmark('per-record', run_per_record, table, args.batch_size, args.repeat)
+    vectorized, vectorized_time = benchmark('vectorized', run_vectorized, table, args.batch_size, args.repeat)
+
+    if per_record != vectorized:
+        print("ERROR: vectorized output differs from the per-record output")
+        raise SystemExit(1)
+    print(f"Identical output for {len(vectorized)} products, speedup {per_record_time / vectorized_time:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
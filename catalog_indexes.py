@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Index management for the products catalog collections.
+Verifies and creates the indexes the search path needs once, at the end of an ingest
+or when a search session starts, instead of calling create_index() before every query.
+"""
+
+import threading
+from typing import Any, Dict, List
+
+# Indexes every catalog collection needs, as create_index() keys and options
+REQUIRED_INDEXES = [
+    {'keys': [('search_string', 'text')], 'name': 'search_string_text'},
+]
+
+_bootstrapped = set()  # Full names of the collections whose indexes were verified
+_bootstrap_lock = threading.Lock()
+
+
+def has_index(index_information: Dict[str, Any], spec: Dict[str, Any]) -> bool:
+    """
+    Check whether an existing index covers a required index.
+
+    Text indexes are matched on their text fields, since a collection can only have
+    one text index and its stored key is the internal ('_fts', '_ftsx') pair.
+
+    Args:
+        index_information: Result of collection.index_information()
+        spec: Required index from REQUIRED_INDEXES
+
+    Returns:
+        bool: True if the index exists
+    """
+    text_fields = {field for field, kind in spec['keys'] if kind == 'text'}
+    for info in index_information.values():
+        if text_fields:
+            if set(info.get('weights', {})) == text_fields:
+                return True
+        elif [(field, kind) for field, kind in info.get('key', [])] == list(spec['keys']):
+            return True
+    return False
+
+
+def missing_indexes(collection) -> List[Dict[str, Any]]:
+    """Return the required indexes that do not exist on the collection."""
+    index_information = collection.index_information()
+    return [spec for spec in REQUIRED_INDEXES if not has_index(index_information, spec)]
+
+
+def bootstrap_indexes(collection, force: bool = False) -> List[str]:
+    """
+    Verify the required indexes of a catalog collection and create the missing ones.
+
+    The check runs once per collection and process; later calls return immediately
+    unless force is set.
+
+    Args:
+        collection: MongoDB catalog collection
+        force: Verify the indexes again even if they were verified before
+
+    Returns:
+        Names of the indexes that were created
+    """
+    key = collection.full_name
+    with _bootstrap_lock:
+        if key in _bootstrapped and not force:
+            return []
+
+        created = []
+        for spec in missing_indexes(collection):
+            options = {option: value for option, value in spec.items() if option != 'keys'}
+            print(f"Creating index '{spec['name']}' on '{collection.name}'...")
+            created.append(collection.create_index(spec['keys'], **options))
+        _bootstrapped.add(key)
+        return created
+
+
+def reset_bootstrap_cache() -> None:
+    """Forget which collections were verified, e.g. after indexes were dropped."""
+    with _bootstrap_lock:
+        _bootstrapped.clear()
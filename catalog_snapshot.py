@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+Columnar snapshot of the product catalog.
+Writes the product documents built during ingest to compressed Parquet or Arrow IPC
+part files together with a manifest (dataset revision, row count, build time), so the
+catalog can be analysed and indexed locally without reading MongoDB.
+"""
+
+import glob
+import json
+import os
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+SNAPSHOT_FORMATS = {'parquet': '.parquet', 'arrow': '.arrow'}
+MANIFEST_FILENAME = 'manifest.json'
+MANIFEST_VERSION = 1
+
+# Schema of the product documents built by download_products.build_product()
+PRODUCT_SCHEMA = pa.schema([
+    ('_id', pa.string()),
+    ('lang', pa.string()),
+    ('product_name', pa.list_(pa.struct([('lang', pa.string()), ('text', pa.string())]))),
+    ('brands', pa.string()),
+    ('food_groups_tags', pa.list_(pa.string())),
+    ('product_quantity_unit', pa.string()),
+    ('product_quantity', pa.string()),
+    ('quantity', pa.string()),
+    ('categories_tags', pa.list_(pa.string())),
+    ('categories', pa.list_(pa.string())),
+    ('labels_tags', pa.list_(pa.string())),
+    ('labels', pa.list_(pa.string())),
+    ('popularity_key', pa.int64()),
+    ('popularity_tags', pa.list_(pa.string())),
+    ('nutriscore_grade', pa.string()),
+    ('nutriscore_score', pa.int64()),
+    ('search_string', pa.string()),
+    ('given_name', pa.string()),
+    ('scoring', pa.struct([
+        ('names', pa.list_(pa.string())),
+        ('brands', pa.string()),
+        ('quantity', pa.string()),
+        ('categories', pa.list_(pa.string())),
+        ('category_tags', pa.list_(pa.string())),
+        ('labels', pa.list_(pa.string())),
+    ])),
+    ('content_hash', pa.string()),
+])
+
+
+def part_filename(start_position: int, file_format: str, prefix: str = 'part') -> str:
+    """Name of the part file holding the products read from start_position on."""
+    return f"{prefix}-{start_position:012d}{SNAPSHOT_FORMATS[file_format]}"
+
+
+def count_file_rows(path: str) -> int:
+    """Count the rows of a Parquet or Arrow IPC part file."""
+    if path.endswith(SNAPSHOT_FORMATS['parquet']):
+        return pq.ParquetFile(path).metadata.num_rows
+    with pa.memory_map(path, 'r') as source:
+        reader = pa.ipc.open_file(source)
+        return sum(reader.get_batch(i).num_rows for i in range(reader.num_record_batches))
+
+
+def clear_snapshot(directory: str, keep_prefixes: Iterable[str] = ()) -> None:
+    """
+    Remove the manifest and the part files of a snapshot directory.
+
+    Args:
+        directory: Snapshot directory
+        keep_prefixes: Part file name prefixes to keep (e.g. shards completed before a resume)
+    """
+    os.makedirs(directory, exist_ok=True)
+    keep_prefixes = tuple(f"{prefix}-" for prefix in keep_prefixes)
+    for name in os.listdir(directory):
+        is_part = name.endswith(tuple(SNAPSHOT_FORMATS.values()))
+        if name == MANIFEST_FILENAME or (is_part and not name.startswith(keep_prefixes)):
+            os.remove(os.path.join(directory, name))
+
+
+def save_manifest(directory: str, files: Dict[str, int], file_format: str, compression: Optional[str],
+                  started_at: datetime, **metadata) -> Dict[str, Any]:
+    """
+    Write the manifest describing a finished snapshot.
+
+    Args:
+        directory: Snapshot directory
+        files: Part file names mapped to their row counts
+        file_format: 'parquet' or 'arrow'
+        compression: Compression codec of the part files
+        started_at: Time the snapshot build started
+        **metadata: Additional fields, such as the dataset name and revision
+
+    Returns:
+        The manifest
+    """
+    built_at = datetime.now()
+    manifest = {
+        'version': MANIFEST_VERSION,
+        **metadata,
+        'format': file_format,
+        'compression': compression or 'none',
+        'row_count': sum(files.values()),
+        'files': [{'path': name, 'rows': rows} for name, rows in sorted(files.items())],
+        'columns': PRODUCT_SCHEMA.names,
+        'build_started_at': started_at.isoformat(),
+        'built_at': built_at.isoformat(),
+        'build_seconds': round((built_at - started_at).total_seconds(), 3),
+    }
+
+    manifest_path = os.path.join(directory, MANIFEST_FILENAME)
+    temp_path = manifest_path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    os.replace(temp_path, manifest_path)
+    return manifest
+
+
+class CatalogSnapshotWriter:
+    """
+    Thread-safe writer of the catalog snapshot.
+
+    Products are buffered and written as one row group (Parquet) or record batch
+    (Arrow IPC) per row_group_size products. The snapshot is split into part files
+    named after the read position they start at; roll() closes the current part at an
+    ingest checkpoint, so a resumed run can drop the parts written after the checkpoint
+    and continue with a new part.
+
+    Several writers can share a directory (one per ingested shard) by using
+    different part prefixes.
+    """
+
+    def __init__(self, directory: str, file_format: str = 'parquet', compression: str = 'zstd',
+                 row_group_size: int = 10000, part_prefix: str = 'part'):
+        """
+        Args:
+            directory: Snapshot directory
+            file_format: 'parquet' or 'arrow' (Arrow IPC file format)
+            compression: Compression codec ('zstd', 'lz4', 'snappy' for Parquet, or 'none')
+            row_group_size: Number of products per row group / record batch
+            part_prefix: File name prefix of the part files written by this writer
+        """
+        if file_format not in SNAPSHOT_FORMATS:
+            raise ValueError(f"Unsupported snapshot format '{file_format}' (expected one of {sorted(SNAPSHOT_FORMATS)})")
+
+        self.directory = directory
+        self.file_format = file_format
+        self.compression = None if compression in (None, '', 'none') else compression
+        self.row_group_size = max(1, row_group_size)
+        self.part_prefix = part_prefix
+
+        self.row_count = 0
+        self.failed = False
+        self.started_at = datetime.now()
+        self._files = {}  # Part file name -> row count
+        self._buffer = []
+        self._writer = None
+        self._part_name = None
+        self._part_position = 0
+        self._lock = threading.Lock()
+
+    def prepare(self, resume_position: Optional[int] = None) -> None:
+        """
+        Prepare the snapshot directory for a run.
+
+        Removes the manifest and the part files of earlier runs with this writer's
+        prefix. When resuming, the parts started before resume_position (closed at
+        earlier checkpoints) are kept.
+
+        Args:
+            resume_position: Read position of the checkpoint the run resumes from
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        manifest_path = os.path.join(self.directory, MANIFEST_FILENAME)
+        if os.path.exists(manifest_path):
+            os.remove(manifest_path)
+
+        prefix = f"{self.part_prefix}-"
+        for path in sorted(glob.glob(os.path.join(self.directory, glob.escape(prefix) + '*'))):
+            name = os.path.basename(path)
+            start = name[len(prefix):].split('.', 1)[0]
+            keep = (resume_position is not None and start.isdigit() and int(start) < resume_position
+                    and name.endswith(SNAPSHOT_FORMATS[self.file_format]))
+            if keep:
+                self._files[name] = count_file_rows(path)
+            else:
+                os.remove(path)
+
+        self.row_count = sum(self._files.values())
+        self._part_position = resume_position or 0
+
+    def add(self, product: dict) -> None:
+        """Buffer a product, writing a row group when the buffer is full."""
+        with self._lock:
+            if self.failed:
+                return
+            self._buffer.append(product)
+            if len(self._buffer) >= self.row_group_size:
+                self._write_buffer()
+
+    def flush(self) -> None:
+        """Write the buffered products."""
+        with self._lock:
+            self._write_buffer()
+
+    def roll(self, position: int) -> None:
+        """Close the current part file; products added from now on start a part at `position`."""
+        with self._lock:
+            self._write_buffer()
+            self._close_part()
+            self._part_position = position
+
+    def close(self) -> None:
+        """Write the buffered products and close the current part file."""
+        with self._lock:
+            self._write_buffer()
+            self._close_part()
+
+    def write_manifest(self, **metadata) -> Optional[Dict[str, Any]]:
+        """
+        Write the manifest describing the finished snapshot.
+
+        Args:
+            **metadata: Additional fields, such as the dataset name and revision
+
+        Returns:
+            The manifest, or None if writing the snapshot failed
+        """
+        if self.failed:
+            return None
+        return save_manifest(self.directory, self.files, self.file_format, self.compression,
+                             self.started_at, **metadata)
+
+    @property
+    def files(self) -> Dict[str, int]:
+        """Part files written (or kept on resume) mapped to their row counts."""
+        with self._lock:
+            return dict(self._files)
+
+    def _write_buffer(self) -> None:
+        """Write the buffered products to the current part file (lock held)."""
+        if not self._buffer or self.failed:
+            self._buffer = []
+            return
+
+        products, self._buffer = self._buffer, []
+        try:
+            table = pa.Table.from_pylist(products, schema=PRODUCT_SCHEMA)
+            if self._writer is None:
+                self._open_part()
+            if self.file_format == 'parquet':
+                self._writer.write_table(table)
+            else:
+                self._writer.write_table(table, max_chunksize=self.row_group_size)
+        except Exception as e:
+            # Like the other destinations, a failing snapshot must not stop the ingest
+            print(f"Error writing catalog snapshot, the snapshot will be incomplete and has no manifest: {e}")
+            self.failed = True
+            return
+
+        self._files[self._part_name] = self._files.get(self._part_name, 0) + len(products)
+        self.row_count += len(products)
+
+    def _open_part(self) -> None:
+        """Open the part file for the current part position (lock held)."""
+        self._part_name = part_filename(self._part_position, self.file_format, self.part_prefix)
+        path = os.path.join(self.directory, self._part_name)
+        if self.file_format == 'parquet':
+            self._writer = pq.ParquetWriter(path, PRODUCT_SCHEMA, compression=self.compression or 'none')
+        else:
+            options = pa.ipc.IpcWriteOptions(compression=self.compression)
+            self._writer = pa.ipc.new_file(path, PRODUCT_SCHEMA, options=options)
+
+    def _close_part(self) -> None:
+        """Close the current part file, if one is open (lock held)."""
+        if self._writer is not None:
+            try:
+                self._writer.close()
+            except Exception as e:
+                print(f"Error closing catalog snapshot part '{self._part_name}': {e}")
+                self.failed = True
+            self._writer = None
+
+
+def load_manifest(directory: str) -> Optional[Dict[str, Any]]:
+    """
+    Load the manifest of a catalog snapshot.
+
+    Args:
+        directory: Snapshot directory
+
+    Returns:
+        The manifest, or None if the snapshot is missing or incomplete
+    """
+    manifest_path = os.path.join(directory, MANIFEST_FILENAME)
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def read_snapshot(directory: str, columns: Optional[List[str]] = None) -> pa.Table:
+    """
+    Read a catalog snapshot into one Arrow table.
+
+    Parquet parts are read with the column projection, Arrow IPC parts are memory-mapped.
+
+    Args:
+        directory: Snapshot directory
+        columns: Columns to read (default: all)
+
+    Returns:
+        pyarrow.Table with the products of all parts
+
+    Raises:
+        FileNotFoundError: If the directory has no manifest
+    """
+    manifest = load_manifest(directory)
+    if manifest is None:
+        raise FileNotFoundError(f"No catalog snapshot manifest in '{directory}'")
+
+    tables = []
+    for part in manifest['files']:
+        path = os.path.join(directory, part['path'])
+        if manifest['format'] == 'parquet':
+            tables.append(pq.read_table(path, columns=columns, memory_map=True))
+        else:
+            # The table keeps the memory map open for as long as it is referenced
+            table = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+            tables.append(table.select(columns) if columns else table)
+
+    if not tables:
+        schema = pa.schema([PRODUCT_SCHEMA.field(name) for name in columns]) if columns else PRODUCT_SCHEMA
+        return schema.empty_table()
+    return pa.concat_tables(tables)
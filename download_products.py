@@ -6,8 +6,25 @@ Downloads records from the Hugging Face dataset and stores them in MongoDB.
 
 import json
 import os
+import argparse
+import functools
+import hashlib
+import queue
 import sys
-from pinecone_integration import process_categories_to_pinecone, process_products_to_pinecone
+import threading
+import time
+from datetime import datetime
+from types import SimpleNamespace
+from typing import List, Optional
+from arrow_transform import ArrowTransformResult, supports_table, transform_table
+from catalog_indexes import bootstrap_indexes
+from catalog_snapshot import CatalogSnapshotWriter, clear_snapshot, save_manifest
+from ingest_progress import LOG_LEVELS, LatencyRecorder, ProgressReporter, print_run_summary, save_summary
+from pinecone_integration import PineconeProductStream, print_upload_summary
+from search_cache import record_catalog_generation
+from utils import compute_given_name, prepare_scoring_fields
+from parquet_source import (DATASET_NAME, get_dataset_revision, list_dataset_parquet_files, list_local_files,
+                            FileRecordSource)
 
 
 def is_valid_product(record):
@@ -52,43 +69,1640 @@ def is_valid_product(record):
     return has_valid_category
 
 
-def download_from_huggingface():
-    """Download records from the OpenFoodFacts dataset on Hugging Face and optionally store in MongoDB."""
-    try:
-        from datasets import load_dataset
+def parse_write_concern(value: str):
+    """
+    Build a MongoDB WriteConcern from a configuration string.
+
+    Accepts a number of acknowledging nodes ("0", "1", "2", ...) or a tag such as "majority".
+
+    Args:
+        value: Write concern setting, e.g. from the MONGO_WRITE_CONCERN environment variable
+
+    Returns:
+        WriteConcern instance, or None to keep the collection's default
+    """
+    from pymongo import WriteConcern
+
+    if not value:
+        return None
+
+    value = value.strip()
+    journal = os.getenv('MONGO_WRITE_JOURNAL', '').lower() in ('true', '1', 'yes', 'on') or None
+
+    if value.isdigit():
+        return WriteConcern(w=int(value), j=journal)
+    return WriteConcern(w=value, j=journal)
+
+
+class BulkProductWriter:
+    """
+    Buffer product upserts and flush them to MongoDB with unordered bulk writes.
+
+    Each product becomes a ReplaceOne(upsert=True) operation. Operations are sent with
+    bulk_write(ordered=False) once batch_size of them have been collected, so a single
+    failing document does not stop the rest of the batch from being written.
+    Per-document failures are collected in `errors` instead of being raised, and the
+    duration of every bulk_write call is recorded in `latency`.
+    """
+
+    # Maximum number of per-document errors kept for reporting
+    MAX_REPORTED_ERRORS = 100
+
+    def __init__(self, collection, batch_size: int = 1000, write_concern=None):
+        """
+        Args:
+            collection: MongoDB collection object
+            batch_size: Number of operations sent per bulk_write call
+            write_concern: Optional pymongo WriteConcern applied to the bulk writes
+        """
+        if write_concern is not None:
+            collection = collection.with_options(write_concern=write_concern)
+
+        self.collection = collection
+        self.batch_size = max(1, batch_size)
+        self._operations = []
+        self._ids = []
+
+        self.batches_flushed = 0
+        self.written_count = 0
+        self.upserted_count = 0
+        self.modified_count = 0
+        self.error_count = 0
+        self.errors = []
+        self.latency = LatencyRecorder()
+
+    def add(self, product: dict) -> None:
+        """Queue a product upsert, flushing the buffer when it is full."""
+        from pymongo import ReplaceOne
+
+        self._operations.append(ReplaceOne({'_id': product['_id']}, product, upsert=True))
+        self._ids.append(product['_id'])
+
+        if len(self._operations) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Send all buffered operations to MongoDB in one unordered bulk write."""
+        from pymongo.errors import BulkWriteError
+
+        if not self._operations:
+            return
+
+        operations, ids = self._operations, self._ids
+        self._operations, self._ids = [], []
+        self.batches_flushed += 1
+
+        started = time.perf_counter()
+        try:
+            result = self.collection.bulk_write(operations, ordered=False)
+            self.latency.record(time.perf_counter() - started)
+            if result.acknowledged:
+                self._record_result(result.bulk_api_result, len(operations))
+            else:
+                # Unacknowledged writes (w=0) give no per-document feedback
+                self.written_count += len(operations)
+        except BulkWriteError as e:
+            self.latency.record(time.perf_counter() - started)
+            details = e.details or {}
+            self._record_result(details, len(operations))
+            for write_error in details.get('writeErrors', []):
+                index = write_error.get('index')
+                product_id = ids[index] if index is not None and index < len(ids) else None
+                self._record_error(product_id, write_error.get('errmsg', ''), write_error.get('code'))
+            if details.get('writeConcernErrors'):
+                print(f"Warning: write concern errors in bulk write: {details['writeConcernErrors']}")
+        except Exception as e:
+            # The whole batch failed (e.g. network error) - report every document in it
+            print(f"Error in bulk write of {len(operations)} products: {e}")
+            for product_id in ids:
+                self._record_error(product_id, str(e))
+
+    def close(self) -> None:
+        """Flush any remaining buffered operations."""
+        self.flush()
+
+    def _record_result(self, result: dict, operation_count: int) -> None:
+        """Update counters from a bulk write result document."""
+        write_errors = len(result.get('writeErrors', []))
+        self.written_count += operation_count - write_errors
+        self.upserted_count += result.get('nUpserted', 0)
+        self.modified_count += result.get('nModified', 0)
+
+    def _record_error(self, product_id, message: str, code=None) -> None:
+        """Record a failed document write."""
+        self.error_count += 1
+        if len(self.errors) < self.MAX_REPORTED_ERRORS:
+            self.errors.append({'_id': product_id, 'code': code, 'errmsg': message})
+            print(f"Error upserting product {product_id}: {message}")
+
+    @staticmethod
+    def combined_counts(writers: List['BulkProductWriter']) -> dict:
+        """Add up the bulk write counters of several writers."""
+        return {
+            'batches': sum(writer.batches_flushed for writer in writers),
+            'written': sum(writer.written_count for writer in writers),
+            'upserted': sum(writer.upserted_count for writer in writers),
+            'modified': sum(writer.modified_count for writer in writers),
+            'failed': sum(writer.error_count for writer in writers),
+        }
+
+    @staticmethod
+    def print_combined_summary(writers: List['BulkProductWriter']) -> None:
+        """Print a summary of the bulk writes performed by several writers."""
+        counts = BulkProductWriter.combined_counts(writers)
+        batches, written, failed = counts['batches'], counts['written'], counts['failed']
+        upserted, modified = counts['upserted'], counts['modified']
+        reported = sum(len(writer.errors) for writer in writers)
+
+        print(f"MongoDB bulk writes: {batches} batches, {written} products written "
+              f"({upserted} inserted, {modified} updated)")
+        if failed > 0:
+            print(f"MongoDB bulk writes: {failed} products failed")
+            if failed > reported:
+                print(f"(only the first {reported} errors were reported)")
+
+
+def build_product(record) -> dict:
+    """
+    Transform a dataset record into the product document stored in the catalog.
+    
+    Args:
+        record: The product record from the dataset
+        
+    Returns:
+        Product document including the generated search_string, given_name and scoring fields
+    """
+    # Extract unique product names from product_name array
+    product_names = record.get('product_name', [])
+    unique_product_names = []
+    if isinstance(product_names, list):
+        seen_texts = set()
+        for name_obj in product_names:
+            if isinstance(name_obj, dict) and 'text' in name_obj:
+                text = name_obj['text']
+                if text and text not in seen_texts:
+                    unique_product_names.append(text)
+                    seen_texts.add(text)
+    
+    # Build search_string by concatenating specified fields
+    search_components = []
+    
+    # Add unique product names
+    search_components.extend(unique_product_names)
+    
+    # Add quantity
+    quantity = record.get('quantity', '')
+    if quantity:
+        search_components.append(quantity)
+    
+    # Add brands  
+    brands = record.get('brands', '')
+    if brands:
+        search_components.append(brands)
+    
+    # Add categories
+    categories = record.get('categories', '')
+    if categories:
+        search_components.append(categories)
+    
+    # Add labels
+    labels = record.get('labels', '')
+    if labels:
+        search_components.append(labels)
+    
+    # Create space-separated search string (lowercase)
+    search_string = ' '.join(search_components).lower().replace(',', ' ')
+
+    product = {
+        '_id': record.get('code'),
+        'lang': record.get('lang'),
+        'product_name': record.get('product_name'),
+        'brands': record.get('brands'),
+        'food_groups_tags': record.get('food_groups_tags'),
+        'product_quantity_unit': record.get('product_quantity_unit'),
+        'product_quantity': record.get('product_quantity'),
+        'quantity': record.get('quantity'),
+        'categories_tags': record.get('categories_tags'),
+        'categories': [c.strip() for c in record.get('categories', '').split(',') if record.get('categories')] if record.get('categories') else [],
+        'labels_tags': record.get('labels_tags'),
+        'labels': [l.strip() for l in record.get('labels', '').split(',') if record.get('labels')] if record.get('labels') else [],
+        'popularity_key': record.get('popularity_key'),
+        'popularity_tags': record.get('popularity_tags'),
+        'nutriscore_grade': record.get('nutriscore_grade'),
+        'nutriscore_score': record.get('nutriscore_score'),
+        'search_string': search_string,
+    }
+    # Scoring-ready fields, so searches do not normalize them per query
+    product['given_name'] = compute_given_name(product)
+    product['scoring'] = prepare_scoring_fields(product)
+    product['content_hash'] = compute_product_hash(product)
+    return product
+
+
+def compute_product_hash(product: dict) -> str:
+    """
+    Compute a stable hash of the fields that make up a product document.
+    
+    Fields are serialized as canonical JSON (sorted keys, no whitespace), so the hash only
+    changes when the content of the document changes.
+    
+    Args:
+        product: Product document (an existing 'content_hash' field is ignored)
+        
+    Returns:
+        Hex digest of the product content
+    """
+    content = {key: value for key, value in product.items() if key != 'content_hash'}
+    serialized = json.dumps(content, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+    return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+
+
+def load_product_hashes(collection) -> dict:
+    """
+    Load the content hash of every product stored in the catalog.
+    
+    Args:
+        collection: MongoDB collection object
+        
+    Returns:
+        Dictionary mapping product _id to its content hash (None for documents stored without one)
+    """
+    return {doc['_id']: doc.get('content_hash') for doc in collection.find({}, {'content_hash': 1})}
+
+
+def load_product_ids(collection) -> dict:
+    """
+    Load the _id of every product stored in the catalog, without the content hashes.
+    
+    Used by a ProductChangeTracker that only merges the results of shard workers and
+    detects removed products, so it does not hold another copy of the hashes.
+    
+    Args:
+        collection: MongoDB collection object
+        
+    Returns:
+        Dictionary mapping product _id to None
+    """
+    return dict.fromkeys(doc['_id'] for doc in collection.find({}, {'_id': 1}))
+
+
+class ProductChangeTracker:
+    """
+    Classify ingested products against the content hashes already stored in the catalog.
+    
+    Shared by all writer threads. Products whose hash matches the stored one are
+    unchanged and do not need to be written again.
+    """
+
+    ADDED = 'added'
+    CHANGED = 'changed'
+    UNCHANGED = 'unchanged'
+
+    def __init__(self, existing_hashes: dict):
+        """
+        Args:
+            existing_hashes: Dictionary mapping product _id to the stored content hash
+        """
+        self.existing_hashes = existing_hashes
+        self.counts = {self.ADDED: 0, self.CHANGED: 0, self.UNCHANGED: 0}
+        self._seen_ids = set()
+        self._lock = threading.Lock()
+
+    def classify(self, product: dict) -> str:
+        """Return whether a product was added, changed or is unchanged since the last run."""
+        product_id = product.get('_id')
+        with self._lock:
+            self._seen_ids.add(product_id)
+            if product_id not in self.existing_hashes:
+                status = self.ADDED
+            elif self.existing_hashes[product_id] != product.get('content_hash'):
+                status = self.CHANGED
+            else:
+                status = self.UNCHANGED
+            # Later duplicates of the same product compare against this version
+            self.existing_hashes[product_id] = product.get('content_hash')
+            self.counts[status] += 1
+        return status
+
+    def removed_ids(self) -> list:
+        """Return the ids of stored products that were not seen in this run."""
+        with self._lock:
+            return [product_id for product_id in self.existing_hashes if product_id not in self._seen_ids]
+
+    def seen_ids(self) -> list:
+        """Return the ids of all products classified so far."""
+        with self._lock:
+            return list(self._seen_ids)
+
+    def merge(self, counts: dict, seen_ids) -> None:
+        """
+        Add the results of a tracker used by another ingest process.
+        
+        Args:
+            counts: Added/changed/unchanged counts of the other tracker
+            seen_ids: Ids of the products classified by the other tracker
+        """
+        with self._lock:
+            for status, count in counts.items():
+                self.counts[status] += count
+            self._seen_ids.update(seen_ids)
+
+
+class IngestAggregates:
+    """
+    Catalog-wide aggregates collected while ingesting records.
+    
+    Every transform worker keeps its own instance; instances are merged at the end.
+    The last category mapping remembers the record position that produced it so the
+    merged result matches a sequential run (the latest record wins).
+    """
+
+    def __init__(self):
+        self.unique_food_groups = set()  # Collect unique food group tags
+        self.unique_categories = set()  # Collect unique category tags
+        self.unique_last_categories = {}  # Collect unique last category mapping to full path
+        self.langs_map = {}
+        self.skipped_count = 0
+        self._last_category_positions = {}
+
+    def add(self, record, position) -> None:
+        """
+        Add a valid record to the aggregates.
+        
+        Args:
+            record: The product record from the dataset
+            position: Position of the record in the dataset, used to order last category updates
+        """
+        # Collect unique food groups tags
+        food_groups_tags = record.get('food_groups_tags', [])
+        if food_groups_tags:
+            # Add all tags to unique set
+            self.unique_food_groups.update(food_groups_tags)
+
+        # Collect unique categories from categories field
+        categories = record.get('categories', '')
+        if categories:
+            # Split by comma and add each category to unique set
+            category_list = [c.strip() for c in categories.split(',') if c.strip()]
+            self.unique_categories.update(category_list)
+            
+            # Build mapping from last category to full path, skipping categories with ":"
+            # Filter out categories containing ":"
+            filtered_categories = [cat for cat in category_list if ':' not in cat]
+            
+            if filtered_categories:
+                # Get the last category and build full path using ">" separator
+                self._set_last_category(filtered_categories[-1], " > ".join(filtered_categories), position)
+
+        lang = record.get('lang', "None_LANG_ATTRIBUTE")
+        self.langs_map[lang] = self.langs_map.get(lang, 0) + 1
+
+    def add_skipped(self, record) -> None:
+        """Count a record that failed validation."""
+        self.skipped_count += 1
+
+    def add_batch(self, result: ArrowTransformResult) -> None:
+        """
+        Add the aggregates of a batch transformed by arrow_transform.transform_table().
+        
+        Args:
+            result: Result of the vectorized transform
+        """
+        self.unique_food_groups.update(result.food_groups)
+        self.unique_categories.update(result.categories)
+        for last_category, (full_path, position) in result.last_categories.items():
+            self._set_last_category(last_category, full_path, position)
+        for lang, count in result.langs.items():
+            self.langs_map[lang] = self.langs_map.get(lang, 0) + count
+        self.skipped_count += len(result.skipped_codes)
+
+    def merge(self, other: 'IngestAggregates', position_offset: int = 0) -> None:
+        """
+        Merge the aggregates collected by another worker into this one.
+        
+        Args:
+            other: Aggregates to merge
+            position_offset: Added to the record positions of `other`, e.g. to place a shard
+                             ingested on its own after the shards before it
+        """
+        self.unique_food_groups.update(other.unique_food_groups)
+        self.unique_categories.update(other.unique_categories)
+        for last_category, full_path in other.unique_last_categories.items():
+            position = other._last_category_positions[last_category] + position_offset
+            self._set_last_category(last_category, full_path, position)
+        for lang, count in other.langs_map.items():
+            self.langs_map[lang] = self.langs_map.get(lang, 0) + count
+        self.skipped_count += other.skipped_count
+
+    def to_dict(self) -> dict:
+        """Serialize the aggregates to a JSON-compatible dict."""
+        return {
+            'unique_food_groups': sorted(self.unique_food_groups),
+            'unique_categories': sorted(self.unique_categories),
+            'unique_last_categories': self.unique_last_categories,
+            'last_category_positions': self._last_category_positions,
+            'langs_map': self.langs_map,
+            'skipped_count': self.skipped_count,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'IngestAggregates':
+        """Restore aggregates serialized with to_dict()."""
+        aggregates = cls()
+        aggregates.unique_food_groups = set(data.get('unique_food_groups', []))
+        aggregates.unique_categories = set(data.get('unique_categories', []))
+        aggregates.unique_last_categories = dict(data.get('unique_last_categories', {}))
+        aggregates._last_category_positions = dict(data.get('last_category_positions', {}))
+        aggregates.langs_map = dict(data.get('langs_map', {}))
+        aggregates.skipped_count = data.get('skipped_count', 0)
+        return aggregates
+
+    def _set_last_category(self, last_category: str, full_path: str, position) -> None:
+        """Store a last category mapping unless a later record already set it."""
+        current_position = self._last_category_positions.get(last_category)
+        if current_position is None or position >= current_position:
+            self.unique_last_categories[last_category] = full_path
+            self._last_category_positions[last_category] = position
+
+
+class LanguageAggregates:
+    """
+    Ingest aggregates kept separately for every language of a multi-language ingest.
+    
+    Offers the same add / merge / serialization interface as IngestAggregates and
+    routes each record to the IngestAggregates of its language, so every language
+    gets its own unique category, last category and food group collections.
+    """
+
+    def __init__(self):
+        self.languages = {}  # Language code -> IngestAggregates
+
+    def for_language(self, language: str) -> IngestAggregates:
+        """Aggregates of one language (created empty on first use)."""
+        if language not in self.languages:
+            self.languages[language] = IngestAggregates()
+        return self.languages[language]
+
+    def add(self, record, position) -> None:
+        """Add a valid record to the aggregates of its language."""
+        self.for_language(record.get('lang')).add(record, position)
+
+    def add_skipped(self, record) -> None:
+        """Count a record that failed validation for its language."""
+        self.for_language(record.get('lang')).add_skipped(record)
+
+    def merge(self, other: 'LanguageAggregates', position_offset: int = 0) -> None:
+        """Merge the per-language aggregates collected by another worker (see IngestAggregates.merge())."""
+        for language, aggregates in other.languages.items():
+            self.for_language(language).merge(aggregates, position_offset)
+
+    @property
+    def langs_map(self) -> dict:
+        """Number of valid records per language."""
+        langs_map = {}
+        for aggregates in self.languages.values():
+            for lang, count in aggregates.langs_map.items():
+                langs_map[lang] = langs_map.get(lang, 0) + count
+        return langs_map
+
+    @property
+    def skipped_count(self) -> int:
+        """Number of records of all languages that failed validation."""
+        return sum(aggregates.skipped_count for aggregates in self.languages.values())
+
+    def to_dict(self) -> dict:
+        """Serialize the aggregates to a JSON-compatible dict."""
+        return {'languages': {language: aggregates.to_dict() for language, aggregates in self.languages.items()}}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'LanguageAggregates':
+        """Restore aggregates serialized with to_dict()."""
+        aggregates = cls()
+        for language, language_data in data.get('languages', {}).items():
+            aggregates.languages[language] = IngestAggregates.from_dict(language_data)
+        return aggregates
+
+
+class StageStats:
+    """Thread-safe throughput counters for one ingest pipeline stage."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0
+        self.busy_seconds = 0.0
+        self.started_at = None
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    def record(self, items: int, seconds: float) -> None:
+        """Record `items` processed in `seconds` of busy time."""
+        with self._lock:
+            now = time.perf_counter()
+            if self.started_at is None:
+                self.started_at = now - seconds
+            self.finished_at = now
+            self.items += items
+            self.busy_seconds += seconds
+
+    def to_dict(self, workers: int) -> dict:
+        """Records, elapsed time, records/sec and utilisation of the stage."""
+        elapsed = (self.finished_at - self.started_at) if self.started_at is not None else 0.0
+        rate = self.items / elapsed if elapsed > 0 else 0.0
+        utilisation = self.busy_seconds / (elapsed * workers) if elapsed > 0 else 0.0
+        return {'workers': workers, 'records': self.items, 'elapsed_seconds': round(elapsed, 3),
+                'records_per_second': round(rate, 1), 'utilisation': round(utilisation, 3)}
+
+    def summary_line(self, workers: int) -> str:
+        """Format records/sec and utilisation of the stage."""
+        stats = self.to_dict(workers)
+        return (f" - {self.name} ({workers} worker{'s' if workers != 1 else ''}): {stats['records']} records "
+                f"in {stats['elapsed_seconds']:.1f}s ({stats['records_per_second']:.0f} records/s, "
+                f"{stats['utilisation'] * 100:.0f}% busy)")
+
+
+class TableChunk:
+    """A chunk of records kept as an Arrow table, for the vectorized transform."""
+
+    def __init__(self, position: int, table):
+        self.position = position  # Dataset position of the first row
+        self.table = table
+
+    def __len__(self) -> int:
+        return self.table.num_rows
+
+
+def split_table_by_language(chunk: TableChunk) -> Optional[list]:
+    """
+    Split an Arrow table chunk into one table per language.
+    
+    Args:
+        chunk: Table chunk with a `lang` column
+        
+    Returns:
+        List of (language, dataset positions or None if consecutive, table) tuples,
+        or None if some rows have no language
+    """
+    import numpy as np
+    import pyarrow.compute as pc
+
+    if 'lang' not in chunk.table.column_names:
+        return None
+    lang = chunk.table.column('lang')
+    if lang.null_count:
+        return None
+
+    languages = pc.unique(lang).to_pylist()
+    if len(languages) == 1:
+        return [(languages[0], None, chunk.table)]
+
+    parts = []
+    for language in languages:
+        mask = pc.equal(lang, language)
+        positions = np.flatnonzero(mask.to_numpy()) + chunk.position
+        parts.append((language, positions, chunk.table.filter(mask)))
+    return parts
+
+
+class ProductSink:
+    """
+    Sink stage of the ingest pipeline: sends products to the enabled destinations.
+    
+    Each writer thread owns one sink, so MongoDB bulk writes from different writers
+    are in flight concurrently.
+    """
+
+    def __init__(self, mongo_writer=None, pinecone_stream=None, change_tracker=None, snapshot_writer=None,
+                 progress: ProgressReporter = None):
+        """
+        Args:
+            mongo_writer: Optional BulkProductWriter for MongoDB upserts
+            pinecone_stream: Optional shared PineconeProductStream embedding and upserting products
+            change_tracker: Optional ProductChangeTracker used to skip unchanged products
+            snapshot_writer: Optional shared CatalogSnapshotWriter receiving every product
+            progress: Optional shared ProgressReporter counting the products written
+        """
+        self.mongo_writer = mongo_writer
+        self.pinecone_stream = pinecone_stream
+        self.change_tracker = change_tracker
+        self.snapshot_writer = snapshot_writer
+        self.progress = progress
+
+    def write(self, items) -> None:
+        """Write a chunk of (position, product) pairs."""
+        debug = self.progress is not None and self.progress.debug_enabled
+        unchanged = 0
+        for position, product in items:
+            # The snapshot holds the whole catalog, including unchanged products
+            if self.snapshot_writer is not None:
+                self.snapshot_writer.add(product)
+            
+            # Skip products whose content did not change since the last run. The content hash
+            # only tells the state of MongoDB, so Pinecone still gets them unless configured otherwise
+            if (self.change_tracker is not None
+                    and self.change_tracker.classify(product) == ProductChangeTracker.UNCHANGED):
+                unchanged += 1
+                if self.pinecone_stream is not None and not self.pinecone_stream.skip_unchanged:
+                    self.pinecone_stream.add(product)
+                if debug:
+                    print(f"Record {position + 1}: {product.get('_id')} - Unchanged, skipped in MongoDB")
+                continue
+
+            # Queue product upsert in MongoDB (bulk writes handle duplicates) if enabled
+            if self.mongo_writer is not None:
+                self.mongo_writer.add(product)
+
+            # Embed and upload product to Pinecone if enabled
+            if self.pinecone_stream is not None:
+                self.pinecone_stream.add(product)
+
+            if not debug:
+                continue
+            if self.mongo_writer is not None:
+                print(f"Record {position + 1}: {product.get('_id')} - Queued for MongoDB")
+            else:
+                print(f"Record {position + 1}: {product.get('_id')} - Processed (MongoDB storage disabled)")
+        
+        if self.progress is not None:
+            self.progress.record_written(len(items) - unchanged, unchanged)
+
+    def flush(self) -> None:
+        """Send buffered writes to their destinations."""
+        if self.mongo_writer is not None:
+            self.mongo_writer.flush()
+        if self.pinecone_stream is not None:
+            self.pinecone_stream.flush()
+        if self.snapshot_writer is not None:
+            self.snapshot_writer.flush()
+
+    def close(self) -> None:
+        """Flush buffered writes. The shared Pinecone stream and snapshot writer are closed by their owner."""
+        if self.mongo_writer is not None:
+            self.mongo_writer.close()
+
+
+class LanguageSink:
+    """
+    Sink stage routing products to one ProductSink per language.
+    
+    Each language has its own collection, bulk writers and change tracker; every
+    writer thread owns one LanguageSink, so the bulk writes of all languages are in
+    flight concurrently.
+    """
+
+    def __init__(self, sinks: dict):
+        """
+        Args:
+            sinks: Dictionary mapping language code to the ProductSink of that language
+        """
+        self.sinks = sinks
+
+    def write(self, items) -> None:
+        """Write a chunk of (position, product) pairs, grouped by product language."""
+        groups = {}
+        for item in items:
+            groups.setdefault(item[1].get('lang'), []).append(item)
+        for language, group in groups.items():
+            self.sinks[language].write(group)
+
+    def flush(self) -> None:
+        """Send buffered writes of every language to their destinations."""
+        for sink in self.sinks.values():
+            sink.flush()
+
+    def close(self) -> None:
+        """Flush buffered writes of every language."""
+        for sink in self.sinks.values():
+            sink.close()
+
+
+class IngestPipeline:
+    """
+    Staged ingest pipeline: a prefetching reader, transform workers and sink writers.
+    
+    Stages run in their own threads and are connected by bounded queues, so a slow
+    stage applies backpressure to the ones before it while download, transform and
+    database I/O overlap. Records travel through the queues in chunks to keep the
+    queue overhead per record low.
+    
+    Sources that read Arrow batches (FileRecordSource) are passed through as Arrow
+    tables and transformed with the vectorized arrow_transform module; other sources
+    and batches it does not support are transformed record by record.
+    
+    The type of `aggregates` decides how they are collected: IngestAggregates for the
+    whole catalog, or LanguageAggregates for one set of aggregates per language.
+    
+    When checkpointing is enabled, the reader periodically waits until every record
+    read so far has been transformed and written, flushes the sinks and reports the
+    source position together with the aggregates collected up to that point.
+    """
+
+    _STOP = object()
+    _ABORTED = object()
+
+    def __init__(self, sinks: List[ProductSink], transform_workers: int = 2,
+                 queue_size: int = 64, chunk_size: int = 100,
+                 checkpoint_interval: int = 0, on_checkpoint=None,
+                 aggregates: IngestAggregates = None, start_count: int = 0,
+                 vectorized: bool = True, batch_size: int = 2000, progress: ProgressReporter = None):
+        """
+        Args:
+            sinks: One sink per writer thread
+            transform_workers: Number of transform worker threads
+            queue_size: Maximum number of chunks waiting between two stages
+            chunk_size: Number of records per chunk
+            checkpoint_interval: Number of records read between checkpoints (0 disables checkpoints)
+            on_checkpoint: Callback(source_state, read_count, aggregates) called at each checkpoint
+            aggregates: Aggregates restored from a checkpoint, or empty LanguageAggregates
+                        to collect aggregates per language (default: IngestAggregates)
+            start_count: Number of records already read before this run (when resuming)
+            vectorized: Transform Arrow batches with the vectorized transform when the source supports it
+            batch_size: Number of records per chunk when reading Arrow batches
+            progress: Optional ProgressReporter counting records read and skipped and printing progress lines
+        """
+        self.sinks = sinks
+        self.transform_workers = max(1, transform_workers)
+        self.chunk_size = max(1, chunk_size)
+        self.record_queue = queue.Queue(maxsize=max(1, queue_size))
+        self.product_queue = queue.Queue(maxsize=max(1, queue_size))
+        self.checkpoint_interval = checkpoint_interval
+        self.on_checkpoint = on_checkpoint
+        self.vectorized = vectorized
+        self.batch_size = max(1, batch_size)
+        self.progress = progress
+
+        self.read_count = start_count
+        self.aggregates = aggregates if aggregates is not None else IngestAggregates()
+        self._worker_aggregates = []
+        self._checkpointed_count = start_count
+        self.stats = {
+            'read': StageStats('read'),
+            'transform': StageStats('transform'),
+            'write': StageStats('write'),
+        }
+
+        self._abort = threading.Event()
+        self._errors = []
+        self._skipped_logged = 0
+        self._log_lock = threading.Lock()
+
+    def run(self, records) -> IngestAggregates:
+        """
+        Run the pipeline over an iterable of dataset records.
+        
+        Args:
+            records: Iterable of product records
+            
+        Returns:
+            Merged aggregates of all transform workers
+        """
+        aggregates_type = type(self.aggregates)
+        self._worker_aggregates = worker_aggregates = [aggregates_type() for _ in range(self.transform_workers)]
+
+        reader = threading.Thread(target=self._guard, args=(self._read, records), name='ingest-reader')
+        transformers = [
+            threading.Thread(target=self._guard, args=(self._transform, aggregates), name=f'ingest-transform-{n}')
+            for n, aggregates in enumerate(worker_aggregates)
+        ]
+        writers = [
+            threading.Thread(target=self._guard, args=(self._write, sink), name=f'ingest-writer-{n}')
+            for n, sink in enumerate(self.sinks)
+        ]
+
+        for thread in [reader] + transformers + writers:
+            thread.start()
+
+        reader.join()
+        for thread in transformers:
+            thread.join()
+        # Transform workers are done - tell the writers no more products are coming
+        for _ in writers:
+            self._put(self.product_queue, self._STOP)
+        for thread in writers:
+            thread.join()
+
+        if self._errors:
+            raise self._errors[0]
+
+        for aggregates in worker_aggregates:
+            self.aggregates.merge(aggregates)
+        return self.aggregates
+
+    def stage_stats(self) -> dict:
+        """Per-stage throughput as plain data."""
+        return {
+            'read': self.stats['read'].to_dict(1),
+            'transform': self.stats['transform'].to_dict(self.transform_workers),
+            'write': self.stats['write'].to_dict(len(self.sinks)),
+        }
+
+    def print_stats(self) -> None:
+        """Print per-stage throughput."""
+        print("Ingest pipeline throughput:")
+        print(self.stats['read'].summary_line(1))
+        print(self.stats['transform'].summary_line(self.transform_workers))
+        print(self.stats['write'].summary_line(len(self.sinks)))
+
+    def _guard(self, target, argument) -> None:
+        """Run a stage, stopping the whole pipeline if it fails."""
+        try:
+            target(argument)
+        except Exception as e:
+            self._errors.append(e)
+            self._abort.set()
+
+    def _read(self, records) -> None:
+        """Reader stage: prefetch records from the source into the record queue."""
+        try:
+            bytes_read = getattr(records, 'bytes_read', 0)
+            started = time.perf_counter()
+            for chunk in self._chunks(records):
+                self.stats['read'].record(len(chunk), time.perf_counter() - started)
+                if self.progress is not None:
+                    previous, bytes_read = bytes_read, getattr(records, 'bytes_read', 0)
+                    self.progress.record_read(len(chunk), bytes_read - previous)
+                    self.progress.report()
+                if not self._put(self.record_queue, chunk):
+                    return
+                if self._checkpoint_due():
+                    self._checkpoint(records)
+                started = time.perf_counter()
+        finally:
+            for _ in range(self.transform_workers):
+                self._put(self.record_queue, self._STOP)
+
+    def _chunks(self, records):
+        """Group source records into chunks of (position, record) tuples, or TableChunks for Arrow batches."""
+        if self.vectorized and hasattr(records, 'iter_batches'):
+            for batch in records.iter_batches(self.batch_size):
+                if isinstance(batch, list):
+                    chunk = list(enumerate(batch, self.read_count))
+                elif supports_table(batch):
+                    chunk = TableChunk(self.read_count, batch)
+                else:
+                    chunk = list(enumerate(batch.to_pylist(), self.read_count))
+                self.read_count += len(batch)
+                yield chunk
+            return
+
+        chunk = []
+        for record in records:
+            chunk.append((self.read_count, record))
+            self.read_count += 1
+            if len(chunk) >= self.chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def _transform(self, aggregates: IngestAggregates) -> None:
+        """Transform stage: validate records and build product documents."""
+        while True:
+            chunk = self._get(self.record_queue)
+            if chunk is self._ABORTED:
+                return
+
+            try:
+                if chunk is self._STOP:
+                    return
+
+                started = time.perf_counter()
+                if isinstance(chunk, TableChunk):
+                    products = self._transform_table(chunk, aggregates)
+                else:
+                    products = self._transform_records(chunk, aggregates)
+                self.stats['transform'].record(len(chunk), time.perf_counter() - started)
+                if self.progress is not None:
+                    self.progress.record_transformed(len(products), len(chunk) - len(products))
+
+                if products and not self._put(self.product_queue, products):
+                    return
+            finally:
+                self.record_queue.task_done()
+
+    def _transform_records(self, records, aggregates: IngestAggregates) -> list:
+        """Validate and transform (position, record) tuples one by one."""
+        products = []
+        for position, record in records:
+            # Validate product before processing
+            if not is_valid_product(record):
+                aggregates.add_skipped(record)
+                self._log_skipped(record)
+                continue
+
+            products.append((position, build_product(record)))
+            aggregates.add(record, position)
+        return products
+
+    def _transform_table(self, chunk: TableChunk, aggregates: IngestAggregates) -> list:
+        """Validate and transform an Arrow table chunk with the vectorized transform."""
+        if isinstance(aggregates, LanguageAggregates):
+            parts = split_table_by_language(chunk)
+            if parts is None:
+                # Records without a language are aggregated per record
+                return self._transform_records(enumerate(chunk.table.to_pylist(), chunk.position), aggregates)
+        else:
+            parts = [(None, None, chunk.table)]
+
+        products = []
+        fallback_records = []
+        for language, positions, table in parts:
+            result = transform_table(table, chunk.position, positions=positions)
+            (aggregates if language is None else aggregates.for_language(language)).add_batch(result)
+            for code in result.skipped_codes:
+                self._log_skipped({'code': code})
+            products.extend(result.products)
+            fallback_records.extend(result.fallback_records)
+
+        for _, product in products:
+            product['content_hash'] = compute_product_hash(product)
+        if fallback_records or len(parts) > 1:
+            products = sorted(products + self._transform_records(fallback_records, aggregates),
+                              key=lambda item: item[0])
+        return products
+
+    def _write(self, sink: ProductSink) -> None:
+        """Writer stage: hand products to the sink."""
+        try:
+            while True:
+                products = self._get(self.product_queue)
+                if products is self._ABORTED:
+                    return
+
+                try:
+                    if products is self._STOP:
+                        return
+
+                    started = time.perf_counter()
+                    sink.write(products)
+                    self.stats['write'].record(len(products), time.perf_counter() - started)
+                finally:
+                    self.product_queue.task_done()
+        finally:
+            sink.close()
+
+    def _checkpoint_due(self) -> bool:
+        """Check whether enough records were read since the last checkpoint."""
+        return (self.on_checkpoint is not None and self.checkpoint_interval > 0
+                and self.read_count - self._checkpointed_count >= self.checkpoint_interval)
+
+    def _checkpoint(self, records) -> None:
+        """Wait until everything read so far is written, then report a checkpoint."""
+        if not (self._drain(self.record_queue) and self._drain(self.product_queue)):
+            return
+
+        # All stages are idle now - flush buffered writes and snapshot the aggregates
+        for sink in self.sinks:
+            sink.flush()
+
+        snapshot = type(self.aggregates)()
+        snapshot.merge(self.aggregates)
+        for aggregates in self._worker_aggregates:
+            snapshot.merge(aggregates)
+
+        source_state = records.state_dict() if hasattr(records, 'state_dict') else None
+        self.on_checkpoint(source_state, self.read_count, snapshot)
+        self._checkpointed_count = self.read_count
+
+    def _drain(self, target_queue: queue.Queue) -> bool:
+        """Wait until all items put on a queue are processed. Returns False if the pipeline aborted."""
+        with target_queue.all_tasks_done:
+            while target_queue.unfinished_tasks and not self._abort.is_set():
+                target_queue.all_tasks_done.wait(0.5)
+        return not self._abort.is_set()
+
+    def _log_skipped(self, record) -> None:
+        """Log the first skipped products for debugging."""
+        with self._log_lock:
+            self._skipped_logged += 1
+            if self._skipped_logged <= 10:
+                print(f"Skipped product {record.get('code', 'unknown')}: Missing valid product name or category without ':'")
+
+    def _put(self, target_queue: queue.Queue, item) -> bool:
+        """Put an item on a queue, blocking while it is full. Returns False if the pipeline aborted."""
+        while not self._abort.is_set():
+            try:
+                target_queue.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, source_queue: queue.Queue):
+        """Get an item from a queue, returning the abort marker if the pipeline aborted."""
+        while not self._abort.is_set():
+            try:
+                return source_queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+        return self._ABORTED
+
+
+def report_incremental_changes(change_tracker: ProductChangeTracker, collection, delete_removed: bool,
+                               complete_scan: bool = True) -> None:
+    """
+    Print the added/changed/unchanged/removed summary of an incremental ingest.
+    
+    Args:
+        change_tracker: Tracker used during the run
+        collection: MongoDB collection object
+        delete_removed: Delete stored products that were not seen in this run
+        complete_scan: Whether this run saw the whole dataset; removals are only detected then
+    """
+    counts = change_tracker.counts
+    print(f"Incremental ingest: {counts['added']} added, {counts['changed']} changed, "
+          f"{counts['unchanged']} unchanged")
+    
+    if not complete_scan:
+        print("Removed products are not detected for resumed runs")
+        return
+    
+    removed_ids = change_tracker.removed_ids()
+    print(f"Incremental ingest: {len(removed_ids)} removed")
+    
+    if delete_removed and removed_ids:
+        deleted_count = 0
+        for i in range(0, len(removed_ids), 1000):
+            result = collection.delete_many({'_id': {'$in': removed_ids[i:i + 1000]}})
+            deleted_count += result.deleted_count
+        print(f"Deleted {deleted_count} removed products from MongoDB")
+
+
+DEFAULT_CHECKPOINT_FILE = "ingest_checkpoint.json"
+DEFAULT_SNAPSHOT_DIR = "catalog_snapshot"
+DEFAULT_SUMMARY_FILE = "ingest_summary.json"
+CHECKPOINT_VERSION = 2
+
+# The Polish catalog keeps the collection and file names used before multi-language ingest
+PRIMARY_LANGUAGE = 'pl'
+CATALOG_COLLECTION = 'products-catalog'
+
+
+def parse_languages(value: str) -> List[str]:
+    """Parse a comma-separated list of language codes, keeping the first occurrence of each."""
+    languages = []
+    for language in value.split(','):
+        language = language.strip().lower()
+        if language and language not in languages:
+            languages.append(language)
+    return languages
+
+
+def catalog_collection_name(language: str) -> str:
+    """Name of the MongoDB collection holding the products of a language."""
+    return CATALOG_COLLECTION if language == PRIMARY_LANGUAGE else f"{CATALOG_COLLECTION}-{language}"
+
+
+def language_filename(filename: str, language: str) -> str:
+    """Name of a per-language output file, e.g. unique_categories_de.json for 'de'."""
+    if language == PRIMARY_LANGUAGE:
+        return filename
+    base, extension = os.path.splitext(filename)
+    return f"{base}_{language}{extension}"
+
+
+def save_checkpoint(filename: str, checkpoint: dict) -> None:
+    """
+    Durably save an ingest checkpoint.
+    
+    The checkpoint is written to a temporary file, synced to disk and then atomically
+    renamed over the previous checkpoint, so a crash never leaves a truncated file.
+    
+    Args:
+        filename: Checkpoint file path
+        checkpoint: JSON-serializable checkpoint data
+    """
+    temp_filename = f"{filename}.tmp"
+    with open(temp_filename, 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_filename, filename)
+
+
+def load_checkpoint(filename: str) -> Optional[dict]:
+    """
+    Load an ingest checkpoint.
+    
+    Args:
+        filename: Checkpoint file path
         
+    Returns:
+        Checkpoint data, or None if there is no usable checkpoint
+    """
+    if not os.path.exists(filename):
+        return None
+    
+    try:
+        with open(filename, 'r', encoding='utf-8') as f:
+            checkpoint = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Error reading checkpoint '{filename}': {e}")
+        return None
+    
+    if checkpoint.get('version') != CHECKPOINT_VERSION:
+        print(f"Ignoring checkpoint '{filename}' with unsupported version {checkpoint.get('version')}")
+        return None
+    return checkpoint
+
+
+def connect_to_catalog(languages: List[str] = (PRIMARY_LANGUAGE,)):
+    """
+    Connect to MongoDB using the MONGO_URI environment variable.
+
+    Args:
+        languages: Language codes whose catalog collections are returned
+
+    Returns:
+        Tuple of (client, dictionary mapping language code to its catalog collection),
+        or (None, None) if the connection failed
+    """
+    from pymongo import MongoClient
+    from pymongo.errors import ConnectionFailure, ConfigurationError
+
+    # Get MongoDB URI from environment variable
+    mongo_uri = os.getenv('MONGO_URI')
+    if not mongo_uri:
+        print("Error: MONGO_URI environment variable not set")
+        print("Please set the MongoDB connection URI in the MONGO_URI environment variable")
+        return None, None
+
+    # Initialize MongoDB connection
+    try:
+        print(f"Connecting to MongoDB...")
+        client = MongoClient(mongo_uri)
+        # Test connection
+        client.admin.command('ping')
+        db = client.get_database()  # Use default database from URI or 'test'
+        collections = {language: db[catalog_collection_name(language)] for language in languages}
+        print("Successfully connected to MongoDB")
+        return client, collections
+    except (ConnectionFailure, ConfigurationError) as e:
+        print(f"Error connecting to MongoDB: {e}")
+        return None, None
+
+
+def create_mongo_writers(collection, writer_count: int) -> List[BulkProductWriter]:
+    """Create one bulk writer per pipeline writer thread, configured from the environment."""
+    batch_size = int(os.getenv('MONGO_BATCH_SIZE', '1000'))
+    write_concern = parse_write_concern(os.getenv('MONGO_WRITE_CONCERN', ''))
+    return [
+        BulkProductWriter(collection, batch_size=batch_size, write_concern=write_concern)
+        for _ in range(writer_count)
+    ]
+
+
+def create_sinks(languages: List[str], writer_count: int, mongo_writers: dict, change_trackers: dict,
+                 pinecone_stream=None, snapshot_writer=None, progress: ProgressReporter = None) -> List[LanguageSink]:
+    """
+    Create one LanguageSink per pipeline writer thread.
+
+    Args:
+        languages: Ingested language codes
+        writer_count: Number of writer threads
+        mongo_writers: Dictionary mapping language code to writer_count bulk writers (empty without MongoDB)
+        change_trackers: Dictionary mapping language code to its ProductChangeTracker (empty when not incremental)
+        pinecone_stream: Optional shared PineconeProductStream
+        snapshot_writer: Optional shared CatalogSnapshotWriter
+        progress: Optional shared ProgressReporter
+
+    Returns:
+        List of writer_count sinks
+    """
+    return [
+        LanguageSink({
+            language: ProductSink(mongo_writers[language][n] if language in mongo_writers else None,
+                                  pinecone_stream, change_trackers.get(language), snapshot_writer, progress)
+            for language in languages
+        })
+        for n in range(writer_count)
+    ]
+
+
+def create_pinecone_stream() -> Optional[PineconeProductStream]:
+    """Create the Pinecone product stream, or return None if Pinecone cannot be set up."""
+    try:
+        return PineconeProductStream(
+            chunk_size=int(os.getenv('PINECONE_CHUNK_SIZE', '256')),
+            skip_unchanged=os.getenv('PINECONE_SKIP_UNCHANGED', 'false').lower() in ('true', '1', 'yes', 'on'))
+    except Exception as e:
+        print(f"Warning: Failed to set up Pinecone upload, products will not be stored in Pinecone: {e}")
+        return None
+
+
+def create_snapshot_writer(directory: str, part_prefix: str = 'part') -> Optional[CatalogSnapshotWriter]:
+    """Create a catalog snapshot writer configured from the environment, or None if that fails."""
+    try:
+        return CatalogSnapshotWriter(
+            directory,
+            file_format=os.getenv('SNAPSHOT_FORMAT', 'parquet').lower(),
+            compression=os.getenv('SNAPSHOT_COMPRESSION', 'zstd').lower(),
+            row_group_size=int(os.getenv('SNAPSHOT_ROW_GROUP_SIZE', '10000')),
+            part_prefix=part_prefix,
+        )
+    except Exception as e:
+        print(f"Warning: Failed to set up the catalog snapshot, no snapshot will be written: {e}")
+        return None
+
+
+def pipeline_options_from_env() -> dict:
+    """Read the IngestPipeline options from the environment."""
+    return {
+        'transform_workers': int(os.getenv('INGEST_TRANSFORM_WORKERS', '2')),
+        'queue_size': int(os.getenv('INGEST_QUEUE_SIZE', '64')),
+        'chunk_size': int(os.getenv('INGEST_CHUNK_SIZE', '100')),
+        # Transform Arrow batches with columnar compute instead of per record (default: true)
+        'vectorized': os.getenv('INGEST_VECTORIZED', 'true').lower() in ('true', '1', 'yes', 'on'),
+        'batch_size': int(os.getenv('INGEST_BATCH_SIZE', '2000')),
+    }
+
+
+# Records of shard file i are at positions i * SHARD_POSITION_STRIDE + row, so aggregates
+# of shards ingested by different processes or machines merge like a sequential run
+SHARD_POSITION_STRIDE = 2 ** 40
+
+# Destinations of the shard worker process, set up once by init_shard_worker()
+_shard_worker = {}
+
+
+def shard_part_prefix(file_index: int) -> str:
+    """Snapshot part file prefix of a shard."""
+    return f"shard-{file_index:05d}"
+
+
+def select_shard_files(files: List[str], shard_index: int, num_shards: int) -> List[tuple]:
+    """
+    Assign dataset files to a shard, round-robin.
+
+    Args:
+        files: All dataset files, in dataset order
+        shard_index: Index of this shard (0 <= shard_index < num_shards)
+        num_shards: Total number of shards (e.g. machines)
+
+    Returns:
+        List of (file_index, path) tuples, file_index being the position in `files`
+    """
+    return [(index, path) for index, path in enumerate(files) if index % num_shards == shard_index]
+
+
+def init_shard_worker(options: dict) -> None:
+    """
+    Set up the destinations of a shard worker process.
+
+    The MongoDB connection, stored content hashes of every language and Pinecone stream
+    are created once per process and reused for every file the process ingests.
+
+    Args:
+        options: Ingest options (see ingest_shards())
+    """
+    _shard_worker.clear()
+    _shard_worker['options'] = options
+    _shard_worker['collections'] = {}
+    _shard_worker['existing_hashes'] = {}
+    _shard_worker['pinecone_stream'] = None
+
+    if options['save_to_mongo']:
+        client, collections = connect_to_catalog(options['languages'])
+        if collections is None:
+            raise RuntimeError("Shard worker could not connect to MongoDB")
+        _shard_worker['client'] = client
+        _shard_worker['collections'] = collections
+        if options['incremental']:
+            _shard_worker['existing_hashes'] = {language: load_product_hashes(collection)
+                                                for language, collection in collections.items()}
+
+    if options['save_to_pinecone']:
+        _shard_worker['pinecone_stream'] = create_pinecone_stream()
+
+
+def ingest_shard_file(file_index: int, path: str) -> dict:
+    """
+    Ingest one dataset file with the destinations of this shard worker process.
+
+    Args:
+        file_index: Position of the file in the dataset file list
+        path: Dataset file path
+
+    Returns:
+        Plain-data results: read count, per-language aggregates (record positions local to
+        the file), per-language change counts and seen product ids, write counters, progress
+        counters and snapshot part files
+    """
+    options = _shard_worker['options']
+    pinecone_stream = _shard_worker['pinecone_stream']
+
+    change_trackers = {language: ProductChangeTracker(existing_hashes)
+                       for language, existing_hashes in _shard_worker['existing_hashes'].items()}
+    mongo_writers = {language: create_mongo_writers(collection, options['writer_count'])
+                     for language, collection in _shard_worker['collections'].items()}
+    all_writers = [writer for writers in mongo_writers.values() for writer in writers]
+
+    snapshot_writer = None
+    if options['snapshot_dir']:
+        snapshot_writer = create_snapshot_writer(options['snapshot_dir'], part_prefix=shard_part_prefix(file_index))
+        if snapshot_writer is not None:
+            snapshot_writer.prepare()
+
+    progress = ProgressReporter(**options['progress'], label=f"[file {file_index}] ")
+    for writer in all_writers:
+        progress.add_latency('mongo_bulk_write', writer.latency)
+    pinecone_before = (0, 0, 0)
+    if pinecone_stream is not None:
+        pinecone_before = (pinecone_stream.uploaded_count, pinecone_stream.failed_count, pinecone_stream.skipped_count)
+        # The stream is flushed after every file, so fresh recorders time exactly this file's requests
+        pinecone_stream.embed_latency = LatencyRecorder()
+        pinecone_stream.upsert_latency = LatencyRecorder()
+        progress.add_latency('pinecone_embed', pinecone_stream.embed_latency)
+        progress.add_latency('pinecone_upsert', pinecone_stream.upsert_latency)
+
+    sinks = create_sinks(options['languages'], options['writer_count'], mongo_writers, change_trackers,
+                         pinecone_stream, snapshot_writer, progress)
+    pipeline = IngestPipeline(sinks, aggregates=LanguageAggregates(), progress=progress, **options['pipeline'])
+    aggregates = pipeline.run(FileRecordSource([path], languages=options['languages']))
+
+    if pinecone_stream is not None:
+        pinecone_stream.flush()
+    if snapshot_writer is not None:
+        snapshot_writer.close()
+
+    pinecone_after = (pinecone_stream.uploaded_count, pinecone_stream.failed_count,
+                      pinecone_stream.skipped_count) if pinecone_stream is not None else (0, 0, 0)
+
+    return {
+        'file_index': file_index,
+        'path': path,
+        'read_count': pipeline.read_count,
+        'aggregates': aggregates.to_dict(),
+        'changes': {language: dict(tracker.counts) for language, tracker in change_trackers.items()},
+        'seen_ids': {language: tracker.seen_ids() for language, tracker in change_trackers.items()},
+        'mongo_writers': [
+            {'batches_flushed': writer.batches_flushed, 'written_count': writer.written_count,
+             'upserted_count': writer.upserted_count, 'modified_count': writer.modified_count,
+             'error_count': writer.error_count, 'errors': writer.errors}
+            for writer in all_writers
+        ],
+        'pinecone': [after - before for before, after in zip(pinecone_before, pinecone_after)],
+        'progress': progress.to_dict(),
+        'snapshot_files': snapshot_writer.files if snapshot_writer is not None else {},
+        'snapshot_failed': snapshot_writer.failed if snapshot_writer is not None else options['snapshot_dir'] is not None,
+    }
+
+
+def merge_shard_results(results: List[dict]) -> LanguageAggregates:
+    """
+    Merge the aggregates of ingested shard files.
+
+    The record positions of each file are offset by file_index * SHARD_POSITION_STRIDE,
+    so the result does not depend on which process ingested which file or in what
+    order the files finished.
+
+    Args:
+        results: Results returned by ingest_shard_file()
+
+    Returns:
+        Merged per-language aggregates, with globally comparable record positions
+    """
+    merged = LanguageAggregates()
+    for result in sorted(results, key=lambda item: item['file_index']):
+        merged.merge(LanguageAggregates.from_dict(result['aggregates']),
+                     position_offset=result['file_index'] * SHARD_POSITION_STRIDE)
+    return merged
+
+
+def ingest_shards(tasks: List[tuple], options: dict, processes: int = 1, completed: List[dict] = None,
+                  on_shard_done=None) -> List[dict]:
+    """
+    Ingest dataset files in parallel worker processes.
+
+    Every worker process runs the staged pipeline on one file at a time with its own
+    MongoDB connection, bulk writers and Pinecone stream.
+
+    Args:
+        tasks: (file_index, path) tuples to ingest
+        options: Ingest options: languages, save_to_mongo, save_to_pinecone, incremental,
+                 writer_count, snapshot_dir, the IngestPipeline options under 'pipeline'
+                 and the ProgressReporter options under 'progress'
+        processes: Number of worker processes (1 ingests the files in this process)
+        completed: Results of files ingested before a resume; these files are skipped
+        on_shard_done: Callback(results so far) called after every finished file
+
+    Returns:
+        Results of all files, ordered by file_index
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    results = list(completed or [])
+    done = {result['file_index'] for result in results}
+    pending = [(file_index, path) for file_index, path in tasks if file_index not in done]
+
+    def finish(result):
+        results.append(result)
+        print(f"Shard file {result['file_index']} done: {result['read_count']} records from {result['path']} "
+              f"({len(results)}/{len(tasks)} files)")
+        if on_shard_done is not None:
+            on_shard_done(results)
+
+    if processes <= 1:
+        init_shard_worker(options)
+        for file_index, path in pending:
+            finish(ingest_shard_file(file_index, path))
+    else:
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=processes, mp_context=context,
+                                 initializer=init_shard_worker, initargs=(options,)) as executor:
+            futures = [executor.submit(ingest_shard_file, file_index, path) for file_index, path in pending]
+            try:
+                for future in as_completed(futures):
+                    finish(future.result())
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+
+    return sorted(results, key=lambda item: item['file_index'])
+
+
+def print_write_summary(writers: list, pinecone_counts: Optional[List[int]]) -> None:
+    """
+    Print the combined MongoDB and Pinecone write summaries of a run.
+
+    Args:
+        writers: BulkProductWriters of the run, or objects with their counters for sharded runs
+        pinecone_counts: Uploaded, failed and skipped product counts (None without Pinecone)
+    """
+    if writers:
+        BulkProductWriter.print_combined_summary(writers)
+    if pinecone_counts is not None:
+        print_upload_summary(*pinecone_counts)
+
+
+def run_metadata(source: str, input_path: Optional[str], dataset_revision: Optional[str]) -> dict:
+    """Dataset fields of a run, recorded in the snapshot manifest and the run summary."""
+    return {
+        'dataset': DATASET_NAME if source != 'local' else None,
+        'dataset_revision': dataset_revision,
+        'source': source,
+        'input_path': input_path,
+    }
+
+
+def finish_snapshot(write_manifest, directory: str, **metadata) -> Optional[dict]:
+    """
+    Write the manifest of the catalog snapshot of a run and report it.
+
+    Args:
+        write_manifest: Function writing the manifest from its metadata fields and returning it,
+                        or None if the snapshot is incomplete; it may also return None for that
+        directory: Snapshot directory
+        **metadata: Manifest fields (see run_metadata()), languages, record counts and shards
+
+    Returns:
+        The manifest, or None if the snapshot is incomplete
+    """
+    manifest = write_manifest(**metadata) if write_manifest is not None else None
+    if manifest is None:
+        print("Catalog snapshot is incomplete - no manifest was written")
+    else:
+        print(f"Catalog snapshot with {manifest['row_count']} products saved to '{directory}' "
+              f"(revision: {metadata.get('dataset_revision') or 'unknown'})")
+    return manifest
+
+
+def save_shard_aggregates(aggregates: LanguageAggregates, shard_index: int, num_shards: int) -> str:
+    """
+    Save the aggregates of one shard of a multi-machine ingest for merge_aggregate_files().
+
+    Returns:
+        The file name
+    """
+    filename = f"ingest_aggregates_shard_{shard_index}_of_{num_shards}.json"
+    with open(filename, 'w', encoding='utf-8') as f:
+        json.dump({'shard_index': shard_index, 'num_shards': num_shards,
+                   'aggregates': aggregates.to_dict()}, f, ensure_ascii=False)
+    print(f"Shard aggregates saved to '{filename}' - merge them with --merge-aggregates")
+    return filename
+
+
+def merge_aggregate_files(filenames: List[str]) -> LanguageAggregates:
+    """
+    Merge the aggregates saved by the shards of a multi-machine ingest.
+
+    Record positions are global (see SHARD_POSITION_STRIDE), so the result is the same
+    whatever the order of the files.
+
+    Args:
+        filenames: Files written by save_shard_aggregates()
+
+    Returns:
+        Merged per-language aggregates
+    """
+    merged = LanguageAggregates()
+    shards = set()
+    for filename in sorted(filenames):
+        with open(filename, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        shards.add(data['shard_index'])
+        merged.merge(LanguageAggregates.from_dict(data['aggregates']))
+        num_shards = data['num_shards']
+
+    if filenames and len(shards) != num_shards:
+        missing = sorted(set(range(num_shards)) - shards)
+        print(f"Warning: aggregates of shards {missing} are missing - the merged result is incomplete")
+    return merged
+
+
+def download_from_huggingface(resume: bool = False, checkpoint_file: str = DEFAULT_CHECKPOINT_FILE,
+                              checkpoint_interval: int = 100000, input_path: str = None,
+                              processes: int = 1, shard_index: int = 0, num_shards: int = 1,
+                              log_level: str = 'info', progress_interval: float = 10.0,
+                              summary_file: Optional[str] = DEFAULT_SUMMARY_FILE, languages: List[str] = None):
+    """
+    Download records from the OpenFoodFacts dataset on Hugging Face and optionally store in MongoDB.
+    
+    Args:
+        resume: Continue from the checkpoint in checkpoint_file instead of starting from the first record
+        checkpoint_file: File used to persist ingest checkpoints
+        checkpoint_interval: Number of records read between checkpoints (0 disables checkpoints)
+        input_path: Local parquet / Arrow IPC / JSON / JSONL snapshot (file, directory or glob)
+                    to ingest instead of downloading from Hugging Face
+        processes: Number of worker processes ingesting dataset files in parallel
+        shard_index: Index of the slice of dataset files ingested by this machine
+        num_shards: Number of slices the dataset files are split into
+        log_level: 'quiet' (final summary only), 'info' (periodic progress lines) or 'debug' (a line per product)
+        progress_interval: Seconds between progress lines
+        summary_file: File the machine-readable run summary is written to (None disables it)
+        languages: Language codes ingested in one pass, each into its own collection and
+                   unique_* files (default: ['pl'])
+    """
+    languages = list(languages or [PRIMARY_LANGUAGE])
+    try:
         # Check if we should save to MongoDB (default: true)
         save_to_mongo = os.getenv('SAVE_TO_MONGO', 'true').lower() in ('true', '1', 'yes', 'on')
         
         # Check if we should save to Pinecone (default: false)
         save_to_pinecone = os.getenv('SAVE_TO_PINECONE', 'false').lower() in ('true', '1', 'yes', 'on')
         
+        # Source of the records: 'streaming' (datasets library) or 'parquet' (Arrow reader)
+        source = 'local' if input_path else os.getenv('INGEST_SOURCE', 'streaming').lower()
+        
+        # Split the dataset files across processes and/or machines
+        sharded = processes > 1 or num_shards > 1
+        if sharded and source == 'streaming':
+            print("Sharded ingest reads the dataset's parquet files - using the parquet source")
+            source = 'parquet'
+        
+        # Pipeline configuration
+        pipeline_options = pipeline_options_from_env()
+        writer_count = max(1, int(os.getenv('INGEST_WRITERS', '2')))
+        
+        # Progress lines every progress_interval seconds and/or INGEST_PROGRESS_RECORDS records
+        progress_options = {
+            'interval_seconds': progress_interval,
+            'interval_records': int(os.getenv('INGEST_PROGRESS_RECORDS', '0')),
+            'log_level': log_level,
+        }
+        progress = ProgressReporter(**progress_options)
+        
+        # Only write products that were added or changed since the last run (default: true)
+        incremental = os.getenv('INGEST_INCREMENTAL', 'true').lower() in ('true', '1', 'yes', 'on')
+        
+        # Delete stored products that are no longer in the dataset (default: false)
+        delete_removed = os.getenv('INGEST_DELETE_REMOVED', 'false').lower() in ('true', '1', 'yes', 'on')
+        
+        # Check if we should write the columnar catalog snapshot (default: true)
+        save_to_snapshot = os.getenv('SAVE_TO_SNAPSHOT', 'true').lower() in ('true', '1', 'yes', 'on')
+        snapshot_dir = os.getenv('SNAPSHOT_DIR', DEFAULT_SNAPSHOT_DIR)
+        
         client = None
-        collection = None
+        collections = {}
+        mongo_writers = {}  # Language code -> bulk writers, one per sink
+        change_trackers = {}  # Language code -> ProductChangeTracker
+        change_counts = None
         
+        print(f"Languages: {', '.join(languages)}")
         if save_to_mongo:
-            from pymongo import MongoClient
-            from pymongo.errors import ConnectionFailure, ConfigurationError
-            
-            # Get MongoDB URI from environment variable
-            mongo_uri = os.getenv('MONGO_URI')
-            if not mongo_uri:
-                print("Error: MONGO_URI environment variable not set")
-                print("Please set the MongoDB connection URI in the MONGO_URI environment variable")
+            client, collections = connect_to_catalog(languages)
+            if collections is None:
                 return []
             
-            # Initialize MongoDB connection
-            try:
-                print(f"Connecting to MongoDB...")
-                client = MongoClient(mongo_uri)
-                # Test connection
-                client.admin.command('ping')
-                db = client.get_database()  # Use default database from URI or 'test'
-                collection = db['products-catalog']
-                print("Successfully connected to MongoDB")
-            except (ConnectionFailure, ConfigurationError) as e:
-                print(f"Error connecting to MongoDB: {e}")
-                return []
+            # Buffer upserts and send them as unordered bulk writes, one writer per sink and language
+            if not sharded:
+                mongo_writers = {language: create_mongo_writers(collection, writer_count)
+                                 for language, collection in collections.items()}
+            print(f"MongoDB bulk writes enabled (batch size: {int(os.getenv('MONGO_BATCH_SIZE', '1000'))}, "
+                  f"collections: {', '.join(collection.name for collection in collections.values())})")
+            
+            # Sharded runs classify products in the worker processes, which load the content
+            # hashes; removals are detected here and only need the stored ids
+            if incremental and not (sharded and (num_shards > 1 or resume)):
+                if sharded:
+                    print("Loading ids of stored products to detect removed products...")
+                else:
+                    print("Loading content hashes of stored products for incremental ingest...")
+                for language, collection in collections.items():
+                    stored = load_product_ids(collection) if sharded else load_product_hashes(collection)
+                    change_trackers[language] = ProductChangeTracker(stored)
+                    print(f"Loaded {len(stored)} stored products from '{collection.name}'")
         else:
             print("SAVE_TO_MONGO is disabled - data will be processed but not stored in MongoDB")
         
@@ -97,155 +1711,259 @@ def download_from_huggingface():
         else:
             print("SAVE_TO_PINECONE is disabled - products will not be stored in Pinecone")
         
-        print("Downloading dataset from Hugging Face...")
-        print("Dataset: openfoodfacts/product-database")
-        
-        # Load dataset in streaming mode for efficiency
-        dataset = load_dataset('openfoodfacts/product-database', split='food', streaming=True)
+        if source == 'local':
+            # Read a local snapshot in the dataset schema - parquet and Arrow files are memory-mapped
+            local_files = list_local_files(input_path)
+            if not local_files:
+                print(f"Error: no parquet, Arrow, JSON or JSONL files found at '{input_path}'")
+                return []
+            print(f"Reading {len(local_files)} local dataset files from '{input_path}'")
+            dataset_files = local_files
+        elif source == 'parquet':
+            print("Downloading dataset from Hugging Face...")
+            print(f"Dataset: {DATASET_NAME}")
+            
+            # Read the parquet shards with Arrow - the language filter and column projection
+            # are applied by the reader, so only records in the ingested languages are materialized
+            parquet_files = list_dataset_parquet_files(split='food')
+            print(f"Reading {len(parquet_files)} parquet shards with Arrow (lang filter and column projection pushed down)")
+            dataset_files = parquet_files
+        else:
+            from datasets import load_dataset
+            
+            print("Downloading dataset from Hugging Face...")
+            print(f"Dataset: {DATASET_NAME}")
+            
+            # Load dataset in streaming mode for efficiency
+            dataset = load_dataset(DATASET_NAME, split='food', streaming=True)
+            
+            # Filter dataset to only include records in the ingested languages using built-in filter method
+            language_set = set(languages)
+            dataset = dataset.filter(lambda record: record.get('lang') in language_set)
         
-        # Filter dataset to only include Polish records using built-in filter method
-        dataset = dataset.filter(lambda record: record.get('lang') == 'pl')
+        if source != 'streaming' and not sharded:
+            dataset = FileRecordSource(dataset_files, languages=languages)
         
         print("Dataset loaded successfully!")
+        
+        # Restore the source position and partial aggregates from the last checkpoint
+        checkpoint = load_checkpoint(checkpoint_file) if resume else None
+        if resume and checkpoint is None:
+            print(f"No checkpoint found in '{checkpoint_file}' - starting from the first record")
+        if checkpoint is not None:
+            if checkpoint.get('source') != source:
+                print(f"Error: checkpoint was created with source '{checkpoint.get('source')}', "
+                      f"but the current source is '{source}'")
+                return []
+            if checkpoint.get('languages') != languages:
+                print(f"Error: checkpoint was created for languages {checkpoint.get('languages')}, "
+                      f"but the current languages are {languages}")
+                return []
+            checkpoint_shards = checkpoint.get('shards')
+            if checkpoint_shards != ({'shard_index': shard_index, 'num_shards': num_shards} if sharded else None):
+                print(f"Error: checkpoint was created with a different shard setup ({checkpoint_shards})")
+                return []
+            if sharded:
+                print(f"Resuming from checkpoint saved at {checkpoint.get('saved_at')} "
+                      f"after {len(checkpoint['completed'])} completed files")
+            else:
+                dataset.load_state_dict(checkpoint['source_state'])
+                print(f"Resuming from checkpoint saved at {checkpoint.get('saved_at')} "
+                      f"after {checkpoint['read_count']} records")
+        
+        # Revision of the dataset the products are built from, recorded in the snapshot manifest
+        dataset_revision = checkpoint.get('dataset_revision') if checkpoint else None
+        if dataset_revision is None and save_to_snapshot and source != 'local':
+            dataset_revision = get_dataset_revision(DATASET_NAME)
+        
         if save_to_mongo:
             print("Extracting and storing records in MongoDB...")
         else:
             print("Extracting records (MongoDB storage disabled)...")
-        langs_map = {}
         
-        unique_food_groups = set()  # Collect unique food group tags
-        unique_categories = set()  # Collect unique category tags
-        unique_last_categories = {}  # Collect unique last category mapping to full path
-        products_for_pinecone = []  # Collect products for Pinecone upload
+        if sharded:
+            tasks = select_shard_files(dataset_files, shard_index, num_shards)
+            print(f"Sharded ingest: shard {shard_index + 1} of {num_shards} with {len(tasks)} of "
+                  f"{len(dataset_files)} files, {processes} worker process{'es' if processes != 1 else ''}")
+        
+            if save_to_snapshot:
+                # Keep the snapshot parts of the files completed before a resume
+                completed_prefixes = [shard_part_prefix(result['file_index'])
+                                      for result in (checkpoint['completed'] if checkpoint else [])]
+                clear_snapshot(snapshot_dir, keep_prefixes=completed_prefixes)
+                snapshot_started_at = datetime.now()
+                print(f"SAVE_TO_SNAPSHOT is enabled - products will be written to a snapshot in '{snapshot_dir}'")
+            else:
+                print("SAVE_TO_SNAPSHOT is disabled - no catalog snapshot will be written")
+        
+            def on_shard_done(results):
+                """Persist the files completed so far, so --resume skips them."""
+                if checkpoint_interval <= 0:
+                    return
+                save_checkpoint(checkpoint_file, {
+                    'version': CHECKPOINT_VERSION,
+                    'source': source,
+                    'languages': languages,
+                    'shards': {'shard_index': shard_index, 'num_shards': num_shards},
+                    'dataset_revision': dataset_revision,
+                    # Product ids are only needed to detect removals, which resumed runs skip
+                    'completed': [dict(result, seen_ids={}) for result in results],
+                    'saved_at': datetime.now().isoformat(),
+                })
+        
+            options = {
+                'languages': languages,
+                'save_to_mongo': save_to_mongo,
+                'save_to_pinecone': save_to_pinecone,
+                'incremental': incremental,
+                'writer_count': writer_count,
+                'snapshot_dir': snapshot_dir if save_to_snapshot else None,
+                'pipeline': pipeline_options,
+                'progress': progress_options,
+            }
+            results = ingest_shards(tasks, options, processes=processes,
+                                    completed=checkpoint['completed'] if checkpoint else None,
+                                    on_shard_done=on_shard_done)
         
-        # Process records and optionally store directly in MongoDB
-        skipped_count = 0
-        for i, record in enumerate(dataset):
-            # if i >= 5:
-            #     break
+            aggregates = merge_shard_results(results)
+            read_count = sum(result['read_count'] for result in results)
+            for result in results:
+                progress.merge(result['progress'])
+            stage_stats = None
+            writers = [SimpleNamespace(**stats) for result in results for stats in result['mongo_writers']]
+            pinecone_counts = [sum(result['pinecone'][i] for result in results) for i in range(3)]
             
-            # Validate product before processing
-            if not is_valid_product(record):
-                skipped_count += 1
-                if skipped_count <= 10:  # Log first 10 skipped products for debugging
-                    print(f"Skipped product {record.get('code', 'unknown')}: Missing valid product name or category without ':'")
-                continue
+            if change_trackers:
+                for result in results:
+                    for language, tracker in change_trackers.items():
+                        tracker.merge(result['changes'].get(language, {}), result['seen_ids'].get(language, []))
+            elif incremental and save_to_mongo:
+                change_counts = {}
+                for language in languages:
+                    change_counts[language] = counts = {'added': 0, 'changed': 0, 'unchanged': 0}
+                    for result in results:
+                        for status, count in result['changes'].get(language, {}).items():
+                            counts[status] += count
+                    print(f"Incremental ingest ({language}): {counts['added']} added, {counts['changed']} changed, "
+                          f"{counts['unchanged']} unchanged")
+                print("Removed products are not detected for resumed or multi-machine runs")
             
-            # Extract unique product names from product_name array
-            product_names = record.get('product_name', [])
-            unique_product_names = []
-            if isinstance(product_names, list):
-                seen_texts = set()
-                for name_obj in product_names:
-                    if isinstance(name_obj, dict) and 'text' in name_obj:
-                        text = name_obj['text']
-                        if text and text not in seen_texts:
-                            unique_product_names.append(text)
-                            seen_texts.add(text)
+            if save_to_snapshot:
+                snapshot_files = {}
+                for result in results:
+                    snapshot_files.update(result['snapshot_files'])
+                write_manifest = None
+                if not any(result['snapshot_failed'] for result in results):
+                    write_manifest = functools.partial(
+                        save_manifest, snapshot_dir, snapshot_files, os.getenv('SNAPSHOT_FORMAT', 'parquet').lower(),
+                        os.getenv('SNAPSHOT_COMPRESSION', 'zstd').lower(), snapshot_started_at)
+                finish_snapshot(write_manifest, snapshot_dir, **run_metadata(source, input_path, dataset_revision),
+                                languages=languages, shard_index=shard_index, num_shards=num_shards,
+                                records_read=read_count, skipped_count=aggregates.skipped_count)
             
-            # Build search_string by concatenating specified fields
-            search_components = []
+            if num_shards > 1:
+                save_shard_aggregates(aggregates, shard_index, num_shards)
+        else:
+            # Write every product to a compressed columnar snapshot with a manifest
+            snapshot_writer = None
+            if save_to_snapshot:
+                snapshot_writer = create_snapshot_writer(snapshot_dir)
+                if snapshot_writer is not None:
+                    try:
+                        snapshot_writer.prepare(resume_position=checkpoint['read_count'] if checkpoint else None)
+                        print(f"SAVE_TO_SNAPSHOT is enabled - products will be written to a "
+                              f"{snapshot_writer.file_format} snapshot in '{snapshot_dir}'")
+                    except Exception as e:
+                        print(f"Warning: Failed to set up the catalog snapshot, no snapshot will be written: {e}")
+                        snapshot_writer = None
+            else:
+                print("SAVE_TO_SNAPSHOT is disabled - no catalog snapshot will be written")
             
-            # Add unique product names
-            search_components.extend(unique_product_names)
+            def on_checkpoint(source_state, read_count, checkpoint_aggregates):
+                """Persist the position reached and the aggregates collected so far."""
+                # Close the snapshot part holding the products read so far before recording the position
+                if snapshot_writer is not None:
+                    snapshot_writer.roll(read_count)
+                save_checkpoint(checkpoint_file, {
+                    'version': CHECKPOINT_VERSION,
+                    'source': source,
+                    'languages': languages,
+                    'dataset_revision': dataset_revision,
+                    'source_state': source_state,
+                    'read_count': read_count,
+                    'aggregates': checkpoint_aggregates.to_dict(),
+                    'saved_at': datetime.now().isoformat(),
+                })
+                print(f"Checkpoint saved after {read_count} records to '{checkpoint_file}'")
             
-            # Add quantity
-            quantity = record.get('quantity', '')
-            if quantity:
-                search_components.append(quantity)
+            # Embed and upload products to Pinecone in chunks as they flow through the pipeline
+            pinecone_stream = create_pinecone_stream() if save_to_pinecone else None
             
-            # Add brands  
-            brands = record.get('brands', '')
-            if brands:
-                search_components.append(brands)
+            all_writers = [writer for writers in mongo_writers.values() for writer in writers]
+            for writer in all_writers:
+                progress.add_latency('mongo_bulk_write', writer.latency)
+            if pinecone_stream is not None:
+                progress.add_latency('pinecone_embed', pinecone_stream.embed_latency)
+                progress.add_latency('pinecone_upsert', pinecone_stream.upsert_latency)
             
-            # Add categories
-            categories = record.get('categories', '')
-            if categories:
-                search_components.append(categories)
+            # Every writer thread routes the products of each language to that language's collection
+            sinks = create_sinks(languages, writer_count, mongo_writers, change_trackers, pinecone_stream,
+                                 snapshot_writer, progress)
+            print(f"Ingest pipeline: {pipeline_options['transform_workers']} transform workers, {writer_count} writers")
             
-            # Add labels
-            labels = record.get('labels', '')
-            if labels:
-                search_components.append(labels)
+            # Process records through the reader -> transform -> writer pipeline
+            pipeline = IngestPipeline(
+                sinks, checkpoint_interval=checkpoint_interval, on_checkpoint=on_checkpoint,
+                aggregates=LanguageAggregates.from_dict(checkpoint['aggregates']) if checkpoint else LanguageAggregates(),
+                start_count=checkpoint['read_count'] if checkpoint else 0,
+                progress=progress,
+                **pipeline_options,
+            )
+            aggregates = pipeline.run(dataset)
+            read_count = pipeline.read_count
+            pipeline.print_stats()
+            stage_stats = pipeline.stage_stats()
             
-            # Create space-separated search string (lowercase)
-            search_string = ' '.join(search_components).lower().replace(',', ' ')
-
-            product = {
-                '_id': record.get('code'),
-                'lang': record.get('lang'),
-                'product_name': record.get('product_name'),
-                'brands': record.get('brands'),
-                'food_groups_tags': record.get('food_groups_tags'),
-                'product_quantity_unit': record.get('product_quantity_unit'),
-                'product_quantity': record.get('product_quantity'),
-                'quantity': record.get('quantity'),
-                'categories_tags': record.get('categories_tags'),
-                'categories': [c.strip() for c in record.get('categories', '').split(',') if record.get('categories')] if record.get('categories') else [],
-                'labels_tags': record.get('labels_tags'),
-                'labels': [l.strip() for l in record.get('labels', '').split(',') if record.get('labels')] if record.get('labels') else [],
-                'popularity_key': record.get('popularity_key'),
-                'popularity_tags': record.get('popularity_tags'),
-                'nutriscore_grade': record.get('nutriscore_grade'),
-                'nutriscore_score': record.get('nutriscore_score'),
-                'search_string': search_string,
-            }
+            # Upload the last partial chunk to Pinecone
+            if pinecone_stream is not None:
+                pinecone_stream.close()
             
-            # Store product directly in MongoDB (upsert to handle duplicates) if enabled
-            if save_to_mongo and collection is not None:
-                try:
-                    collection.replace_one({'_id': product['_id']}, product, upsert=True)
-                except Exception as e:
-                    print(f"Error upserting product {product.get('_id')}: {e}")
-                    continue
-
-            # Collect product for Pinecone upload if enabled
-            if save_to_pinecone:
-                products_for_pinecone.append(product)
-
-            # Collect unique food groups tags
-            food_groups_tags = record.get('food_groups_tags', [])
-            if food_groups_tags:
-                # Add all tags to unique set
-                unique_food_groups.update(food_groups_tags)
-
-            # Collect unique categories from categories field
-            categories = record.get('categories', '')
-            if categories:
-                # Split by comma and add each category to unique set
-                category_list = [c.strip() for c in categories.split(',') if c.strip()]
-                unique_categories.update(category_list)
-                
-                # Build mapping from last category to full path, skipping categories with ":"
-                if category_list:
-                    # Filter out categories containing ":"
-                    filtered_categories = [cat for cat in category_list if ':' not in cat]
-                    
-                    if filtered_categories:
-                        # Get the last category
-                        last_category = filtered_categories[-1]
-                        
-                        # Build full path using ">" separator
-                        full_path = " > ".join(filtered_categories)
-                        
-                        # Store the mapping
-                        unique_last_categories[last_category] = full_path
-
-            lang = record.get('lang', "None_LANG_ATTRIBUTE")
-            langs_map[lang] = langs_map.get(lang, 0) + 1
-
-            if save_to_mongo:
-                print(f"Record {i + 1}: {product.get('_id')} - Stored in MongoDB")
-            else:
-                print(f"Record {i + 1}: {product.get('_id')} - Processed (MongoDB storage disabled)")
+            if snapshot_writer is not None:
+                snapshot_writer.close()
+                finish_snapshot(snapshot_writer.write_manifest, snapshot_writer.directory,
+                                **run_metadata(source, input_path, dataset_revision), languages=languages,
+                                records_read=read_count, skipped_count=aggregates.skipped_count)
             
+            writers = all_writers
+            pinecone_counts = ([pinecone_stream.uploaded_count, pinecone_stream.failed_count,
+                                pinecone_stream.skipped_count] if pinecone_stream is not None else [0, 0, 0])
+        
+        print_write_summary(writers, pinecone_counts if save_to_pinecone else None)
+        mongo_counts = BulkProductWriter.combined_counts(writers)
+        
+        # The run completed - a later run should start from the beginning again
+        if os.path.exists(checkpoint_file):
+            os.remove(checkpoint_file)
+        
+        for language, tracker in change_trackers.items():
+            print(f"Collection '{collections[language].name}':")
+            report_incremental_changes(tracker, collections[language], delete_removed, complete_scan=checkpoint is None)
+
+        # Build the search indexes once here, so searches never create them on the query path,
+        # and start a new catalog generation, which invalidates cached search results
+        for collection in collections.values():
+            try:
+                bootstrap_indexes(collection)
+                record_catalog_generation(collection)
+            except Exception as e:
+                print(f"Error preparing '{collection.name}' for search: {e}")
 
         print("Language distribution:")
-        for lang, count in langs_map.items():
+        for lang, count in aggregates.langs_map.items():
             print(f" - {lang}: {count}")
         
-        processed_count = i + 1 - skipped_count  # Total processed minus skipped
+        skipped_count = aggregates.skipped_count
+        processed_count = read_count - skipped_count  # Total processed minus skipped
         if save_to_mongo:
             print(f"Successfully processed and stored {processed_count} records in MongoDB")
         else:
@@ -254,18 +1972,28 @@ def download_from_huggingface():
         if skipped_count > 0:
             print(f"Skipped {skipped_count} invalid products (missing valid name or categories with ':')")
 
-        save_unique_food_groups_to_json(unique_food_groups)
-        save_unique_categories_to_json(unique_categories)
-        save_unique_last_categories_to_json(unique_last_categories)
+        save_language_aggregates(aggregates, languages)
         
-        # Process products to Pinecone if enabled
-        if save_to_pinecone:
-            print(f"\nProcessing {len(products_for_pinecone)} products for Pinecone...")
-            pinecone_success = process_products_to_pinecone(products_for_pinecone)
-            if pinecone_success:
-                print("Products successfully processed and uploaded to Pinecone")
-            else:
-                print("Warning: Failed to process products to Pinecone")
+        # Throughput, skip rate and write latencies of this run, also saved as JSON for monitoring
+        summary = progress.summary(
+            **run_metadata(source, input_path, dataset_revision),
+            resumed=checkpoint is not None,
+            processes=processes,
+            shard_index=shard_index,
+            num_shards=num_shards,
+            total_records_read=read_count,
+            languages={language: {'valid_count': aggregates.for_language(language).langs_map.get(language, 0),
+                                  'skipped_count': aggregates.for_language(language).skipped_count}
+                       for language in languages},
+            stages=stage_stats,
+            mongo=mongo_counts if save_to_mongo else None,
+            pinecone=dict(zip(('uploaded', 'failed', 'skipped'), pinecone_counts)) if save_to_pinecone else None,
+            changes={language: dict(tracker.counts) for language, tracker in change_trackers.items()} or change_counts,
+        )
+        print_run_summary(summary)
+        if summary_file:
+            save_summary(summary_file, summary)
+            print(f"Ingest summary saved to '{summary_file}'")
         
         # Close MongoDB connection if it was opened
         if client:
@@ -279,12 +2007,31 @@ def download_from_huggingface():
         return []
 
 
+def save_language_aggregates(aggregates: LanguageAggregates, languages: List[str]) -> None:
+    """
+    Save the unique food group, category and last category files of every language.
+
+    The files of the primary language keep their plain names, the files of other
+    languages get the language code as suffix (e.g. unique_categories_de.json).
+
+    Args:
+        aggregates: Per-language aggregates of the run
+        languages: Language codes to save files for
+    """
+    for language in languages:
+        language_aggregates = aggregates.for_language(language)
+        save_unique_food_groups_to_json(language_aggregates.unique_food_groups,
+                                        language_filename("unique_food_groups.json", language))
+        save_unique_categories_to_json(language_aggregates.unique_categories,
+                                       language_filename("unique_categories.json", language))
+        save_unique_last_categories_to_json(language_aggregates.unique_last_categories,
+                                            language_filename("unique_last_categories.json", language))
+
+
 
 
-def save_unique_food_groups_to_json(unique_food_groups: set) -> None:
+def save_unique_food_groups_to_json(unique_food_groups: set, filename: str = "unique_food_groups.json") -> None:
     """Save unique food group tags to a separate file."""
-    filename = "unique_food_groups.json"
-    
     try:
         # Convert set to sorted list for consistent output
         unique_list = sorted(list(unique_food_groups))
@@ -297,10 +2044,8 @@ def save_unique_food_groups_to_json(unique_food_groups: set) -> None:
 
 
 
-def save_unique_categories_to_json(unique_categories: set) -> None:
+def save_unique_categories_to_json(unique_categories: set, filename: str = "unique_categories.json") -> None:
     """Save unique category tags to a separate file."""
-    filename = "unique_categories.json"
-    
     try:
         # Convert set to sorted list for consistent output
         unique_list = sorted(list(unique_categories))
@@ -313,10 +2058,8 @@ def save_unique_categories_to_json(unique_categories: set) -> None:
 
 
 
-def save_unique_last_categories_to_json(unique_last_categories: dict) -> None:
+def save_unique_last_categories_to_json(unique_last_categories: dict, filename: str = "unique_last_categories.json") -> None:
     """Save unique last category mappings to a separate file."""
-    filename = "unique_last_categories.json"
-    
     try:
         # Save as dictionary with sorted keys for consistent output
         with open(filename, 'w', encoding='utf-8') as f:
@@ -330,6 +2073,49 @@ def save_unique_last_categories_to_json(unique_last_categories: dict) -> None:
 
 def main():
     """Main function to download and optionally store food records in MongoDB."""
+    parser = argparse.ArgumentParser(description='Download OpenFoodFacts products and store them in MongoDB')
+    parser.add_argument('--resume', action='store_true',
+                        help='Continue an interrupted run from its last checkpoint')
+    parser.add_argument('--checkpoint-file', default=DEFAULT_CHECKPOINT_FILE,
+                        help=f'Checkpoint file path (default: {DEFAULT_CHECKPOINT_FILE})')
+    parser.add_argument('--checkpoint-interval', type=int,
+                        default=int(os.getenv('INGEST_CHECKPOINT_INTERVAL', '100000')),
+                        help='Number of records between checkpoints, 0 disables checkpoints (default: 100000)')
+    parser.add_argument('-i', '--input', default=os.getenv('INGEST_INPUT_PATH'),
+                        help='Ingest a local parquet / Arrow IPC / JSON / JSONL snapshot (file, directory or glob) '
+                             'instead of downloading from Hugging Face')
+    parser.add_argument('-w', '--workers', type=int, default=int(os.getenv('INGEST_PROCESSES', '1')),
+                        help='Number of worker processes ingesting dataset files in parallel (default: 1)')
+    parser.add_argument('--shard-index', type=int, default=int(os.getenv('INGEST_SHARD_INDEX', '0')),
+                        help='Index of the slice of dataset files ingested by this machine (default: 0)')
+    parser.add_argument('--num-shards', type=int, default=int(os.getenv('INGEST_NUM_SHARDS', '1')),
+                        help='Number of slices the dataset files are split into, e.g. one per machine (default: 1)')
+    parser.add_argument('--merge-aggregates', nargs='+', metavar='FILE',
+                        help='Merge the aggregates saved by the shards of a multi-machine ingest into the '
+                             'unique_*.json files instead of downloading')
+    parser.add_argument('-l', '--languages', type=parse_languages,
+                        default=parse_languages(os.getenv('INGEST_LANGUAGES', PRIMARY_LANGUAGE)),
+                        help='Comma-separated language codes ingested in one pass, each into its own collection '
+                             f'(default: {PRIMARY_LANGUAGE})')
+    parser.add_argument('--log-level', choices=list(LOG_LEVELS), default=os.getenv('INGEST_LOG_LEVEL', 'info'),
+                        help="'quiet' prints only the final summary, 'info' adds periodic progress lines, "
+                             "'debug' adds a line per product (default: info)")
+    parser.add_argument('--progress-interval', type=float,
+                        default=float(os.getenv('INGEST_PROGRESS_INTERVAL', '10')),
+                        help='Seconds between progress lines, 0 disables the time interval (default: 10)')
+    parser.add_argument('--summary-file', default=os.getenv('INGEST_SUMMARY_FILE', DEFAULT_SUMMARY_FILE),
+                        help=f'File the JSON run summary is written to, empty to disable (default: {DEFAULT_SUMMARY_FILE})')
+    
+    args = parser.parse_args()
+    if args.num_shards < 1 or not 0 <= args.shard_index < args.num_shards:
+        parser.error('--shard-index must be between 0 and --num-shards - 1')
+    
+    if args.merge_aggregates:
+        aggregates = merge_aggregate_files(args.merge_aggregates)
+        print(f"Merged the aggregates of {len(args.merge_aggregates)} shards")
+        save_language_aggregates(aggregates, sorted(aggregates.languages))
+        return
+    
     print("OpenFoodFacts Product Downloader")
     save_to_mongo = os.getenv('SAVE_TO_MONGO', 'true').lower() in ('true', '1', 'yes', 'on')
     save_to_pinecone = os.getenv('SAVE_TO_PINECONE', 'false').lower() in ('true', '1', 'yes', 'on')
@@ -344,11 +2130,21 @@ def main():
     else:
         print("Pinecone integration disabled")
     
-    print("Source: https://huggingface.co/datasets/openfoodfacts/product-database")
+    if args.input:
+        print(f"Source: local snapshot {args.input}")
+    else:
+        print("Source: https://huggingface.co/datasets/openfoodfacts/product-database")
+    if args.num_shards > 1:
+        print(f"Shard: {args.shard_index} of {args.num_shards} (0-based)")
     print()
     
     # Try to download from Hugging Face
-    download_from_huggingface()
+    download_from_huggingface(resume=args.resume, checkpoint_file=args.checkpoint_file,
+                              checkpoint_interval=args.checkpoint_interval, input_path=args.input,
+                              processes=max(1, args.workers), shard_index=args.shard_index,
+                              num_shards=args.num_shards, log_level=args.log_level,
+                              progress_interval=args.progress_interval, summary_file=args.summary_file or None,
+                              languages=args.languages)
     
     print(f"Processing complete!")
     
@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""
+Progress and throughput reporting for the product ingest.
+Prints periodic progress lines (records/s, bytes read, skip rate, MongoDB and Pinecone
+write latency percentiles) instead of one line per record, and builds a machine-readable
+summary of the run.
+"""
+
+import json
+import os
+import random
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+# Log levels: 'quiet' prints only the final summary, 'info' adds periodic progress lines,
+# 'debug' adds a line for every product written
+LOG_LEVELS = {'quiet': 0, 'info': 1, 'debug': 2}
+SUMMARY_VERSION = 1
+PERCENTILES = (50, 95, 99)
+
+
+def format_bytes(count: int) -> str:
+    """Format a byte count with a binary unit."""
+    value = float(count)
+    for unit in ('B', 'KiB', 'MiB', 'GiB'):
+        if value < 1024 or unit == 'GiB':
+            return f"{value:.0f} {unit}" if unit == 'B' else f"{value:.1f} {unit}"
+        value /= 1024
+
+
+class LatencyRecorder:
+    """
+    Thread-safe recorder of operation latencies.
+
+    Keeps the exact count, total and maximum, and a uniform reservoir sample of at most
+    max_samples latencies for the percentiles, so memory stays flat on long runs.
+    """
+
+    def __init__(self, max_samples: int = 10000):
+        """
+        Args:
+            max_samples: Maximum number of latencies kept for the percentiles
+        """
+        self.max_samples = max(1, max_samples)
+        self.count = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self._samples = []
+        self._random = random.Random(0)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        """Record the latency of one operation."""
+        with self._lock:
+            self.count += 1
+            self.total_seconds += seconds
+            self.max_seconds = max(self.max_seconds, seconds)
+            if len(self._samples) < self.max_samples:
+                self._samples.append(seconds)
+            else:
+                index = self._random.randrange(self.count)
+                if index < self.max_samples:
+                    self._samples[index] = seconds
+
+    def merge(self, other: 'LatencyRecorder') -> None:
+        """Add the latencies recorded by another recorder."""
+        data = other.to_dict()
+        with self._lock:
+            self._merge_dict(data)
+
+    def percentiles(self) -> Dict[str, Optional[float]]:
+        """Latency percentiles in milliseconds (None when nothing was recorded)."""
+        with self._lock:
+            samples = sorted(self._samples)
+        result = {}
+        for percentile in PERCENTILES:
+            if samples:
+                index = min(len(samples) - 1, int(round(percentile / 100 * (len(samples) - 1))))
+                result[f'p{percentile}_ms'] = round(samples[index] * 1000, 3)
+            else:
+                result[f'p{percentile}_ms'] = None
+        return result
+
+    def summary(self) -> Dict[str, Any]:
+        """Count, mean, percentiles and maximum in milliseconds."""
+        with self._lock:
+            count, total, maximum = self.count, self.total_seconds, self.max_seconds
+        return {
+            'count': count,
+            'mean_ms': round(total / count * 1000, 3) if count else None,
+            **self.percentiles(),
+            'max_ms': round(maximum * 1000, 3) if count else None,
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert the recorder to plain data, e.g. to pass it between processes."""
+        with self._lock:
+            return {'count': self.count, 'total_seconds': self.total_seconds,
+                    'max_seconds': self.max_seconds, 'samples': list(self._samples)}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], max_samples: int = 10000) -> 'LatencyRecorder':
+        """Rebuild a recorder converted with to_dict()."""
+        recorder = cls(max_samples)
+        recorder._merge_dict(data)
+        return recorder
+
+    def _merge_dict(self, data: Dict[str, Any]) -> None:
+        """Add plain-data latencies (lock held)."""
+        if not data['count']:
+            return
+        # Keep the merged sample proportional to the number of operations of each recorder
+        own_share = self.count / (self.count + data['count'])
+        keep = int(round(self.max_samples * own_share))
+        samples = self._samples
+        if len(samples) + len(data['samples']) > self.max_samples:
+            own = self._random.sample(samples, min(len(samples), keep))
+            other = data['samples']
+            other = self._random.sample(other, min(len(other), self.max_samples - len(own)))
+            samples = own + other
+        else:
+            samples = samples + list(data['samples'])
+
+        self._samples = samples
+        self.count += data['count']
+        self.total_seconds += data['total_seconds']
+        self.max_seconds = max(self.max_seconds, data['max_seconds'])
+
+
+class ProgressReporter:
+    """
+    Thread-safe progress counters of an ingest run with periodic progress lines.
+
+    The pipeline stages update the counters once per chunk. report() prints a progress
+    line when interval_seconds have passed or interval_records were read since the last
+    one. Latency recorders of the MongoDB writers and the Pinecone stream are registered
+    with add_latency() and combined by name.
+    """
+
+    def __init__(self, interval_seconds: float = 10.0, interval_records: int = 0, log_level: str = 'info',
+                 label: str = ''):
+        """
+        Args:
+            interval_seconds: Seconds between progress lines (0 disables the time interval)
+            interval_records: Records read between progress lines (0 disables the record interval)
+            log_level: 'quiet', 'info' or 'debug'
+            label: Prefix of the progress lines, e.g. the shard file being ingested
+        """
+        if log_level not in LOG_LEVELS:
+            raise ValueError(f"Unsupported log level '{log_level}' (expected one of {list(LOG_LEVELS)})")
+
+        self.interval_seconds = interval_seconds
+        self.interval_records = interval_records
+        self.log_level = log_level
+        self.label = label
+
+        self.records_read = 0
+        self.bytes_read = 0
+        self.valid_count = 0
+        self.skipped_count = 0
+        self.written_count = 0
+        self.unchanged_count = 0
+        self.started_at = datetime.now()
+        self._started = time.perf_counter()
+        self._last_report = (self._started, 0)
+        self._latencies = {}  # Name -> list of LatencyRecorder
+        self._merged_latencies = {}  # Name -> LatencyRecorder merged from other processes
+        self._lock = threading.Lock()
+
+    @property
+    def debug_enabled(self) -> bool:
+        """Whether a line is printed for every product written."""
+        return LOG_LEVELS[self.log_level] >= LOG_LEVELS['debug']
+
+    def add_latency(self, name: str, recorder: LatencyRecorder) -> None:
+        """Register a latency recorder; recorders with the same name are combined."""
+        with self._lock:
+            self._latencies.setdefault(name, []).append(recorder)
+
+    def record_read(self, records: int, byte_count: int = 0) -> None:
+        """Count records (and bytes) read from the source."""
+        with self._lock:
+            self.records_read += records
+            self.bytes_read += byte_count
+
+    def record_transformed(self, valid: int, skipped: int) -> None:
+        """Count records accepted and skipped by the product validation."""
+        with self._lock:
+            self.valid_count += valid
+            self.skipped_count += skipped
+
+    def record_written(self, written: int, unchanged: int = 0) -> None:
+        """Count products sent to the destinations and products skipped as unchanged."""
+        with self._lock:
+            self.written_count += written
+            self.unchanged_count += unchanged
+
+    def report(self, force: bool = False) -> bool:
+        """
+        Print a progress line if an interval has passed.
+
+        Args:
+            force: Print the line regardless of the intervals
+
+        Returns:
+            True if a line was printed
+        """
+        if LOG_LEVELS[self.log_level] < LOG_LEVELS['info']:
+            return False
+
+        now = time.perf_counter()
+        with self._lock:
+            last_time, last_records = self._last_report
+            due = force or (
+                (self.interval_seconds > 0 and now - last_time >= self.interval_seconds)
+                or (self.interval_records > 0 and self.records_read - last_records >= self.interval_records))
+            if not due:
+                return False
+            self._last_report = (now, self.records_read)
+            records, byte_count = self.records_read, self.bytes_read
+            processed = self.valid_count + self.skipped_count
+            skipped = self.skipped_count
+
+        interval_rate = (records - last_records) / (now - last_time) if now > last_time else 0.0
+        line = (f"{self.label}Progress: {records} records read ({interval_rate:.0f} records/s, "
+                f"{self._rate(records, now):.0f} overall)")
+        if byte_count:
+            line += f", {format_bytes(byte_count)} read"
+        if processed:
+            line += f", {skipped / processed * 100:.1f}% skipped"
+        for name, recorder in self._combined_latencies().items():
+            stats = recorder.percentiles()
+            if stats['p50_ms'] is not None:
+                line += f", {name} p50/p95/p99 {stats['p50_ms']:.0f}/{stats['p95_ms']:.0f}/{stats['p99_ms']:.0f} ms"
+        print(line)
+        return True
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert the counters and latencies to plain data, e.g. to pass them between processes."""
+        with self._lock:
+            counters = {
+                'records_read': self.records_read, 'bytes_read': self.bytes_read,
+                'valid_count': self.valid_count, 'skipped_count': self.skipped_count,
+                'written_count': self.written_count, 'unchanged_count': self.unchanged_count,
+            }
+        counters['latencies'] = {name: recorder.to_dict() for name, recorder in self._combined_latencies().items()}
+        return counters
+
+    def merge(self, data: Dict[str, Any]) -> None:
+        """Add the counters and latencies of another reporter converted with to_dict()."""
+        with self._lock:
+            for key in ('records_read', 'bytes_read', 'valid_count', 'skipped_count',
+                        'written_count', 'unchanged_count'):
+                setattr(self, key, getattr(self, key) + data.get(key, 0))
+            for name, latencies in data.get('latencies', {}).items():
+                if name in self._merged_latencies:
+                    self._merged_latencies[name].merge(LatencyRecorder.from_dict(latencies))
+                else:
+                    self._merged_latencies[name] = LatencyRecorder.from_dict(latencies)
+
+    def summary(self, **metadata) -> Dict[str, Any]:
+        """
+        Build the machine-readable summary of the run.
+
+        Args:
+            **metadata: Additional fields, such as the source and the destination counters
+
+        Returns:
+            The summary
+        """
+        now = time.perf_counter()
+        finished_at = datetime.now()
+        data = self.to_dict()
+        processed = data['valid_count'] + data['skipped_count']
+        elapsed = now - self._started
+        return {
+            'version': SUMMARY_VERSION,
+            **metadata,
+            'started_at': self.started_at.isoformat(),
+            'finished_at': finished_at.isoformat(),
+            'elapsed_seconds': round(elapsed, 3),
+            'records_read': data['records_read'],
+            'records_per_second': round(self._rate(data['records_read'], now), 1),
+            'bytes_read': data['bytes_read'],
+            'bytes_per_second': round(data['bytes_read'] / elapsed, 1) if elapsed > 0 else 0.0,
+            'valid_count': data['valid_count'],
+            'skipped_count': data['skipped_count'],
+            'skip_rate': round(data['skipped_count'] / processed, 6) if processed else 0.0,
+            'written_count': data['written_count'],
+            'unchanged_count': data['unchanged_count'],
+            'latency': {name: recorder.summary() for name, recorder in self._combined_latencies().items()},
+        }
+
+    def _rate(self, records: int, now: float) -> float:
+        """Records per second since the reporter was created."""
+        elapsed = now - self._started
+        return records / elapsed if elapsed > 0 else 0.0
+
+    def _combined_latencies(self) -> Dict[str, LatencyRecorder]:
+        """Latency recorders combined by name."""
+        with self._lock:
+            groups = {name: list(recorders) for name, recorders in self._latencies.items()}
+            merged = dict(self._merged_latencies)
+        combined = {}
+        for name in sorted(set(groups) | set(merged)):
+            recorder = LatencyRecorder()
+            for part in groups.get(name, []) + ([merged[name]] if name in merged else []):
+                recorder.merge(part)
+            combined[name] = recorder
+        return combined
+
+
+def print_run_summary(summary: Dict[str, Any]) -> None:
+    """Print the throughput and latency figures of a run summary."""
+    print(f"Ingest throughput: {summary['records_read']} records in {summary['elapsed_seconds']:.1f}s "
+          f"({summary['records_per_second']:.0f} records/s"
+          + (f", {format_bytes(summary['bytes_read'])} read" if summary['bytes_read'] else "") + ")")
+    print(f"Skip rate: {summary['skip_rate'] * 100:.2f}% ({summary['skipped_count']} of "
+          f"{summary['valid_count'] + summary['skipped_count']} records)")
+    for name, stats in summary['latency'].items():
+        if stats['count']:
+            print(f"{name} latency: {stats['count']} calls, mean {stats['mean_ms']:.1f} ms, "
+                  f"p50 {stats['p50_ms']:.1f} ms, p95 {stats['p95_ms']:.1f} ms, "
+                  f"p99 {stats['p99_ms']:.1f} ms, max {stats['max_ms']:.1f} ms")
+
+
+def save_summary(filename: str, summary: Dict[str, Any]) -> None:
+    """
+    Write a run summary as JSON.
+
+    Args:
+        filename: Summary file path
+        summary: Summary built by ProgressReporter.summary()
+    """
+    temp_path = filename + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=2, ensure_ascii=False)
+    os.replace(temp_path, filename)
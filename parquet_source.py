@@ -0,0 +1,549 @@
+#!/usr/bin/env python3
+"""
+Parquet reader for the OpenFoodFacts dataset.
+Reads the dataset's parquet shards with Arrow, pushing the language filter and the
+column projection down to the reader so non-matching rows are never turned into Python objects.
+Also reads local snapshots in the same schema: parquet and Arrow IPC files through
+memory-mapped zero-copy reads, and JSON / JSONL files.
+"""
+
+import glob
+import itertools
+import json
+import os
+import re
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+DATASET_NAME = 'openfoodfacts/product-database'
+
+PARQUET_EXTENSIONS = ('.parquet',)
+ARROW_EXTENSIONS = ('.arrow', '.feather', '.ipc')
+JSON_EXTENSIONS = ('.json',)
+JSONL_EXTENSIONS = ('.jsonl', '.ndjson')
+
+# Number of JSON records grouped into one block (the JSON counterpart of a row group)
+JSON_BLOCK_SIZE = 10000
+# Number of characters read at a time from JSON files holding an array of records
+JSON_READ_SIZE = 1 << 20
+_JSON_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+# Columns of the dataset used to build product documents and ingest aggregates
+PRODUCT_COLUMNS = [
+    'code',
+    'lang',
+    'product_name',
+    'brands',
+    'food_groups_tags',
+    'product_quantity_unit',
+    'product_quantity',
+    'quantity',
+    'categories_tags',
+    'categories',
+    'labels_tags',
+    'labels',
+    'popularity_key',
+    'popularity_tags',
+    'nutriscore_grade',
+    'nutriscore_score',
+]
+
+
+def list_dataset_parquet_files(split: str = 'food', dataset_name: str = DATASET_NAME) -> List[str]:
+    """
+    List the parquet shards of a dataset split on the Hugging Face Hub.
+
+    Args:
+        split: Dataset split, matched against the parquet file names
+        dataset_name: Hugging Face dataset repository
+
+    Returns:
+        Sorted list of hf:// paths to the parquet shards
+    """
+    from huggingface_hub import HfFileSystem
+
+    fs = HfFileSystem()
+    paths = fs.glob(f"datasets/{dataset_name}/**/*.parquet")
+    split_paths = [path for path in paths if path.rsplit('/', 1)[-1].startswith(split)]
+    return sorted(f"hf://{path}" for path in split_paths)
+
+
+def get_dataset_revision(dataset_name: str = DATASET_NAME) -> Optional[str]:
+    """
+    Look up the current revision (commit hash) of a dataset on the Hugging Face Hub.
+
+    Args:
+        dataset_name: Hugging Face dataset repository
+
+    Returns:
+        The commit hash, or None if the Hub cannot be reached
+    """
+    try:
+        from huggingface_hub import HfApi
+
+        return HfApi().dataset_info(dataset_name).sha
+    except Exception as e:
+        print(f"Warning: could not look up the revision of dataset '{dataset_name}': {e}")
+        return None
+
+
+def detect_file_format(path: str) -> str:
+    """
+    Detect the format of a dataset file from its extension.
+
+    Args:
+        path: File path
+
+    Returns:
+        'parquet', 'arrow', 'json' or 'jsonl'
+
+    Raises:
+        ValueError: If the extension is not supported
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension in PARQUET_EXTENSIONS:
+        return 'parquet'
+    if extension in ARROW_EXTENSIONS:
+        return 'arrow'
+    if extension in JSON_EXTENSIONS:
+        return 'json'
+    if extension in JSONL_EXTENSIONS:
+        return 'jsonl'
+    raise ValueError(f"Unsupported dataset file format: {path}")
+
+
+def list_local_files(path: str) -> List[str]:
+    """
+    List the dataset files of a local snapshot.
+
+    Args:
+        path: A file, a directory (searched recursively) or a glob pattern
+
+    Returns:
+        Sorted list of supported dataset files
+    """
+    supported = PARQUET_EXTENSIONS + ARROW_EXTENSIONS + JSON_EXTENSIONS + JSONL_EXTENSIONS
+
+    if os.path.isdir(path):
+        candidates = glob.glob(os.path.join(path, '**', '*'), recursive=True)
+    elif os.path.isfile(path):
+        return [path]
+    else:
+        candidates = glob.glob(path, recursive=True)
+
+    return sorted(candidate for candidate in candidates
+                  if os.path.isfile(candidate) and os.path.splitext(candidate)[1].lower() in supported)
+
+
+def open_parquet_file(path: str, filesystem=None):
+    """
+    Open a parquet file for reading.
+
+    Local files are memory-mapped.
+
+    Args:
+        path: Local path or hf:// path
+        filesystem: Optional fsspec filesystem used to open the path
+
+    Returns:
+        pyarrow.parquet.ParquetFile, to be closed with close() or used as a context manager
+    """
+    import pyarrow.parquet as pq
+
+    if filesystem is None and path.startswith('hf://'):
+        from huggingface_hub import HfFileSystem
+        filesystem = HfFileSystem()
+
+    if filesystem is not None:
+        # Opened by pyarrow, so ParquetFile.close() also closes the remote file
+        return pq.ParquetFile(path, filesystem=filesystem)
+    return pq.ParquetFile(path, memory_map=True)
+
+
+def row_group_bytes(parquet_file, row_group: int, columns: Iterable[str]) -> int:
+    """
+    Compressed size of the column chunks of a row group, i.e. the bytes read to decode the columns.
+
+    Args:
+        parquet_file: pyarrow.parquet.ParquetFile
+        row_group: Row group index
+        columns: Top-level columns read (nested columns count all their leaves)
+
+    Returns:
+        Number of bytes
+    """
+    columns = set(columns)
+    metadata = parquet_file.metadata.row_group(row_group)
+    return sum(metadata.column(i).total_compressed_size for i in range(metadata.num_columns)
+               if metadata.column(i).path_in_schema.split('.', 1)[0] in columns)
+
+
+def iter_row_group_tables(path: str, languages: Iterable[str] = ('pl',),
+                          columns: Optional[List[str]] = None, filesystem=None,
+                          start_row_group: int = 0, stats: Optional[Dict[str, int]] = None
+                          ) -> Iterator[Tuple[int, Any]]:
+    """
+    Read the row groups of a parquet file, keeping only rows in the given languages.
+
+    The `lang` column is read first; row groups without a matching row are skipped
+    without decoding any other column. Matching row groups are read with only the
+    projected columns and filtered in Arrow.
+
+    Args:
+        path: Parquet file path
+        languages: Language codes to keep
+        columns: Columns to read (default: PRODUCT_COLUMNS)
+        filesystem: Optional fsspec filesystem used to open the path
+        start_row_group: Index of the first row group to read
+        stats: Optional counters; 'bytes_read' is increased by the compressed size of the column chunks read
+
+    Yields:
+        Tuples of (row_group_index, filtered pyarrow.Table)
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    value_set = pa.array(list(languages), type=pa.string())
+
+    with open_parquet_file(path, filesystem) as parquet_file:
+        available = set(parquet_file.schema_arrow.names)
+        columns = [column for column in (columns or PRODUCT_COLUMNS) if column in available]
+
+        for row_group in range(start_row_group, parquet_file.num_row_groups):
+            lang_column = parquet_file.read_row_group(row_group, columns=['lang']).column('lang')
+            mask = pc.is_in(lang_column, value_set=value_set)
+            matched = pc.any(mask).as_py()
+            if stats is not None:
+                read_columns = columns if matched else ['lang']
+                stats['bytes_read'] = stats.get('bytes_read', 0) + row_group_bytes(parquet_file, row_group,
+                                                                                    read_columns)
+            if not matched:
+                yield row_group, None
+                continue
+
+            table = parquet_file.read_row_group(row_group, columns=columns)
+            yield row_group, table.filter(mask)
+
+
+def iter_arrow_batch_tables(path: str, languages: Iterable[str] = ('pl',),
+                            columns: Optional[List[str]] = None, start_batch: int = 0,
+                            stats: Optional[Dict[str, int]] = None) -> Iterator[Tuple[int, Any]]:
+    """
+    Read the record batches of a memory-mapped Arrow IPC file, keeping only rows in the given languages.
+
+    Both the IPC file format and the IPC stream format (used by the datasets library
+    cache) are supported. Batches are zero-copy views into the memory-mapped file.
+
+    Args:
+        path: Arrow IPC file path
+        languages: Language codes to keep
+        columns: Columns to keep (default: PRODUCT_COLUMNS)
+        start_batch: Index of the first record batch to read
+        stats: Optional counters; 'bytes_read' is increased by the size of the column buffers read
+
+    Yields:
+        Tuples of (batch_index, filtered pyarrow.Table), with None for batches without matches
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    value_set = pa.array(list(languages), type=pa.string())
+
+    with pa.memory_map(path, 'r') as source:
+        try:
+            reader = pa.ipc.open_file(source)
+            schema = reader.schema
+            batches = (reader.get_batch(i) for i in range(start_batch, reader.num_record_batches))
+            first_batch = start_batch
+        except pa.ArrowInvalid:
+            source.seek(0)
+            reader = pa.ipc.open_stream(source)
+            schema = reader.schema
+            batches = reader
+            first_batch = 0
+
+        available = set(schema.names)
+        selected = [column for column in (columns or PRODUCT_COLUMNS) if column in available]
+
+        for batch_index, batch in enumerate(batches, first_batch):
+            if batch_index < start_batch:
+                continue
+
+            mask = pc.is_in(batch.column('lang'), value_set=value_set)
+            if not pc.any(mask).as_py():
+                if stats is not None:
+                    stats['bytes_read'] = stats.get('bytes_read', 0) + batch.column('lang').nbytes
+                yield batch_index, None
+                continue
+
+            table = pa.Table.from_batches([batch]).select(selected)
+            if stats is not None:
+                stats['bytes_read'] = stats.get('bytes_read', 0) + table.nbytes
+            yield batch_index, table.filter(mask)
+
+
+def _iter_json_values(f, stats: Optional[Dict[str, int]] = None) -> Iterator[Any]:
+    """
+    Decode the records of a JSON file incrementally: the items of a top-level array,
+    or the whole document when it is not an array.
+
+    The text is read JSON_READ_SIZE characters at a time and each record is decoded as
+    soon as it is complete, so only one chunk plus the record being decoded are in memory.
+    """
+    decoder = json.JSONDecoder()
+
+    def read() -> str:
+        chunk = f.read(JSON_READ_SIZE)
+        if stats is not None:
+            # Character count - equal to the byte count for ASCII text
+            stats['bytes_read'] = stats.get('bytes_read', 0) + len(chunk)
+        return chunk
+
+    buffer = read().lstrip()
+    if not buffer.startswith('['):
+        # A single record is read whole
+        while True:
+            chunk = read()
+            if not chunk:
+                break
+            buffer += chunk
+        if buffer.strip():
+            yield json.loads(buffer)
+        return
+
+    # The buffer is only cut when a chunk is appended; records are decoded in place from
+    # `position`, which keeps decoding linear in the chunk size
+    position = 1
+    expect_value = True
+    first_item = True
+    at_end = False
+    while True:
+        position = _JSON_WHITESPACE.match(buffer, position).end()
+        if position == len(buffer):
+            chunk = read()
+            if not chunk:
+                raise ValueError('JSON array is not closed')
+            buffer, position = buffer[position:] + chunk, 0
+            continue
+
+        char = buffer[position]
+        if not expect_value:
+            if char == ']':
+                return
+            if char != ',':
+                raise ValueError(f"Expected ',' or ']' between JSON array items, got {char!r}")
+            position += 1
+            expect_value = True
+            continue
+        if char == ']' and first_item:
+            return
+        if char in ',]':
+            raise ValueError(f"Expected a JSON array item, got {char!r}")
+
+        try:
+            value, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if at_end:
+                raise
+            end = None
+        if end is None or (end == len(buffer) and not at_end):
+            # The record continues in the next chunk (a number can also end at the chunk boundary)
+            chunk = read()
+            at_end = not chunk
+            buffer, position = buffer[position:] + chunk, 0
+            continue
+        yield value
+        position = end
+        expect_value = first_item = False
+
+
+def iter_json_record_blocks(path: str, languages: Iterable[str] = ('pl',),
+                            columns: Optional[List[str]] = None, start_block: int = 0,
+                            stats: Optional[Dict[str, int]] = None) -> Iterator[Tuple[int, List[Dict[str, Any]]]]:
+    """
+    Read a JSON or JSONL file in blocks of records, keeping only records in the given languages.
+
+    JSON files may contain a single record or an array of records; JSONL files contain
+    one record per line. Arrays are decoded incrementally, so memory use is bounded by
+    the block size rather than the file size.
+
+    Args:
+        path: JSON or JSONL file path
+        languages: Language codes to keep
+        columns: Fields to keep (default: PRODUCT_COLUMNS)
+        start_block: Index of the first block to read
+        stats: Optional counters; 'bytes_read' is increased by the size of the JSON text read
+
+    Yields:
+        Tuples of (block_index, list of filtered record dicts)
+    """
+    languages = set(languages)
+    columns = columns or PRODUCT_COLUMNS
+
+    def project(records):
+        return [{column: record[column] for column in columns if column in record}
+                for record in records if record.get('lang') in languages]
+
+    if detect_file_format(path) == 'json':
+        with open(path, 'r', encoding='utf-8') as f:
+            records = _iter_json_values(f, stats)
+            for block_index in itertools.count():
+                block = list(itertools.islice(records, JSON_BLOCK_SIZE))
+                if not block:
+                    return
+                if block_index >= start_block:
+                    yield block_index, project(block)
+        return
+
+    with open(path, 'r', encoding='utf-8') as f:
+        lines = (line for line in f if line.strip())
+        for block_index in itertools.count():
+            block_lines = list(itertools.islice(lines, JSON_BLOCK_SIZE))
+            if not block_lines:
+                return
+            if stats is not None:
+                # Character count - equal to the byte count for ASCII text
+                stats['bytes_read'] = stats.get('bytes_read', 0) + sum(len(line) for line in block_lines)
+            if block_index >= start_block:
+                yield block_index, project(json.loads(line) for line in block_lines)
+
+
+def iter_file_blocks(path: str, languages: Iterable[str] = ('pl',), columns: Optional[List[str]] = None,
+                     filesystem=None, start_block: int = 0,
+                     stats: Optional[Dict[str, int]] = None) -> Iterator[Tuple[int, Any]]:
+    """
+    Read a dataset file in blocks (parquet row groups, Arrow record batches or JSON record blocks).
+
+    Args:
+        path: Dataset file path
+        languages: Language codes to keep
+        columns: Columns to keep (default: PRODUCT_COLUMNS)
+        filesystem: Optional fsspec filesystem used to open parquet files
+        start_block: Index of the first block to read
+        stats: Optional counters; 'bytes_read' is increased by the bytes read from the file
+
+    Yields:
+        Tuples of (block_index, filtered pyarrow.Table or list of record dicts, or None)
+    """
+    file_format = detect_file_format(path)
+    if file_format == 'parquet':
+        return iter_row_group_tables(path, languages, columns, filesystem, start_row_group=start_block, stats=stats)
+    if file_format == 'arrow':
+        return iter_arrow_batch_tables(path, languages, columns, start_batch=start_block, stats=stats)
+    return iter_json_record_blocks(path, languages, columns, start_block=start_block, stats=stats)
+
+
+class FileRecordSource:
+    """
+    Iterable over the matching records of several dataset files (parquet, Arrow IPC, JSON, JSONL).
+
+    Tracks its position as (shard, row group, row) so an interrupted ingest can
+    continue where it stopped. Like the datasets library's IterableDataset, the
+    position is exposed through state_dict() / load_state_dict().
+
+    `bytes_read` counts the bytes read from the files: compressed column chunks for
+    parquet, column buffers for Arrow IPC and the text for JSON.
+
+    JSON arrays are decoded record by record, like JSONL files, so no file is loaded
+    whole. Resuming a JSON or JSONL file still decodes the records before the saved block.
+    """
+
+    def __init__(self, paths: List[str], languages: Iterable[str] = ('pl',),
+                 columns: Optional[List[str]] = None, filesystem=None):
+        """
+        Args:
+            paths: Dataset file paths
+            languages: Language codes to keep
+            columns: Columns to read (default: PRODUCT_COLUMNS)
+            filesystem: Optional fsspec filesystem used to open the paths
+        """
+        self.paths = list(paths)
+        self.languages = list(languages)
+        self.columns = columns
+        self.filesystem = filesystem
+        self._state = {'shard': 0, 'row_group': 0, 'row': 0}
+        self._stats = {'bytes_read': 0}
+
+    @property
+    def bytes_read(self) -> int:
+        """Number of bytes read from the files so far."""
+        return self._stats['bytes_read']
+
+    def state_dict(self) -> Dict[str, int]:
+        """Return the position of the next record to be read."""
+        return dict(self._state)
+
+    def load_state_dict(self, state: Dict[str, int]) -> None:
+        """Continue reading from a position returned by state_dict()."""
+        self._state = {key: int(state.get(key, 0)) for key in ('shard', 'row_group', 'row')}
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        start = dict(self._state)
+
+        for shard in range(start['shard'], len(self.paths)):
+            first_row_group = start['row_group'] if shard == start['shard'] else 0
+            blocks = iter_file_blocks(self.paths[shard], self.languages, self.columns,
+                                      self.filesystem, start_block=first_row_group, stats=self._stats)
+
+            for row_group, block in blocks:
+                skip = start['row'] if (shard, row_group) == (start['shard'], start['row_group']) else 0
+                self._state = {'shard': shard, 'row_group': row_group, 'row': skip}
+                if block is None or len(block) <= skip:
+                    continue
+
+                records = block[skip:] if isinstance(block, list) else block.slice(skip).to_pylist()
+                for record in records:
+                    # The record is consumed once it is yielded - point at the next one
+                    self._state['row'] += 1
+                    yield record
+
+            self._state = {'shard': shard + 1, 'row_group': 0, 'row': 0}
+
+    def iter_batches(self, batch_size: int) -> Iterator[Any]:
+        """
+        Iterate over the matching records in batches of at most batch_size records.
+
+        Parquet and Arrow files yield pyarrow Tables, JSON files yield lists of record
+        dicts. The position is tracked the same way as when iterating record by record.
+
+        Args:
+            batch_size: Maximum number of records per batch
+
+        Yields:
+            pyarrow.Table or list of record dicts
+        """
+        start = dict(self._state)
+
+        for shard in range(start['shard'], len(self.paths)):
+            first_row_group = start['row_group'] if shard == start['shard'] else 0
+            blocks = iter_file_blocks(self.paths[shard], self.languages, self.columns,
+                                      self.filesystem, start_block=first_row_group, stats=self._stats)
+
+            for row_group, block in blocks:
+                skip = start['row'] if (shard, row_group) == (start['shard'], start['row_group']) else 0
+                self._state = {'shard': shard, 'row_group': row_group, 'row': skip}
+                if block is None:
+                    continue
+
+                for offset in range(skip, len(block), batch_size):
+                    batch = block[offset:offset + batch_size] if isinstance(block, list) else block.slice(offset, batch_size)
+                    self._state['row'] = offset + len(batch)
+                    yield batch
+
+            self._state = {'shard': shard + 1, 'row_group': 0, 'row': 0}
+
+
+def iter_parquet_records(paths: List[str], languages: Iterable[str] = ('pl',),
+                         columns: Optional[List[str]] = None, filesystem=None) -> Iterator[Dict[str, Any]]:
+    """
+    Iterate over the matching records of several dataset files as Python dicts.
+
+    Args:
+        paths: Dataset file paths
+        languages: Language codes to keep
+        columns: Columns to read (default: PRODUCT_COLUMNS)
+        filesystem: Optional fsspec filesystem used to open the paths
+
+    Returns:
+        Iterator over record dicts with the projected columns
+    """
+    return iter(FileRecordSource(paths, languages, columns, filesystem))
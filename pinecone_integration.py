@@ -4,11 +4,68 @@ Pinecone integration module for storing product embeddings.
 Uses SentenceTransformers to embed products and stores them in Pinecone for semantic search.
 """
 
+import importlib.metadata
 import os
 import logging
-from typing import Dict, List, Tuple, Any
+import threading
+from typing import Dict, List, Optional, Tuple, Any
 import time
 
+import numpy as np
+
+from ingest_progress import LatencyRecorder
+from search_cache import DEFAULT_CACHE_DIR, EMBEDDING_CACHE_FILENAME, EmbeddingCache
+
+EMBEDDING_MODEL_NAME = 'sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2'
+
+_embedding_models = {}  # Model name -> loaded SentenceTransformer, shared by all threads
+_embedding_models_lock = threading.Lock()
+_query_embedding_cache = None
+_query_embedding_cache_lock = threading.Lock()
+
+
+def get_embedding_model(model_name: str = EMBEDDING_MODEL_NAME):
+    """
+    Return a SentenceTransformer model, loading it on first use.
+    
+    Every model is loaded once per process and then shared, so embedding a query
+    does not pay for loading the model. Safe to call from several threads; concurrent
+    first calls wait for a single load.
+    
+    Args:
+        model_name: Name of the SentenceTransformer model
+        
+    Returns:
+        The loaded SentenceTransformer model
+    """
+    model = _embedding_models.get(model_name)
+    if model is not None:
+        return model
+    
+    with _embedding_models_lock:
+        model = _embedding_models.get(model_name)
+        if model is None:
+            from sentence_transformers import SentenceTransformer
+            
+            print(f"Loading SentenceTransformer model '{model_name}'...")
+            started = time.perf_counter()
+            model = SentenceTransformer(model_name)
+            print(f"Loaded SentenceTransformer model '{model_name}' in {time.perf_counter() - started:.1f}s")
+            _embedding_models[model_name] = model
+    return model
+
+
+def warm_up_embedding_model(model_name: str = EMBEDDING_MODEL_NAME) -> None:
+    """Load a model and encode one text, so the first real query pays neither cost."""
+    get_embedding_model(model_name).encode([''], show_progress_bar=False)
+
+
+def clear_embedding_models() -> None:
+    """Drop the loaded models, e.g. to free their memory."""
+    with _embedding_models_lock:
+        _embedding_models.clear()
+
+
 def check_pinecone_enabled() -> bool:
     """Check if Pinecone integration is enabled via environment variable."""
     return os.getenv('SAVE_TO_PINECONE', 'false').lower() in ('true', '1', 'yes', 'on')
@@ -27,6 +84,135 @@ def get_pinecone_config() -> Dict[str, str]:
     
     return config
 
+
+_pinecone_config = None  # Configuration read once from the environment
+_pinecone_client = None
+_pinecone_indexes = {}  # Index name -> index handle, shared by all threads
+_pinecone_lock = threading.Lock()
+
+
+def get_pinecone_index(index_name: str = None):
+    """
+    Return a shared handle of a Pinecone index, connecting on first use.
+    
+    The configuration is read from the environment once, and the client and its index
+    handles (with their HTTP connection pools) are reused by every search and upload
+    in the process, from any thread, until close_pinecone() is called.
+    
+    Args:
+        index_name: Name of the index (default: PINECONE_INDEX_NAME)
+        
+    Returns:
+        The Pinecone index handle
+        
+    Raises:
+        ValueError: If the Pinecone configuration is missing
+    """
+    global _pinecone_config, _pinecone_client
+    
+    with _pinecone_lock:
+        if _pinecone_config is None:
+            _pinecone_config = get_pinecone_config()
+        index_name = index_name or _pinecone_config['index_name']
+        
+        index = _pinecone_indexes.get(index_name)
+        if index is None:
+            if _pinecone_client is None:
+                from pinecone import Pinecone
+                
+                print("Connecting to Pinecone...")
+                _pinecone_client = Pinecone(api_key=_pinecone_config['api_key'])
+            index = _pinecone_client.Index(index_name)
+            _pinecone_indexes[index_name] = index
+            print(f"Connected to Pinecone index: {index_name}")
+        return index
+
+
+def close_pinecone() -> None:
+    """Close the shared Pinecone index handles and client; a later call connects again."""
+    global _pinecone_config, _pinecone_client
+    
+    with _pinecone_lock:
+        handles = list(_pinecone_indexes.values()) + ([_pinecone_client] if _pinecone_client is not None else [])
+        for handle in handles:
+            try:
+                handle.close()
+            except Exception as e:
+                print(f"Warning: error closing Pinecone connection: {e}")
+        _pinecone_indexes.clear()
+        _pinecone_client = None
+        _pinecone_config = None
+
+def build_product_metadata(product: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Build the Pinecone metadata stored with a product vector.
+    
+    Args:
+        product: Product dictionary
+        
+    Returns:
+        Metadata dictionary with no null values (Pinecone rejects them)
+    """
+    product_id = str(product.get('_id'))
+    
+    # Extract product names as a list of strings
+    product_names = []
+    product_name_data = product.get('product_name', [])
+    if isinstance(product_name_data, list):
+        for name_obj in product_name_data:
+            if isinstance(name_obj, dict) and 'text' in name_obj:
+                text = name_obj.get('text', '')
+                if text:
+                    product_names.append(text)
+
+    # Create metadata with all search_string component fields
+    # Ensure all values are valid for Pinecone (no null/None values)
+
+    # Handle quantity - convert null to empty string
+    quantity = product.get('quantity')
+    quantity = str(quantity) if quantity is not None else ''
+
+    # Handle brands - convert null to empty string
+    brands = product.get('brands')
+    brands = str(brands) if brands is not None else ''
+
+    # Handle categories - ensure it's a list of strings with no null values
+    categories = product.get('categories', [])
+    if categories is None:
+        categories = []
+    elif not isinstance(categories, list):
+        categories = [str(categories)] if categories is not None else []
+    else:
+        # Filter out any null values from the list
+        categories = [str(cat) for cat in categories if cat is not None]
+
+    # Handle labels - ensure it's a list of strings with no null values
+    labels = product.get('labels', [])
+    if labels is None:
+        labels = []
+    elif not isinstance(labels, list):
+        labels = [str(labels)] if labels is not None else []
+    else:
+        # Filter out any null values from the list
+        labels = [str(label) for label in labels if label is not None]
+
+    # Handle search_string - convert null to empty string
+    search_string = product.get('search_string')
+    search_string = str(search_string) if search_string is not None else ''
+
+    metadata = {
+        'product_names': product_names,
+        'quantity': quantity,
+        'brands': brands,
+        'categories': categories,
+        'labels': labels,
+        'search_string': search_string,
+        '_id': product_id
+    }
+    
+    return metadata
+
+
 def create_product_embeddings(products: List[Dict[str, Any]]) -> List[Tuple[str, List[float], Dict[str, Any]]]:
     """
     Create embeddings for products using SentenceTransformers.
@@ -38,10 +224,7 @@ def create_product_embeddings(products: List[Dict[str, Any]]) -> List[Tuple[str,
         List of tuples (product_id, embedding, metadata)
     """
     try:
-        from sentence_transformers import SentenceTransformer
-        
-        print("Loading SentenceTransformer model 'sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2'...")
-        model = SentenceTransformer('sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2')
+        model = get_embedding_model()
         
         embeddings_data = []
         
@@ -92,60 +275,7 @@ def create_product_embeddings(products: List[Dict[str, Any]]) -> List[Tuple[str,
             else:
                 embedding = list(embedding)
             
-            # Extract product names as a list of strings
-            product_names = []
-            product_name_data = product.get('product_name', [])
-            if isinstance(product_name_data, list):
-                for name_obj in product_name_data:
-                    if isinstance(name_obj, dict) and 'text' in name_obj:
-                        text = name_obj.get('text', '')
-                        if text:
-                            product_names.append(text)
-            
-            # Create metadata with all search_string component fields
-            # Ensure all values are valid for Pinecone (no null/None values)
-            
-            # Handle quantity - convert null to empty string
-            quantity = product.get('quantity')
-            quantity = str(quantity) if quantity is not None else ''
-            
-            # Handle brands - convert null to empty string
-            brands = product.get('brands')
-            brands = str(brands) if brands is not None else ''
-            
-            # Handle categories - ensure it's a list of strings with no null values
-            categories = product.get('categories', [])
-            if categories is None:
-                categories = []
-            elif not isinstance(categories, list):
-                categories = [str(categories)] if categories is not None else []
-            else:
-                # Filter out any null values from the list
-                categories = [str(cat) for cat in categories if cat is not None]
-            
-            # Handle labels - ensure it's a list of strings with no null values
-            labels = product.get('labels', [])
-            if labels is None:
-                labels = []
-            elif not isinstance(labels, list):
-                labels = [str(labels)] if labels is not None else []
-            else:
-                # Filter out any null values from the list
-                labels = [str(label) for label in labels if label is not None]
-            
-            # Handle search_string - convert null to empty string
-            search_string = product.get('search_string')
-            search_string = str(search_string) if search_string is not None else ''
-            
-            metadata = {
-                'product_names': product_names,
-                'quantity': quantity,
-                'brands': brands,
-                'categories': categories,
-                'labels': labels,
-                'search_string': search_string,
-                '_id': product_id
-            }
+            metadata = build_product_metadata(product)
             
             embeddings_data.append((product_id, embedding, metadata))
         
@@ -171,10 +301,7 @@ def create_category_embeddings(unique_last_categories: Dict[str, str]) -> List[T
         List of tuples (category_id, embedding, full_path)
     """
     try:
-        from sentence_transformers import SentenceTransformer
-        
-        print("Loading SentenceTransformer model 'sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2'...")
-        model = SentenceTransformer('sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2')
+        model = get_embedding_model()
         
         embeddings_data = []
         
@@ -254,19 +381,8 @@ def upload_to_pinecone(embeddings_data: List[Tuple[str, List[float], Any]], batc
         True if successful, False otherwise
     """
     try:
-        from pinecone import Pinecone
-        
-        # Get Pinecone configuration
-        config = get_pinecone_config()
-        
-        print("Connecting to Pinecone...")
-        pc = Pinecone(api_key=config['api_key'])
-        
-        # Connect to the index
-        index_name = config['index_name']
-        index = pc.Index(index_name)
-        
-        print(f"Connected to Pinecone index: {index_name}")
+        # Shared index handle, connected on first use
+        index = get_pinecone_index()
         
         # Prepare vectors for upload
         vectors = []
@@ -324,7 +440,57 @@ def upload_to_pinecone(embeddings_data: List[Tuple[str, List[float], Any]], batc
         print(f"Error uploading to Pinecone: {e}")
         return False
 
-def search_pinecone(search_string: str, top_k: int = 10) -> List[Dict[str, any]]:
+def get_query_embedding_cache() -> Optional[EmbeddingCache]:
+    """
+    Return the process-wide query embedding cache, opening it on first use.
+    
+    Configured with QUERY_EMBEDDING_CACHE (default: enabled) and SEARCH_CACHE_DIR, and
+    keyed on the embedding model name and the sentence-transformers version.
+    
+    Returns:
+        The cache, or None if it is disabled
+    """
+    global _query_embedding_cache
+    
+    if os.getenv('QUERY_EMBEDDING_CACHE', 'true').lower() not in ('true', '1', 'yes', 'on'):
+        return None
+    with _query_embedding_cache_lock:
+        if _query_embedding_cache is None:
+            path = os.path.join(os.getenv('SEARCH_CACHE_DIR', DEFAULT_CACHE_DIR), EMBEDDING_CACHE_FILENAME)
+            _query_embedding_cache = EmbeddingCache(embedding_model_key(), path)
+        return _query_embedding_cache
+
+
+def embedding_model_key(model_name: str = EMBEDDING_MODEL_NAME) -> str:
+    """Model name and sentence-transformers version, identifying the embeddings a model produces."""
+    try:
+        version = importlib.metadata.version('sentence-transformers')
+    except importlib.metadata.PackageNotFoundError:
+        version = 'unknown'
+    return f"{model_name}@{version}"
+
+
+def embed_query(formatted_search_string: str) -> List[float]:
+    """
+    Embed a normalized search string, using the query embedding cache when enabled.
+    
+    Args:
+        formatted_search_string: Output of format_search_string()
+        
+    Returns:
+        The embedding as a list of floats
+    """
+    cache = get_query_embedding_cache()
+    vector = cache.get(formatted_search_string) if cache is not None else None
+    if vector is None:
+        # The model is loaded once per process
+        vector = np.asarray(get_embedding_model().encode([formatted_search_string])[0], dtype=np.float32)
+        if cache is not None:
+            cache.put(formatted_search_string, vector)
+    return vector.tolist()
+
+
+def query_pinecone(search_string: str, top_k: int = 10) -> List[Dict[str, any]]:
     """
     Search Pinecone index for similar products based on search string.
     
@@ -334,77 +500,87 @@ def search_pinecone(search_string: str, top_k: int = 10) -> List[Dict[str, any]]
         
     Returns:
         List of search results with scores and metadata
+        
+    Raises:
+        ImportError: If the Pinecone or SentenceTransformers package is not installed
+        ValueError: If the Pinecone configuration is missing
+        Exception: If the Pinecone query fails
     """
-    try:
-        from pinecone import Pinecone
-        from sentence_transformers import SentenceTransformer
-        
-        # Import format_search_string to normalize input the same way as MongoDB
-        from utils import format_search_string
-        
-        # Get Pinecone configuration
-        config = get_pinecone_config()
-        
-        print("Connecting to Pinecone for search...")
-        pc = Pinecone(api_key=config['api_key'])
-        
-        # Connect to the index
-        index_name = config['index_name']
-        index = pc.Index(index_name)
-        
-        print(f"Connected to Pinecone index: {index_name}")
-        
-        # Normalize the search string the same way as MongoDB search
-        formatted_search_string = format_search_string(search_string)
-        print(f"Normalized search string: '{formatted_search_string}'")
-        
-        # Create embedding for search string
-        print("Loading SentenceTransformer model for search embedding...")
-        model = SentenceTransformer('sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2')
-        
-        # Create embedding for the formatted search string
-        search_embedding = model.encode([formatted_search_string])[0]
-        if hasattr(search_embedding, 'tolist'):
-            search_embedding = search_embedding.tolist()
-        else:
-            search_embedding = list(search_embedding)
-        
-        # Perform similarity search
-        print(f"Searching for similar products to: '{formatted_search_string}'")
-        search_results = index.query(
-            vector=search_embedding,
-            top_k=top_k,
-            include_metadata=True
-        )
-        
-        # Process results
-        results = []
-        for match in search_results.matches:
-            metadata = match.metadata or {}
-            
-            # Handle both product and category results for backward compatibility
-            if 'product_names' in metadata:
-                # Product result
-                product_names = metadata.get('product_names', [])
-                given_name = product_names[0] if product_names else metadata.get('_id', '')
-                text = metadata.get('search_string', '')
-            else:
-                # Legacy category result
-                given_name = metadata.get('category_name', '')
-                text = metadata.get('full_path', '')
-            
-            result = {
-                'id': match.id,
-                'score': float(match.score),
-                'given_name': given_name,
-                'text': text,
-                'metadata': metadata
-            }
-            results.append(result)
+    # Import format_search_string to normalize input the same way as MongoDB
+    from utils import format_search_string
+    
+    # Shared index handle, connected on the first search of the process
+    index = get_pinecone_index()
+    
+    # Normalize the search string the same way as MongoDB search
+    formatted_search_string = format_search_string(search_string)
+    print(f"Normalized search string: '{formatted_search_string}'")
+    
+    # Create embedding for the formatted search string (cached for repeated queries)
+    search_embedding = embed_query(formatted_search_string)
+    
+    # Perform similarity search
+    print(f"Searching for similar products to: '{formatted_search_string}'")
+    search_results = index.query(
+        vector=search_embedding,
+        top_k=top_k,
+        include_metadata=True
+    )
+    
+    # Process results
+    results = [build_search_result(match.id, match.score, match.metadata) for match in search_results.matches]
+    
+    print(f"Found {len(results)} Pinecone search results")
+    return results
+
+
+def build_search_result(vector_id: str, score: float, metadata: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Build the search result of a matched vector, as returned by search_pinecone().
+    
+    Args:
+        vector_id: ID of the matched vector
+        score: Similarity score of the match
+        metadata: Metadata stored with the vector
         
-        print(f"Found {len(results)} Pinecone search results")
-        return results
+    Returns:
+        Dictionary with id, score, given_name, text and metadata
+    """
+    metadata = metadata or {}
+    
+    # Handle both product and category results for backward compatibility
+    if 'product_names' in metadata:
+        # Product result
+        product_names = metadata.get('product_names', [])
+        given_name = product_names[0] if product_names else metadata.get('_id', '')
+        text = metadata.get('search_string', '')
+    else:
+        # Legacy category result
+        given_name = metadata.get('category_name', '')
+        text = metadata.get('full_path', '')
+    
+    return {
+        'id': vector_id,
+        'score': float(score),
+        'given_name': given_name,
+        'text': text,
+        'metadata': metadata
+    }
+
+
+def search_pinecone(search_string: str, top_k: int = 10) -> List[Dict[str, any]]:
+    """
+    Search Pinecone index for similar products based on search string.
+    
+    Args:
+        search_string: The search query string
+        top_k: Number of top results to return
         
+    Returns:
+        List of search results with scores and metadata, empty if the search failed
+    """
+    try:
+        return query_pinecone(search_string, top_k)
     except ImportError as e:
         print(f"Error: Required package not installed. {e}")
         return []
@@ -413,6 +589,129 @@ def search_pinecone(search_string: str, top_k: int = 10) -> List[Dict[str, any]]
         return []
 
 
+def print_upload_summary(uploaded_count: int, failed_count: int, skipped_count: int) -> None:
+    """Print the number of product vectors upserted, failed and skipped by an ingest."""
+    print(f"Pinecone: {uploaded_count} product vectors upserted")
+    if failed_count:
+        print(f"Pinecone: {failed_count} products failed to upload")
+    if skipped_count:
+        print(f"Pinecone: skipped {skipped_count} products with invalid IDs")
+
+
+class PineconeProductStream:
+    """
+    Embed and upsert products to Pinecone in fixed-size chunks while they are being ingested.
+    
+    Only one chunk of products is buffered at a time, so memory stays flat regardless of
+    the catalog size, and every chunk becomes searchable as soon as it is upserted.
+    The stream is shared by all ingest writer threads. The duration of every chunk
+    embedding and upsert request is recorded in `embed_latency` and `upsert_latency`.
+    """
+
+    def __init__(self, chunk_size: int = 256, upsert_batch_size: int = 100, index=None, model=None,
+                 skip_unchanged: bool = False):
+        """
+        Args:
+            chunk_size: Number of products embedded and upserted together
+            upsert_batch_size: Number of vectors per Pinecone upsert request
+            index: Optional Pinecone index handle (default: index from the environment configuration)
+            model: Optional SentenceTransformer model (default: EMBEDDING_MODEL_NAME)
+            skip_unchanged: Do not embed products an incremental ingest found unchanged in MongoDB.
+                            Only correct while the index holds every product stored in MongoDB:
+                            the content hash is tracked in MongoDB, so products of a failed chunk
+                            or of earlier runs without Pinecone would never be uploaded
+        """
+        if index is None:
+            index = get_pinecone_index()
+        
+        if model is None:
+            model = get_embedding_model()
+        
+        self.index = index
+        self.model = model
+        self.chunk_size = max(1, chunk_size)
+        self.upsert_batch_size = max(1, upsert_batch_size)
+        self.skip_unchanged = skip_unchanged
+        
+        self.uploaded_count = 0
+        self.failed_count = 0
+        self.skipped_count = 0
+        self.embed_latency = LatencyRecorder()
+        self.upsert_latency = LatencyRecorder()
+        self._buffer = []
+        self._lock = threading.Lock()
+
+    def add(self, product: Dict[str, Any]) -> None:
+        """Queue a product, embedding and upserting the buffered chunk once it is full."""
+        # Validate product ID - skip if empty (Pinecone requires ID length >= 1)
+        if not product.get('_id'):
+            with self._lock:
+                self.skipped_count += 1
+            print(f"Warning: Skipping product with empty ID - product: {product}")
+            return
+        
+        with self._lock:
+            self._buffer.append(product)
+            if len(self._buffer) < self.chunk_size:
+                return
+            chunk, self._buffer = self._buffer, []
+        
+        self._upload(chunk)
+
+    def flush(self) -> None:
+        """Embed and upsert all buffered products."""
+        with self._lock:
+            chunk, self._buffer = self._buffer, []
+        
+        if chunk:
+            self._upload(chunk)
+
+    def close(self) -> None:
+        """Upload the remaining products."""
+        self.flush()
+
+    def _upload(self, chunk: List[Dict[str, Any]]) -> None:
+        """
+        Embed a chunk of products and upsert the vectors.
+        
+        A failed embedding fails the whole chunk; a failed upsert only fails the vectors
+        of its batch, so batches already upserted stay counted as uploaded.
+        """
+        try:
+            search_strings = [product.get('search_string', '') for product in chunk]
+            started = time.perf_counter()
+            embeddings = self.model.encode(search_strings, show_progress_bar=False)
+            self.embed_latency.record(time.perf_counter() - started)
+            
+            vectors = []
+            for product, embedding in zip(chunk, embeddings):
+                vectors.append({
+                    "id": str(product.get('_id')),
+                    "values": embedding.tolist() if hasattr(embedding, 'tolist') else list(embedding),
+                    "metadata": build_product_metadata(product)
+                })
+        except Exception as e:
+            print(f"Error embedding {len(chunk)} products for Pinecone: {e}")
+            with self._lock:
+                self.failed_count += len(chunk)
+            return
+        
+        for i in range(0, len(vectors), self.upsert_batch_size):
+            batch = vectors[i:i + self.upsert_batch_size]
+            try:
+                started = time.perf_counter()
+                self.index.upsert(vectors=batch)
+                self.upsert_latency.record(time.perf_counter() - started)
+            except Exception as e:
+                print(f"Error uploading {len(batch)} products to Pinecone: {e}")
+                with self._lock:
+                    self.failed_count += len(batch)
+                continue
+            
+            with self._lock:
+                self.uploaded_count += len(batch)
+
+
 def process_products_to_pinecone(products: List[Dict[str, Any]]) -> bool:
     """
     Complete pipeline to process products and upload to Pinecone.
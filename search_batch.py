@@ -12,10 +12,12 @@ import csv
 import os
 import sys
 import argparse
+import time
 from datetime import datetime
 from typing import Dict, Any, List, Optional, Tuple
 
-from search_products import search_products
+from pinecone_integration import close_pinecone
+from search_products import SearchSession, search_products
 
 
 def display_csv_as_table(csv_file_path: str, max_rows: int = 200, max_col_width: int = 30) -> bool:
@@ -311,40 +313,28 @@ def format_csv_row(product_num: int, search_type: str, input_string: str, result
     ]
 
 
-def search_batch_products(batch_file: str = "batch.txt", output_file: str = None) -> str:
+def _search_all(product_names: List[str], session: SearchSession, csv_rows: List[List[str]]) -> float:
     """
-    Main function to search multiple products and generate CSV output.
+    Search every product with the session and append its Mongo and Fuzzy CSV rows.
     
     Args:
-        batch_file: Path to input batch file
-        output_file: Optional output CSV filename
+        product_names: Search strings read from the batch file
+        session: Search session shared by all searches
+        csv_rows: List the CSV rows are appended to
         
     Returns:
-        Path to generated CSV file or empty string on error
+        Total time spent in the searches, in seconds
     """
-    # Read batch file
-    product_names = read_batch_file(batch_file)
-    if not product_names:
-        return ""
-    
-    # Generate output filename if not provided
-    if not output_file:
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        output_file = f"batch_search_results_{timestamp}.csv"
-    
-    # Prepare CSV data
-    csv_rows = []
-    csv_headers = ["Number", "Input string", "Given Name", "Score", "ID", "Categories", "Product Names"]
-    
-    print(f"\nStarting batch search for {len(product_names)} products...")
-    print("=" * 50)
-    
-    # Process each product
+    search_seconds = 0.0
     for i, product_name in enumerate(product_names, 1):
         print(f"Searching product {i}/{len(product_names)}: '{product_name}'")
         
         # Perform search
-        search_results = search_products(product_name)
+        started = time.perf_counter()
+        search_results = search_products(product_name, session=session)
+        elapsed = time.perf_counter() - started
+        search_seconds += elapsed
+        print(f"  Search time: {elapsed * 1000:.0f} ms")
         
         # Check for errors
         if "error" in search_results:
@@ -362,10 +352,58 @@ def search_batch_products(batch_file: str = "batch.txt", output_file: str = None
         fuzzy_score = top_rapidfuzz.get('rapidfuzz_score', 0) if top_rapidfuzz else 0
         print(f"  MongoDB top score: {mongo_score:.2f}")
         print(f"  RapidFuzz top score: {fuzzy_score:.2f}")
+        print(f"  Candidate rounds: {search_results['rapidfuzz_search'].get('rounds', 1)}")
         
         # Add CSV rows (Mongo first, then Fuzzy)
         csv_rows.append(format_csv_row(i, "Mongo", product_name, top_mongo))
         csv_rows.append(format_csv_row(i, "Fuzzy", product_name, top_rapidfuzz))
+    return search_seconds
+
+
+def search_batch_products(batch_file: str = "batch.txt", output_file: str = None,
+                          session: SearchSession = None) -> str:
+    """
+    Main function to search multiple products and generate CSV output.
+    
+    All searches share one search session, so the MongoDB connection is opened once
+    for the batch instead of once per product.
+    
+    Args:
+        batch_file: Path to input batch file
+        output_file: Optional output CSV filename
+        session: Search session to use (default: a session opened and closed for this batch)
+        
+    Returns:
+        Path to generated CSV file or empty string on error
+    """
+    # Read batch file
+    product_names = read_batch_file(batch_file)
+    if not product_names:
+        return ""
+    
+    # Generate output filename if not provided
+    if not output_file:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        output_file = f"batch_search_results_{timestamp}.csv"
+    
+    # Prepare CSV data
+    csv_rows = []
+    csv_headers = ["Number", "Input string", "Given Name", "Score", "ID", "Categories", "Product Names"]
+    
+    print(f"\nStarting batch search for {len(product_names)} products...")
+    print("=" * 50)
+    
+    owns_session = session is None
+    if owns_session:
+        session = SearchSession()
+    try:
+        search_seconds = _search_all(product_names, session, csv_rows)
+    finally:
+        if owns_session:
+            session.close()
+            close_pinecone()
+    print(f"\nSearch time: {search_seconds:.2f}s total, "
+          f"{search_seconds / len(product_names) * 1000:.0f} ms per product")
     
     # Write CSV file
     try:
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Caches for the search path.
+- QueryResultCache: backend results keyed on the formatted query, the backend and its
+  parameters and the catalog generation, in an in-memory LRU with a TTL and an optional
+  on-disk tier
+- EmbeddingCache: query embeddings as float32 vectors keyed on the model, in memory and
+  in a compact on-disk store, so repeated queries skip model inference
+- Catalog generations: written by the downloader at the end of every ingest, so caches
+  can tell that the catalog changed
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+DEFAULT_CACHE_DIR = 'search_cache'
+RESULT_CACHE_FILENAME = 'results.sqlite'
+EMBEDDING_CACHE_FILENAME = 'query_embeddings.sqlite'
+METADATA_COLLECTION = 'catalog-metadata'
+
+
+def record_catalog_generation(collection) -> str:
+    """
+    Record a new generation of a catalog collection after an ingest.
+
+    Args:
+        collection: MongoDB catalog collection
+
+    Returns:
+        The new generation identifier
+    """
+    generation = uuid.uuid4().hex
+    collection.database[METADATA_COLLECTION].update_one(
+        {'_id': collection.name},
+        {'$set': {'generation': generation, 'updated_at': datetime.now().isoformat()}},
+        upsert=True)
+    return generation
+
+
+def read_catalog_generation(collection) -> Optional[str]:
+    """Return the current generation of a catalog collection, or None if none was recorded."""
+    document = collection.database[METADATA_COLLECTION].find_one({'_id': collection.name})
+    return document.get('generation') if document else None
+
+
+class LRUCache:
+    """Thread-safe in-memory LRU cache whose entries expire after a TTL."""
+
+    def __init__(self, max_entries: int, ttl_seconds: float = 0.0):
+        """
+        Args:
+            max_entries: Maximum number of entries; the least recently used entry is evicted
+            ttl_seconds: Lifetime of an entry in seconds, 0 for no expiry
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # Key -> (stored at, value)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, value = entry
+            if self.ttl_seconds and time.monotonic() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class _SqliteStore:
+    """SQLite database shared by the threads of a process, created on first use."""
+
+    def __init__(self, path: str, schema: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute(schema)
+        self._lock = threading.Lock()
+
+    def execute(self, sql: str, parameters=()) -> list:
+        with self._lock:
+            return self._connection.execute(sql, parameters).fetchall()
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+class QueryResultCache:
+    """
+    Cache of search backend results in two tiers: an in-memory LRU with a TTL and an
+    optional SQLite file shared by processes and restarts.
+
+    Values are stored as JSON, so a cached result is always a fresh copy that callers
+    may modify. Keys include the catalog generation, so results of an older catalog
+    are never returned once the generation changed.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 3600.0, directory: str = None):
+        """
+        Args:
+            max_entries: Maximum number of results kept in memory
+            ttl_seconds: Lifetime of a result in seconds, 0 for no expiry
+            directory: Directory of the on-disk tier (default: memory only)
+        """
+        self.memory = LRUCache(max_entries, ttl_seconds)
+        self.ttl_seconds = ttl_seconds
+        self.disk = None
+        if directory:
+            self.disk = _SqliteStore(
+                os.path.join(directory, RESULT_CACHE_FILENAME),
+                'CREATE TABLE IF NOT EXISTS results '
+                '(key TEXT PRIMARY KEY, generation TEXT, stored_at REAL, value TEXT)')
+        self.generation = None
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_environment(cls) -> Optional['QueryResultCache']:
+        """
+        Create the cache configured by the SEARCH_CACHE_* environment variables.
+
+        Returns:
+            The cache, or None if SEARCH_CACHE_SIZE is 0 and the disk tier is disabled
+        """
+        max_entries = int(os.getenv('SEARCH_CACHE_SIZE', '1024'))
+        ttl_seconds = float(os.getenv('SEARCH_CACHE_TTL', '3600'))
+        use_disk = os.getenv('SEARCH_CACHE_DISK', 'false').lower() in ('true', '1', 'yes', 'on')
+        if max_entries <= 0 and not use_disk:
+            return None
+        directory = os.getenv('SEARCH_CACHE_DIR', DEFAULT_CACHE_DIR) if use_disk else None
+        return cls(max(max_entries, 0), ttl_seconds, directory)
+
+    def make_key(self, backend: str, formatted_query: str, params: Dict[str, Any] = None) -> str:
+        """
+        Build the cache key of a backend query.
+
+        Args:
+            backend: Backend name, e.g. 'mongo' or 'pinecone'
+            formatted_query: Output of format_search_string()
+            params: Backend parameters that change the result, e.g. the projection or top_k
+
+        Returns:
+            The key, including the current catalog generation
+        """
+        return json.dumps([self.generation, backend, formatted_query, params or {}],
+                          sort_keys=True, ensure_ascii=False, default=str)
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return a copy of the cached value, or None on a miss."""
+        serialized = self.memory.get(key) if self.memory.max_entries else None
+        if serialized is None and self.disk is not None:
+            rows = self.disk.execute('SELECT stored_at, value FROM results WHERE key = ?', (key,))
+            if rows and not (self.ttl_seconds and time.time() - rows[0][0] > self.ttl_seconds):
+                serialized = rows[0][1]
+                if self.memory.max_entries:
+                    self.memory.put(key, serialized)
+        with self._lock:
+            if serialized is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(serialized)
+
+    def put(self, key: str, value: Any) -> None:
+        """Store a value in every tier."""
+        serialized = json.dumps(value, ensure_ascii=False, default=str)
+        if self.memory.max_entries:
+            self.memory.put(key, serialized)
+        if self.disk is not None:
+            self.disk.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)',
+                              (key, self.generation, time.time(), serialized))
+
+    def set_generation(self, generation: Optional[str]) -> bool:
+        """
+        Switch to another catalog generation, dropping the results of the others.
+
+        Returns:
+            bool: True if the generation changed
+        """
+        if generation == self.generation:
+            return False
+        self.generation = generation
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.execute('DELETE FROM results WHERE generation IS NOT ?', (generation,))
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit and miss counts and the number of results in memory."""
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self.memory),
+                'generation': self.generation}
+
+    def close(self) -> None:
+        if self.disk is not None:
+            self.disk.close()
+
+
+class EmbeddingCache:
+    """
+    Cache from normalized query text to its float32 embedding.
+
+    Embeddings are kept in an in-memory map backed by a SQLite file storing the raw
+    float32 bytes. Entries are keyed by the model name and version; entries of other
+    models are removed when the cache is opened, so a model change invalidates them.
+    """
+
+    def __init__(self, model_key: str, path: Optional[str] = None, max_memory_entries: int = 100000):
+        """
+        Args:
+            model_key: Model name and version, e.g. "<model name>@<version>"
+            path: SQLite file of the on-disk store (default: memory only)
+            max_memory_entries: Maximum number of embeddings kept in memory
+        """
+        self.model_key = model_key
+        self.memory = LRUCache(max_memory_entries)
+        self.disk = None
+        if path:
+            self.disk = _SqliteStore(
+                path, 'CREATE TABLE IF NOT EXISTS embeddings '
+                      '(model TEXT, text TEXT, vector BLOB, PRIMARY KEY (model, text))')
+            self.disk.execute('DELETE FROM embeddings WHERE model != ?', (model_key,))
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        """Return the cached embedding of a text, or None on a miss."""
+        vector = self.memory.get(text)
+        if vector is None and self.disk is not None:
+            rows = self.disk.execute('SELECT vector FROM embeddings WHERE model = ? AND text = ?',
+                                     (self.model_key, text))
+            if rows:
+                vector = np.frombuffer(rows[0][0], dtype=np.float32)
+                self.memory.put(text, vector)
+        with self._lock:
+            if vector is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return vector
+
+    def put(self, text: str, vector) -> np.ndarray:
+        """Store the embedding of a text and return it as a read-only float32 array."""
+        vector = np.array(vector, dtype=np.float32)
+        vector.flags.writeable = False
+        self.memory.put(text, vector)
+        if self.disk is not None:
+            self.disk.execute('INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)',
+                              (self.model_key, text, vector.tobytes()))
+        return vector
+
+    def close(self) -> None:
+        if self.disk is not None:
+            self.disk.close()
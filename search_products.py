@@ -15,53 +15,117 @@ import os
 import sys
 import argparse
 import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
 from datetime import datetime
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 
+from catalog_indexes import bootstrap_indexes
 from utils import format_search_string, compute_rapidfuzz_score, extract_product_names, compute_given_name
-from pinecone_integration import search_pinecone
+from pinecone_integration import get_pinecone_index, query_pinecone, warm_up_embedding_model
+from search_cache import QueryResultCache, read_catalog_generation
 
 
+# Product fields returned by the text search: what RapidFuzz scoring, given_name and the output use
+SEARCH_FIELDS = ['product_name', 'brands', 'quantity', 'categories', 'labels', 'search_string',
+                 'given_name', 'scoring']
+ALL_FIELDS = '*'
+SEARCH_LIMIT = 50
+PINECONE_TOP_K = 10
 
-def search_products_direct(collection, search_string: str, formatted_string: str) -> List[Dict[str, Any]]:
+
+def parse_search_fields(value: str) -> List[str]:
+    """
+    Parse a comma-separated list of extra product fields to return from the search.
+    
+    Args:
+        value: Field names, e.g. "nutriscore_grade,labels_tags", or "*" for full documents
+        
+    Returns:
+        List of field names
+    """
+    return [field.strip() for field in value.split(',') if field.strip()]
+
+
+def build_search_projection(extra_fields: List[str] = ()) -> Dict[str, Any]:
+    """
+    Build the projection of the text search query.
+    
+    Args:
+        extra_fields: Product fields to return in addition to SEARCH_FIELDS;
+                      "*" returns full documents
+        
+    Returns:
+        MongoDB projection including the text score
+    """
+    projection = {"score": {"$meta": "textScore"}}
+    if ALL_FIELDS in extra_fields:
+        return projection
+    for field in list(SEARCH_FIELDS) + list(extra_fields):
+        projection[field] = 1
+    return projection
+
+
+def search_products_direct(collection, search_string: str, formatted_string: str,
+                           projection: Dict[str, Any] = None) -> List[Dict[str, Any]]:
     """
     Search products using direct text search on the formatted input string.
     
+    The text index is created by catalog_indexes.bootstrap_indexes() when the search
+    session connects, so a query only issues the find. Only the fields of the projection
+    are transferred, so the cost of a query does not grow with the size of the documents.
+    
     Args:
-        collection: MongoDB collection object
+        collection: MongoDB collection object or local text index (text_index.BM25Index)
         search_string: The original search string
         formatted_string: The formatted search string to use for search
+        projection: Projection of the query (default: build_search_projection())
         
     Returns:
         List of matching products with scores
     """
     try:
-        # Use MongoDB text search with scoring
-        # Create text index if it doesn't exist (MongoDB will ignore if exists)
-        try:
-            collection.create_index([("search_string", "text")])
-        except Exception:
-            pass  # Index might already exist
-        
-        # Perform text search with scoring using the formatted string
-        results = list(collection.find(
-            {"$text": {"$search": formatted_string}},
-            {"score": {"$meta": "textScore"}}
-        ).sort([("score", {"$meta": "textScore"})]).limit(50))
-        
-        return results
+        return find_products(collection, formatted_string, projection)
     except Exception as e:
         print(f"Error in direct search: {e}")
         return []
 
 
-def apply_rapidfuzz_scoring(search_string: str, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+def find_products(collection, formatted_string: str, projection: Dict[str, Any] = None,
+                  limit: int = SEARCH_LIMIT) -> List[Dict[str, Any]]:
+    """
+    Run the text search query of search_products_direct(), raising on errors.
+    The collection may also be a local text index (text_index.BM25Index).
+    
+    Args:
+        collection: MongoDB collection object
+        formatted_string: The formatted search string to use for search
+        projection: Projection of the query (default: build_search_projection())
+        limit: Maximum number of products
+        
+    Returns:
+        Up to limit matching products, best text score first
+    """
+    if projection is None:
+        projection = build_search_projection()
+    # Perform text search with scoring using the formatted string
+    return list(collection.find(
+        {"$text": {"$search": formatted_string}},
+        projection
+    ).sort([("score", {"$meta": "textScore"})]).limit(limit))
+
+
+def apply_rapidfuzz_scoring(search_string: str, results: List[Dict[str, Any]],
+                            scores: Optional[Dict[Any, float]] = None) -> List[Dict[str, Any]]:
     """
     Apply RapidFuzz scoring to search results and sort by RapidFuzz score.
     
     Args:
         search_string: The original search string
         results: List of MongoDB search results
+        scores: RapidFuzz scores by product _id of results scored before for the same
+                search string; reused instead of scoring again, and updated
         
     Returns:
         List of results with RapidFuzz scores, sorted by RapidFuzz score descending
@@ -71,8 +135,13 @@ def apply_rapidfuzz_scoring(search_string: str, results: List[Dict[str, Any]]) -
     
     # Add RapidFuzz scores to each result
     for result in results:
+        if scores is not None and result.get('_id') in scores:
+            result['rapidfuzz_score'] = scores[result['_id']]
+            continue
         rapidfuzz_score = compute_rapidfuzz_score(search_string, result)
         result['rapidfuzz_score'] = rapidfuzz_score
+        if scores is not None:
+            scores[result.get('_id')] = rapidfuzz_score
     
     # Sort by RapidFuzz score in descending order
     results.sort(key=lambda x: x.get('rapidfuzz_score', 0), reverse=True)
@@ -81,101 +150,549 @@ def apply_rapidfuzz_scoring(search_string: str, results: List[Dict[str, Any]]) -
 
 
 
-def search_products(search_string: str) -> Dict[str, Any]:
+CATALOG_COLLECTION = 'products-catalog'
+DEFAULT_MAX_POOL_SIZE = 100
+DEFAULT_MONGO_TIMEOUT = 30.0
+DEFAULT_PINECONE_TIMEOUT = 15.0
+DEFAULT_BACKEND_WORKERS = 16
+TEXT_BACKENDS = ('mongo', 'local')
+VECTOR_BACKENDS = ('pinecone', 'local')
+DEFAULT_MIN_CANDIDATES = 10
+DEFAULT_MAX_CANDIDATES = 200
+# Half of the largest combined RapidFuzz score (800); partial matches of the short brand,
+# label and category fields alone give unrelated products around 300
+DEFAULT_CONFIDENCE_THRESHOLD = 400.0
+CANDIDATE_GROWTH = 4
+
+
+class SearchSession:
     """
-    Main search function that performs both MongoDB and Pinecone searches.
+    Search state shared by all queries of a process.
     
-    Args:
-        search_string: The input search string
-        
-    Returns:
-        Dictionary containing search results and metadata
+    Owns one pooled MongoClient that is connected, pinged and has its catalog indexes
+    verified on first use and then reused by every search, so a query only pays for
+    the query itself instead of the TCP, TLS and handshake cost of a new connection.
+    Close the session (or use it as a context manager) when the process is done searching.
+    A session can be shared by threads searching concurrently.
+    
+    The MongoDB and Pinecone queries of a search run concurrently in a thread pool owned
+    by the session, each with its own timeout, so a search takes about as long as the
+    slowest backend and a backend that times out is reported without its results.
+    
+    The text search runs on MongoDB ($text) or, with the 'local' text backend, on the
+    local BM25 index of text_index.py, which needs no database connection. Likewise, the
+    semantic search runs on Pinecone or, with the 'local' vector backend, on the local
+    vector index of vector_index.py.
     """
-    try:
-        from pymongo import MongoClient
-        from pymongo.errors import ConnectionFailure, ConfigurationError
+    
+    def __init__(self, mongo_uri: str = None, collection_name: str = CATALOG_COLLECTION,
+                 max_pool_size: int = None, client=None, ensure_indexes: bool = True,
+                 extra_fields: List[str] = None, cache: Optional[QueryResultCache] = None,
+                 generation_check_interval: float = None, mongo_timeout: float = None,
+                 pinecone_timeout: float = None, backend_workers: int = None,
+                 text_backend: str = None, local_index_dir: str = None,
+                 vector_backend: str = None, local_vector_index_dir: str = None,
+                 prefix_expansion: bool = None, adaptive_candidates: bool = None,
+                 min_candidates: int = None, max_candidates: int = None,
+                 confidence_threshold: float = None):
+        """
+        Args:
+            mongo_uri: MongoDB connection URI (default: MONGO_URI environment variable)
+            collection_name: Name of the products collection
+            max_pool_size: Maximum number of pooled connections
+                           (default: MONGO_MAX_POOL_SIZE environment variable or 100)
+            client: Already created MongoClient to use instead of connecting to mongo_uri
+            ensure_indexes: Verify and create the catalog indexes once when connecting
+            extra_fields: Product fields to return in addition to SEARCH_FIELDS, "*" for full
+                          documents (default: SEARCH_EXTRA_FIELDS environment variable)
+            cache: Cache of the backend results (default: QueryResultCache.from_environment())
+            generation_check_interval: Seconds between checks of the catalog generation, which
+                                       invalidate the cache after an ingest (default:
+                                       SEARCH_GENERATION_CHECK_INTERVAL environment variable or 60)
+            mongo_timeout: Seconds to wait for the text search on MongoDB or the local text index,
+                           0 for no timeout (default: SEARCH_MONGO_TIMEOUT environment variable or 30)
+            pinecone_timeout: Seconds to wait for the semantic search on Pinecone or the local vector
+                              index, 0 for no timeout
+                              (default: SEARCH_PINECONE_TIMEOUT environment variable or 15)
+            backend_workers: Threads running backend queries for all searches of the session
+                             (default: SEARCH_BACKEND_WORKERS environment variable or 16)
+            text_backend: 'mongo' or 'local' (default: SEARCH_TEXT_BACKEND environment variable or 'mongo')
+            local_index_dir: Directory of the local text index
+                             (default: LOCAL_TEXT_INDEX_DIR environment variable or 'text_index')
+            vector_backend: 'pinecone' or 'local'
+                            (default: SEARCH_VECTOR_BACKEND environment variable or 'pinecone')
+            local_vector_index_dir: Directory of the local vector index
+                                    (default: LOCAL_VECTOR_INDEX_DIR environment variable or 'vector_index')
+            prefix_expansion: Expand truncated query tokens, like the receipt abbreviation 'zbożo',
+                              to the catalog words they start with the prefix vocabulary of the
+                              local text index (default: SEARCH_PREFIX_EXPANSION environment
+                              variable or true)
+            adaptive_candidates: Rerank a candidate pool that starts with min_candidates text search
+                                 results and grows while the best RapidFuzz score is below
+                                 confidence_threshold, instead of always the top SEARCH_LIMIT
+                                 (default: SEARCH_ADAPTIVE_CANDIDATES environment variable or false)
+            min_candidates: Candidates of the first round of the adaptive mode
+                            (default: SEARCH_MIN_CANDIDATES environment variable or 10)
+            max_candidates: Largest candidate pool of the adaptive mode
+                            (default: SEARCH_MAX_CANDIDATES environment variable or 200)
+            confidence_threshold: Best RapidFuzz score ending the adaptive mode
+                                  (default: SEARCH_CONFIDENCE_THRESHOLD environment variable or 400)
+        
+        Raises:
+            ValueError: If the text or vector backend is unknown or the candidate limits are invalid
+        """
+        self.mongo_uri = mongo_uri or os.getenv('MONGO_URI')
+        self.collection_name = collection_name
+        if max_pool_size is None:
+            max_pool_size = int(os.getenv('MONGO_MAX_POOL_SIZE', str(DEFAULT_MAX_POOL_SIZE)))
+        self.max_pool_size = max_pool_size
+        self.client = client
+        self.ensure_indexes = ensure_indexes
+        self._lock = threading.RLock()
+        if extra_fields is None:
+            extra_fields = parse_search_fields(os.getenv('SEARCH_EXTRA_FIELDS', ''))
+        self.projection = build_search_projection(extra_fields)
+        self.cache = cache if cache is not None else QueryResultCache.from_environment()
+        if generation_check_interval is None:
+            generation_check_interval = float(os.getenv('SEARCH_GENERATION_CHECK_INTERVAL', '60'))
+        self.generation_check_interval = generation_check_interval
+        self._generation_checked_at = None
+        if mongo_timeout is None:
+            mongo_timeout = float(os.getenv('SEARCH_MONGO_TIMEOUT', str(DEFAULT_MONGO_TIMEOUT)))
+        if pinecone_timeout is None:
+            pinecone_timeout = float(os.getenv('SEARCH_PINECONE_TIMEOUT', str(DEFAULT_PINECONE_TIMEOUT)))
+        # Keyed by role, so the local backends have the timeouts of the backends they replace
+        self.timeouts = {'text': mongo_timeout, 'vector': pinecone_timeout}
+        if backend_workers is None:
+            backend_workers = int(os.getenv('SEARCH_BACKEND_WORKERS', str(DEFAULT_BACKEND_WORKERS)))
+        self.backend_workers = backend_workers
+        self._executor = None
+        self.text_backend = (text_backend or os.getenv('SEARCH_TEXT_BACKEND', 'mongo')).lower()
+        if self.text_backend not in TEXT_BACKENDS:
+            raise ValueError(f"Unknown text backend '{self.text_backend}', expected one of {TEXT_BACKENDS}")
+        self.local_index_dir = local_index_dir or os.getenv('LOCAL_TEXT_INDEX_DIR', 'text_index')
+        self.vector_backend = (vector_backend or os.getenv('SEARCH_VECTOR_BACKEND', 'pinecone')).lower()
+        if self.vector_backend not in VECTOR_BACKENDS:
+            raise ValueError(f"Unknown vector backend '{self.vector_backend}', expected one of {VECTOR_BACKENDS}")
+        self.local_vector_index_dir = local_vector_index_dir or os.getenv('LOCAL_VECTOR_INDEX_DIR', 'vector_index')
+        if prefix_expansion is None:
+            prefix_expansion = os.getenv('SEARCH_PREFIX_EXPANSION', 'true').lower() in ('true', '1', 'yes', 'on')
+        self.prefix_expansion = prefix_expansion
+        self._expander = None
+        if adaptive_candidates is None:
+            adaptive_candidates = os.getenv('SEARCH_ADAPTIVE_CANDIDATES', 'false').lower() in ('true', '1', 'yes', 'on')
+        self.adaptive_candidates = adaptive_candidates
+        if min_candidates is None:
+            min_candidates = int(os.getenv('SEARCH_MIN_CANDIDATES', str(DEFAULT_MIN_CANDIDATES)))
+        if max_candidates is None:
+            max_candidates = int(os.getenv('SEARCH_MAX_CANDIDATES', str(DEFAULT_MAX_CANDIDATES)))
+        if not 0 < min_candidates <= max_candidates:
+            raise ValueError(f"Invalid candidate limits {min_candidates}-{max_candidates}, "
+                             f"expected 0 < min_candidates <= max_candidates")
+        self.min_candidates = min_candidates
+        self.max_candidates = max_candidates
+        if confidence_threshold is None:
+            confidence_threshold = float(os.getenv('SEARCH_CONFIDENCE_THRESHOLD', str(DEFAULT_CONFIDENCE_THRESHOLD)))
+        self.confidence_threshold = confidence_threshold
+        self._collection = None
+        self.query_count = 0
+    
+    @property
+    def collection(self):
+        """The products collection (or local text index), connecting on first use."""
+        if self._collection is None:
+            self.connect()
+        return self._collection
+    
+    def connect(self) -> None:
+        """
+        Create the pooled client if needed and check the connection with a ping.
+        With the local text backend, memory-map the local index instead.
+        
+        Raises:
+            ValueError: If no MongoDB URI is configured
+            pymongo.errors.PyMongoError: If the connection fails
+            FileNotFoundError: If the local text index does not exist
+        """
+        with self._lock:
+            if self._collection is not None:
+                return
+            if self.text_backend == 'local':
+                from text_index import BM25Index
+                
+                index = BM25Index(self.local_index_dir)
+                index.load()
+                print(f"Loaded local text index '{self.local_index_dir}'")
+                if self.prefix_expansion:
+                    self._expander = index
+                self._collection = index
+                return
+            if self.client is None:
+                from pymongo import MongoClient
+                
+                if not self.mongo_uri:
+                    raise ValueError("MONGO_URI not set")
+                print("Connecting to MongoDB...")
+                self.client = MongoClient(self.mongo_uri, maxPoolSize=self.max_pool_size)
+            try:
+                self.client.admin.command('ping')
+            except Exception:
+                self.close()
+                raise
+            db = self.client.get_database()  # Use default database from URI
+            collection = db[self.collection_name]
+            print("Successfully connected to MongoDB")
+            if self.ensure_indexes:
+                try:
+                    bootstrap_indexes(collection)
+                except Exception as e:
+                    print(f"Warning: could not verify the indexes of '{self.collection_name}': {e}")
+            if self.prefix_expansion:
+                self._expander = self._load_expander()
+            self._collection = collection
+    
+    def _load_expander(self):
+        """
+        Load the local text index whose prefix vocabulary expands the queries of the
+        MongoDB text search, or return None if it was not built.
+        """
+        from text_index import MANIFEST_FILENAME, BM25Index
         
-        # Get MongoDB URI from environment variable
-        mongo_uri = os.getenv('MONGO_URI')
-        if not mongo_uri:
+        if not os.path.exists(os.path.join(self.local_index_dir, MANIFEST_FILENAME)):
+            print(f"Prefix expansion disabled: no text index in '{self.local_index_dir}' "
+                  f"(build it with: python text_index.py build)")
+            return None
+        try:
+            index = BM25Index(self.local_index_dir)
+            index.load()
+        except Exception as e:
+            print(f"Warning: could not load the prefix vocabulary of '{self.local_index_dir}': {e}")
+            return None
+        if index.vocabulary is None:
+            print(f"Prefix expansion disabled: the text index in '{self.local_index_dir}' has no vocabulary")
+            return None
+        return index
+    
+    def warm_up(self) -> None:
+        """
+        Open the resources searches use, so the first query does not pay for them:
+        the MongoDB connection and, when Pinecone is configured, the embedding model
+        and the Pinecone index handle, or the embedding model and the local vector index.
+        
+        Raises:
+            ValueError: If no MongoDB URI is configured
+            pymongo.errors.PyMongoError: If the connection fails
+        """
+        self.connect()
+        if self.vector_backend == 'local':
+            from vector_index import get_vector_index
+            
+            try:
+                warm_up_embedding_model()
+                get_vector_index(self.local_vector_index_dir)
+            except Exception as e:
+                print(f"Warning: could not prepare the local vector search: {e}")
+        elif os.getenv('PINECONE_API_KEY'):
+            try:
+                warm_up_embedding_model()
+                get_pinecone_index()
+            except Exception as e:
+                print(f"Warning: could not prepare the Pinecone search: {e}")
+    
+    def search(self, search_string: str) -> Dict[str, Any]:
+        """
+        Perform MongoDB and Pinecone searches for one search string.
+        
+        Args:
+            search_string: The input search string
+            
+        Returns:
+            Dictionary containing search results and metadata, or an 'error' entry
+        """
+        try:
+            from pymongo.errors import ConnectionFailure, ConfigurationError
+        except ImportError:
+            error_msg = "Required packages not installed. Please run: pip install -r requirements.txt"
+            print(error_msg)
+            return {"error": error_msg}
+        
+        try:
+            collection = self.collection
+        except ValueError:
             print("Error: MONGO_URI environment variable not set")
             print("Please set the MongoDB connection URI in the MONGO_URI environment variable")
             return {"error": "MONGO_URI not set"}
-        
-        # Initialize MongoDB connection
-        try:
-            print(f"Connecting to MongoDB...")
-            client = MongoClient(mongo_uri)
-            # Test connection
-            client.admin.command('ping')
-            db = client.get_database()  # Use default database from URI
-            collection = db['products-catalog']
-            print("Successfully connected to MongoDB")
         except (ConnectionFailure, ConfigurationError) as e:
             print(f"Error connecting to MongoDB: {e}")
             return {"error": f"MongoDB connection failed: {e}"}
+        except Exception as e:
+            error_msg = f"Error during search: {e}"
+            print(error_msg)
+            return {"error": error_msg}
         
-        # Format the search string
-        formatted_string = format_search_string(search_string)
-        print(f"Original input: '{search_string}'")
-        print(f"Formatted input: '{formatted_string}'")
+        try:
+            with self._lock:
+                self.query_count += 1
+            
+            # Format the search string
+            formatted_string = format_search_string(search_string)
+            print(f"Original input: '{search_string}'")
+            print(f"Formatted input: '{formatted_string}'")
+            self._check_generation(collection)
+            
+            # Start the direct search with formatted string and the Pinecone search concurrently
+            print("Performing direct and Pinecone searches concurrently...")
+            started_at = time.monotonic()
+            executor = self._backend_executor()
+            limit = self.min_candidates if self.adaptive_candidates else SEARCH_LIMIT
+            direct_future = executor.submit(self._cached, self.text_backend, formatted_string,
+                                            *self._text_query(collection, formatted_string, limit))
+            vector_name = 'pinecone' if self.vector_backend == 'pinecone' else 'local-vectors'
+            pinecone_future = executor.submit(self._vector_search, search_string, formatted_string)
+            timed_out = []
+            
+            try:
+                direct_results = self._wait_for_backend('text', self.text_backend, direct_future,
+                                                        started_at, timed_out)
+            except Exception as e:
+                print(f"Error in direct search: {e}")
+                direct_results = []
+            
+            # Apply RapidFuzz scoring to the results while the Pinecone search may still run
+            print("Computing RapidFuzz scores and resorting results...")
+            direct_results, direct_results_with_rapidfuzz, rounds = self._rerank(
+                collection, search_string, formatted_string, direct_results, limit, started_at, timed_out)
+            
+            try:
+                pinecone_results = self._wait_for_backend('vector', vector_name, pinecone_future,
+                                                          started_at, timed_out)
+            except ImportError as e:
+                print(f"Error: Required package not installed. {e}")
+                pinecone_results = []
+            except Exception as e:
+                print(f"Error in {vector_name} search: {e}")
+                pinecone_results = []
+            
+            # Prepare results
+            results = {
+                "timestamp": datetime.now().isoformat(),
+                "input_string": search_string,
+                "formatted_string": formatted_string,
+                "direct_search": {
+                    "count": len(direct_results),
+                    "results": direct_results
+                },
+                "rapidfuzz_search": {
+                    "count": len(direct_results_with_rapidfuzz),
+                    "rounds": rounds,
+                    "results": direct_results_with_rapidfuzz
+                },
+                "pinecone_search": {
+                    "count": len(pinecone_results),
+                    "results": pinecone_results
+                },
+                "timed_out": timed_out
+            }
+            
+            print(f"Direct search found {len(direct_results)} results")
+            print(f"RapidFuzz scoring applied to {len(direct_results_with_rapidfuzz)} results "
+                  f"in {rounds} round{'s' if rounds != 1 else ''}")
+            print(f"Pinecone search found {len(pinecone_results)} results")
+            
+            return results
+            
+        except Exception as e:
+            error_msg = f"Error during search: {e}"
+            print(error_msg)
+            return {"error": error_msg}
+    
+    def _cached(self, backend: str, formatted_string: str, params: Dict[str, Any], query):
+        """
+        Return the cached result of a backend query, running query() on a miss.
         
-        # Perform direct search with formatted string
-        print("Performing direct search with formatted input...")
-        direct_results = search_products_direct(collection, search_string, formatted_string)
+        Errors raised by query() are not cached.
+        """
+        if self.cache is None:
+            return query()
+        key = self.cache.make_key(backend, formatted_string, params)
+        results = self.cache.get(key)
+        if results is None:
+            results = query()
+            self.cache.put(key, results)
+        else:
+            print(f"Using cached {backend} results")
+        return results
+    
+    def _rerank(self, collection, search_string: str, formatted_string: str, direct_results: List[Dict[str, Any]],
+                limit: int, started_at: float, timed_out: List[str]):
+        """
+        Score the text search results with RapidFuzz.
         
-        # Add given_name field to direct results
-        for result in direct_results:
-            result['given_name'] = compute_given_name(result)
+        In the adaptive mode, while the best RapidFuzz score is below the confidence threshold
+        and the text search filled the pool, query the text search again with a pool
+        CANDIDATE_GROWTH times larger (up to max_candidates) and rerank it. Candidates scored
+        in an earlier round keep their score. A round that fails or times out ends the
+        widening with the results of the previous round.
         
-        # Apply RapidFuzz scoring to the results
-        print("Computing RapidFuzz scores and resorting results...")
-        direct_results_with_rapidfuzz = apply_rapidfuzz_scoring(search_string, direct_results.copy())
+        Returns:
+            The text search results of the last round, their RapidFuzz reranking and the
+            number of rounds
+        """
+        scores = {}
+        rounds = 1
+        while True:
+            # Add given_name field to direct results (precomputed at ingest for current documents)
+            for result in direct_results:
+                if 'given_name' not in result:
+                    result['given_name'] = compute_given_name(result)
+            reranked = apply_rapidfuzz_scoring(search_string, direct_results.copy(), scores)
+            if (not self.adaptive_candidates or len(direct_results) < limit or limit >= self.max_candidates
+                    or reranked[0]['rapidfuzz_score'] >= self.confidence_threshold):
+                return direct_results, reranked, rounds
+            
+            limit = min(limit * CANDIDATE_GROWTH, self.max_candidates)
+            print(f"Best RapidFuzz score {reranked[0]['rapidfuzz_score']:.2f} is below "
+                  f"{self.confidence_threshold:.2f}, widening the candidates to {limit}...")
+            future = self._backend_executor().submit(self._cached, self.text_backend, formatted_string,
+                                                     *self._text_query(collection, formatted_string, limit))
+            try:
+                wider_results = self._wait_for_backend('text', self.text_backend, future, started_at, timed_out)
+            except Exception as e:
+                print(f"Error in direct search: {e}")
+                return direct_results, reranked, rounds
+            if self.text_backend in timed_out:
+                return direct_results, reranked, rounds
+            direct_results = wider_results
+            rounds += 1
+    
+    def _text_query(self, collection, formatted_string: str, limit: int = SEARCH_LIMIT):
+        """
+        Return the cache parameters and the query function of the text search.
         
-        # Add given_name field to rapidfuzz results 
-        for result in direct_results_with_rapidfuzz:
-            result['given_name'] = compute_given_name(result)
+        With prefix expansion, the local index matches every token to the catalog words it
+        starts; MongoDB gets one $text query with the expanded words, so a truncated token
+        costs no extra round trip.
+        """
+        params = {'projection': self.projection, 'limit': limit}
+        if self._expander is None:
+            return params, lambda: find_products(collection, formatted_string, self.projection, limit)
+        params['expand_prefixes'] = True
+        if self.text_backend == 'local':
+            return params, lambda: collection.search(formatted_string, self.projection, limit, expand_prefixes=True)
         
-        # Perform Pinecone search
-        print("Performing Pinecone search...")
-        pinecone_results = search_pinecone(search_string, top_k=10)
+        from text_index import expanded_search_string
         
-        # Prepare results
-        results = {
-            "timestamp": datetime.now().isoformat(),
-            "input_string": search_string,
-            "formatted_string": formatted_string,
-            "direct_search": {
-                "count": len(direct_results),
-                "results": direct_results
-            },
-            "rapidfuzz_search": {
-                "count": len(direct_results_with_rapidfuzz),
-                "results": direct_results_with_rapidfuzz
-            },
-            "pinecone_search": {
-                "count": len(pinecone_results),
-                "results": pinecone_results
-            }
-        }
+        expanded_string = expanded_search_string(self._expander.expand_query(formatted_string))
+        if expanded_string != formatted_string:
+            print(f"Expanded input: '{expanded_string}'")
+        return params, lambda: find_products(collection, expanded_string, self.projection, limit)
+    
+    def _vector_search(self, search_string: str, formatted_string: str) -> List[Dict[str, Any]]:
+        """Run the semantic search on Pinecone or the local vector index, using the cache."""
+        if self.vector_backend == 'pinecone':
+            return self._cached('pinecone', formatted_string, {'top_k': PINECONE_TOP_K},
+                                lambda: query_pinecone(search_string, top_k=PINECONE_TOP_K))
         
-        # Close MongoDB connection
-        client.close()
+        from vector_index import get_vector_index, query_vector_index
         
-        print(f"Direct search found {len(direct_results)} results")
-        print(f"RapidFuzz scoring applied to {len(direct_results_with_rapidfuzz)} results")
-        print(f"Pinecone search found {len(pinecone_results)} results")
+        # Results of an earlier build of the index are not reused
+        index = get_vector_index(self.local_vector_index_dir)
+        return self._cached('local-vectors', formatted_string, {'top_k': PINECONE_TOP_K, 'index': index.generation},
+                            lambda: query_vector_index(search_string, PINECONE_TOP_K, self.local_vector_index_dir))
+    
+    def _backend_executor(self) -> ThreadPoolExecutor:
+        """The thread pool running the backend queries, created on first use."""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.backend_workers,
+                                                    thread_name_prefix='search-backend')
+            return self._executor
+    
+    def _wait_for_backend(self, role: str, backend: str, future: Future, started_at: float,
+                          timed_out: List[str]) -> list:
+        """
+        Wait for a backend query until its timeout, counted from the start of the search.
         
-        return results
+        A query that times out keeps running in the background and still fills the cache,
+        but this search reports it in timed_out and goes on without its results.
         
-    except ImportError:
-        error_msg = "Required packages not installed. Please run: pip install -r requirements.txt"
-        print(error_msg)
-        return {"error": error_msg}
-    except Exception as e:
-        error_msg = f"Error during search: {e}"
-        print(error_msg)
-        return {"error": error_msg}
+        Args:
+            role: 'text' or 'vector', selecting the timeout
+            backend: Name of the backend reported in timed_out
+            future: The running backend query
+            started_at: time.monotonic() at the start of the search
+            timed_out: List the backend is appended to if it times out
+        
+        Raises:
+            Exception: The error raised by the backend query
+        """
+        timeout = self.timeouts[role] or None
+        if timeout is not None:
+            timeout = max(0.0, started_at + timeout - time.monotonic())
+        try:
+            return future.result(timeout=timeout)
+        except FuturesTimeoutError:
+            print(f"Warning: {backend} search timed out after {self.timeouts[role]}s, "
+                  f"continuing without its results")
+            timed_out.append(backend)
+            return []
+    
+    def _check_generation(self, collection) -> None:
+        """Invalidate the cache if an ingest recorded a new catalog generation since the last check."""
+        if self.cache is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if (self._generation_checked_at is not None
+                    and now - self._generation_checked_at < self.generation_check_interval):
+                return
+            self._generation_checked_at = now
+        try:
+            if self.text_backend == 'local':
+                generation = collection.generation
+            else:
+                generation = read_catalog_generation(collection)
+        except Exception as e:
+            print(f"Warning: could not read the catalog generation: {e}")
+            return
+        if self.cache.set_generation(generation):
+            print(f"Catalog generation: {generation}")
+    
+    def close(self) -> None:
+        """Close the pooled client and the backend thread pool. A later search connects again."""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            if self.client is not None:
+                self.client.close()
+            self.client = None
+            self._collection = None
+            self._expander = None
+    
+    def __enter__(self) -> 'SearchSession':
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+
+def search_products(search_string: str, session: SearchSession = None) -> Dict[str, Any]:
+    """
+    Main search function that performs both MongoDB and Pinecone searches.
+    
+    Args:
+        search_string: The input search string
+        session: Search session to reuse across calls; without one, a session is
+                 opened for this search only and closed afterwards
+        
+    Returns:
+        Dictionary containing search results and metadata
+    """
+    if session is not None:
+        return session.search(search_string)
+    with SearchSession() as single_use_session:
+        return single_use_session.search(search_string)
 
 
 
@@ -241,7 +758,8 @@ def main():
     print("\nSearch Summary:")
     print(f"- Formatted input: '{results['formatted_string']}'")
     print(f"- Direct search: {results['direct_search']['count']} results")
-    print(f"- RapidFuzz search: {results['rapidfuzz_search']['count']} results")
+    print(f"- RapidFuzz search: {results['rapidfuzz_search']['count']} results "
+          f"({results['rapidfuzz_search']['rounds']} candidate rounds)")
     print(f"- Pinecone search: {results['pinecone_search']['count']} results")
     print(f"- Results saved to: {output_file}")
     
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Long-running HTTP/JSON search service around search_products().
+Keeps one warm search session (pooled MongoDB client, embedding model and Pinecone index
+handle) for the life of the process and answers requests concurrently, so a lookup only
+pays for the query itself.
+
+Endpoints:
+- GET /search?q=<search string> - Same result structure as search_products()
+- POST /search with a JSON body {"query": "<search string>"}
+- GET /health - Service status, number of queries served and result cache statistics
+"""
+
+import argparse
+import json
+import os
+import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from pinecone_integration import close_pinecone
+from search_products import SearchSession
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8080
+MAX_BODY_BYTES = 64 * 1024
+
+
+class SearchRequestHandler(BaseHTTPRequestHandler):
+    """Request handler answering search requests with the session of its server."""
+
+    server_version = 'ProductSearch/1.0'
+
+    def do_GET(self) -> None:
+        url = urlparse(self.path)
+        if url.path == '/health':
+            session = self.server.session
+            health = {'status': 'ok', 'queries': session.query_count}
+            if session.cache is not None:
+                health['cache'] = session.cache.stats()
+            self._send_json(200, health)
+        elif url.path == '/search':
+            query = parse_qs(url.query).get('q', [''])[0]
+            self._send_json(*self._search(query))
+        else:
+            self._send_json(404, {'error': f"Unknown path '{url.path}'"})
+
+    def do_POST(self) -> None:
+        url = urlparse(self.path)
+        if url.path != '/search':
+            self._send_json(404, {'error': f"Unknown path '{url.path}'"})
+            return
+
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            if length < 0:
+                raise ValueError(f"negative length {length}")
+        except ValueError:
+            # A negative length would make rfile.read() wait for the client to close the connection
+            self._send_json(400, {'error': 'Invalid Content-Length header'})
+            return
+        if length > MAX_BODY_BYTES:
+            self._send_json(413, {'error': 'Request body too large'})
+            return
+        try:
+            body = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            self._send_json(400, {'error': 'Request body is not valid JSON'})
+            return
+        query = body.get('query', '') if isinstance(body, dict) else ''
+        self._send_json(*self._search(query))
+
+    def log_message(self, format: str, *args) -> None:
+        if self.server.log_requests:
+            print(f"{self.address_string()} - {format % args}")
+
+    def _search(self, query: str) -> Tuple[int, Dict[str, Any]]:
+        """Search with the shared session and return the HTTP status and result."""
+        if not isinstance(query, str) or not query.strip():
+            return 400, {'error': 'Search string cannot be empty'}
+        results = self.server.session.search(query)
+        return (500 if 'error' in results else 200), results
+
+    def _send_json(self, status: int, payload: Dict[str, Any]) -> None:
+        body = json.dumps(payload, ensure_ascii=False, default=str).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def create_server(session: SearchSession, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                  log_requests: bool = True) -> ThreadingHTTPServer:
+    """
+    Create the search HTTP server. Every request is handled in its own thread.
+
+    Args:
+        session: Search session shared by all requests
+        host: Interface to listen on
+        port: Port to listen on (0 picks a free port)
+        log_requests: Print a line per request
+
+    Returns:
+        The server; call serve_forever() to start answering requests
+    """
+    server = ThreadingHTTPServer((host, port), SearchRequestHandler)
+    server.daemon_threads = True
+    server.session = session
+    server.log_requests = log_requests
+    return server
+
+
+def main():
+    """Main function to start the search service."""
+    parser = argparse.ArgumentParser(description='HTTP/JSON product search service')
+    parser.add_argument('--host', default=os.getenv('SEARCH_SERVICE_HOST', DEFAULT_HOST),
+                        help=f'Interface to listen on (default: SEARCH_SERVICE_HOST or {DEFAULT_HOST})')
+    parser.add_argument('--port', type=int, default=int(os.getenv('SEARCH_SERVICE_PORT', str(DEFAULT_PORT))),
+                        help=f'Port to listen on (default: SEARCH_SERVICE_PORT or {DEFAULT_PORT})')
+    parser.add_argument('--quiet', action='store_true', help='Do not print a line per request')
+
+    args = parser.parse_args()
+
+    print("Product Search Service")
+    print("=" * 40)
+    session = SearchSession()
+    try:
+        session.warm_up()
+    except Exception as e:
+        print(f"Error: could not start the search session: {e}")
+        sys.exit(1)
+
+    server = create_server(session, args.host, args.port, log_requests=not args.quiet)
+    print(f"Listening on http://{server.server_address[0]}:{server.server_address[1]}/search?q=...")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nShutting down...")
+    finally:
+        server.server_close()
+        session.close()
+        close_pinecone()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the arrow_transform module.
+Checks that the vectorized transform gives the same products and aggregates as the per-record code.
+"""
+
+import pyarrow as pa
+import pytest
+
+from arrow_transform import supports_table, transform_table
+from download_products import IngestAggregates, IngestPipeline, build_product, is_valid_product
+from test_ingest_pipeline import RecordingSink
+
+NAME_TYPE = pa.list_(pa.struct([('lang', pa.string()), ('text', pa.string())]))
+
+SCHEMA = pa.schema([
+    ('code', pa.string()),
+    ('lang', pa.string()),
+    ('product_name', NAME_TYPE),
+    ('brands', pa.string()),
+    ('food_groups_tags', pa.list_(pa.string())),
+    ('quantity', pa.string()),
+    ('categories_tags', pa.list_(pa.string())),
+    ('categories', pa.string()),
+    ('labels', pa.string()),
+    ('nutriscore_score', pa.int64()),
+])
+
+
+def make_record(code, names=('Product',), categories='Food,Spreads', **fields):
+    """Build a dataset record in the dataset schema."""
+    record = {
+        'code': code,
+        'lang': 'pl',
+        'product_name': None if names is None else [{'lang': 'main', 'text': name} for name in names],
+        'brands': 'Brand',
+        'food_groups_tags': ['en:sweets'],
+        'quantity': '100 g',
+        'categories_tags': ['en:food', 'pl:pasty-do-smarowania'],
+        'categories': categories,
+        'labels': 'Organic, Vegan',
+        'nutriscore_score': 3,
+    }
+    record.update(fields)
+    return record
+
+
+EDGE_CASE_RECORDS = [
+    make_record('1', names=('Kawa', 'Kawa', 'Coffee', '', None)),
+    make_record('2', names=('  ', None)),  # Blank names - skipped
+    make_record('3', names=None),  # No names - skipped
+    make_record('4', names=()),  # Empty names - skipped
+    make_record('5', categories='en:only, fr:tags'),  # Only categories with ':' - skipped
+    make_record('6', categories=''),  # Empty categories - skipped
+    make_record('7', categories=None),  # Missing categories - skipped
+    make_record('8', categories=' Food ,, en:tag,  Dairy , ', labels=''),
+    make_record('9', categories='Napoje,Soki', labels=None, brands=None, quantity='', food_groups_tags=None),
+    make_record('10', names=('ŻÓŁTY Ser', 'żółty ser'), categories='Sery,Żółte', labels='EKO,Bez glutenu,'),
+    make_record('11', names=('ΟΔΟΣ',), categories='Greek,Food'),  # Final sigma
+    make_record('12', names=('İstanbul',), categories='Food'),  # Dotted capital I
+    make_record('13', categories='Food,Dairy,Cheese', food_groups_tags=[]),
+    make_record('14', categories='Dairy,Cheese', lang='en', food_groups_tags=['en:milk', None]),
+    make_record('15', brands='Łaciate', quantity='1 L', categories_tags=['EN:Dairy', '', None, 'milk-drinks']),
+    make_record('16', categories='Food', categories_tags=None),
+    make_record('17', categories='Food', categories_tags=['el:ΓΑΛΑΣ']),  # Final sigma in a tag
+]
+
+
+def transform_per_record(records, start_position=0):
+    """Reference transform with the per-record functions."""
+    products = []
+    aggregates = IngestAggregates()
+    for position, record in enumerate(records, start_position):
+        if is_valid_product(record):
+            products.append((position, build_product(record)))
+            aggregates.add(record, position)
+        else:
+            aggregates.skipped_count += 1
+    return products, aggregates
+
+
+class TableSource:
+    """Record source reading a list of records as Arrow batches."""
+
+    def __init__(self, records):
+        self.records = records
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def iter_batches(self, batch_size):
+        for start in range(0, len(self.records), batch_size):
+            yield pa.Table.from_pylist(self.records[start:start + batch_size], schema=SCHEMA)
+
+
+class TestArrowTransform:
+    """Test class for the vectorized transform."""
+
+    def test_edge_cases_match_per_record_transform(self):
+        """Test validation, splitting, search_string, scoring fields and aggregates on edge cases."""
+        table = pa.Table.from_pylist(EDGE_CASE_RECORDS, schema=SCHEMA)
+        result = transform_table(table, start_position=100)
+        expected_products, expected = transform_per_record(table.to_pylist(), start_position=100)
+
+        products = sorted(result.products + [(position, build_product(record))
+                                             for position, record in result.fallback_records
+                                             if is_valid_product(record)], key=lambda item: item[0])
+        for _, product in expected_products:
+            del product['content_hash']
+        for _, product in products:
+            product.pop('content_hash', None)
+
+        assert products == expected_products
+        assert result.skipped_codes == ['2', '3', '4', '5', '6', '7']
+        assert sorted(position for position, _ in result.fallback_records) == [110, 111, 116]
+
+        aggregates = IngestAggregates()
+        aggregates.add_batch(result)
+        for position, record in result.fallback_records:
+            aggregates.add(record, position)
+        assert aggregates.unique_categories == expected.unique_categories
+        assert aggregates.unique_last_categories == expected.unique_last_categories
+        assert aggregates.unique_food_groups == expected.unique_food_groups
+        assert aggregates.langs_map == expected.langs_map
+        assert aggregates.skipped_count == expected.skipped_count
+
+    def test_scoring_fields(self):
+        """Test the given_name and scoring fields of vectorized products."""
+        table = pa.Table.from_pylist([make_record('1', names=('Kawa', 'KAWA', 'Coffee'), categories='Napoje, Kawa,en:x',
+                                                  categories_tags=['EN:Drinks', 'pl:kawy-mielone'])], schema=SCHEMA)
+
+        _, product = transform_table(table).products[0]
+
+        assert product['given_name'] == 'Kawa'
+        assert product['scoring'] == {
+            'names': ['kawa', 'coffee'],
+            'brands': 'brand',
+            'quantity': '100 g',
+            'categories': ['napoje', 'kawa', 'en:x'],
+            'category_tags': ['en:drinks', 'kawy mielone'],
+            'labels': ['organic', 'vegan'],
+        }
+
+    def test_supports_table(self):
+        """Test that batches with unexpected column types are left to the per-record transform."""
+        assert supports_table(pa.Table.from_pylist(EDGE_CASE_RECORDS, schema=SCHEMA))
+        assert supports_table(pa.table({'code': ['1'], 'lang': ['pl']}))
+        assert not supports_table(pa.table({'code': ['1'], 'product_name': ['Kawa']}))
+        assert not supports_table(pa.table({'code': ['1'], 'categories': [['Food']]}))
+        assert not supports_table(pa.table({'code': ['1'], 'categories_tags': ['en:food']}))
+
+    @pytest.mark.parametrize("batch_size", [1, 4, 1000])
+    def test_pipeline_output_matches_per_record_pipeline(self, batch_size):
+        """Test that the pipeline writes identical products with and without the vectorized transform."""
+        records = EDGE_CASE_RECORDS + [make_record(str(i), categories=f'Food,Group {i % 7}') for i in range(20, 120)]
+
+        results = []
+        for vectorized in (False, True):
+            sink = RecordingSink()
+            pipeline = IngestPipeline([sink], transform_workers=2, chunk_size=8,
+                                      vectorized=vectorized, batch_size=batch_size)
+            aggregates = pipeline.run(TableSource(records))
+            results.append((sorted(sink.products, key=lambda item: item[0]), aggregates.unique_food_groups,
+                            aggregates.unique_categories, aggregates.unique_last_categories,
+                            aggregates.langs_map, aggregates.skipped_count, pipeline.read_count))
+
+        assert results[0] == results[1]
+        assert len(results[1][0]) == len(records) - 6
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the BulkProductWriter in the download_products module.
+Uses a fake collection so no MongoDB connection is required.
+"""
+
+import pytest
+from pymongo import WriteConcern
+from pymongo.errors import BulkWriteError, AutoReconnect
+
+from download_products import BulkProductWriter, parse_write_concern
+
+
+class FakeBulkResult:
+    """Minimal stand-in for pymongo's BulkWriteResult."""
+
+    def __init__(self, operations):
+        self.acknowledged = True
+        self.bulk_api_result = {
+            'nUpserted': len(operations),
+            'nModified': 0,
+            'writeErrors': [],
+        }
+
+
+class FakeCollection:
+    """Fake MongoDB collection recording bulk_write calls."""
+
+    def __init__(self, fail_indexes=None, raise_error=None):
+        self.calls = []
+        self.fail_indexes = fail_indexes or []
+        self.raise_error = raise_error
+        self.write_concern = None
+
+    def with_options(self, write_concern=None):
+        self.write_concern = write_concern
+        return self
+
+    def bulk_write(self, operations, ordered=True):
+        self.calls.append((list(operations), ordered))
+        if self.raise_error:
+            raise self.raise_error
+        if self.fail_indexes:
+            raise BulkWriteError({
+                'nUpserted': len(operations) - len(self.fail_indexes),
+                'nModified': 0,
+                'writeErrors': [
+                    {'index': i, 'code': 11000, 'errmsg': 'duplicate key'} for i in self.fail_indexes
+                ],
+            })
+        return FakeBulkResult(operations)
+
+
+class TestBulkProductWriter:
+    """Test class for BulkProductWriter."""
+
+    def test_flushes_when_batch_is_full(self):
+        """Test that operations are sent once batch_size products are buffered."""
+        collection = FakeCollection()
+        writer = BulkProductWriter(collection, batch_size=2)
+
+        writer.add({'_id': '1'})
+        assert collection.calls == []
+        writer.add({'_id': '2'})
+        assert len(collection.calls) == 1
+
+        operations, ordered = collection.calls[0]
+        assert ordered is False
+        assert len(operations) == 2
+        assert writer.written_count == 2
+
+    def test_close_flushes_remaining_operations(self):
+        """Test that close() writes a partially filled buffer."""
+        collection = FakeCollection()
+        writer = BulkProductWriter(collection, batch_size=10)
+
+        for i in range(3):
+            writer.add({'_id': str(i)})
+        writer.close()
+
+        assert len(collection.calls) == 1
+        assert writer.written_count == 3
+        assert writer.upserted_count == 3
+
+        # Closing again does not issue an empty bulk write
+        writer.close()
+        assert len(collection.calls) == 1
+
+    def test_per_document_errors_do_not_drop_batch(self):
+        """Test that failing documents are reported while the rest are counted as written."""
+        collection = FakeCollection(fail_indexes=[1])
+        writer = BulkProductWriter(collection, batch_size=3)
+
+        writer.add({'_id': 'a'})
+        writer.add({'_id': 'b'})
+        writer.add({'_id': 'c'})
+
+        assert writer.written_count == 2
+        assert writer.error_count == 1
+        assert writer.errors[0]['_id'] == 'b'
+        assert writer.errors[0]['code'] == 11000
+
+    def test_failed_batch_reports_all_documents(self):
+        """Test that a batch-level failure is reported for every document without raising."""
+        collection = FakeCollection(raise_error=AutoReconnect('connection lost'))
+        writer = BulkProductWriter(collection, batch_size=2)
+
+        writer.add({'_id': 'a'})
+        writer.add({'_id': 'b'})
+
+        assert writer.written_count == 0
+        assert writer.error_count == 2
+        assert [error['_id'] for error in writer.errors] == ['a', 'b']
+
+    def test_bulk_write_latency_is_recorded(self):
+        """Test that every bulk_write call is timed, including partially failed ones."""
+        writer = BulkProductWriter(FakeCollection(fail_indexes=[0]), batch_size=2)
+
+        for product_id in 'abcd':
+            writer.add({'_id': product_id})
+
+        assert writer.latency.count == 2
+        assert writer.latency.summary()['p50_ms'] >= 0
+
+    def test_write_concern_is_applied(self):
+        """Test that the configured write concern is applied to the collection."""
+        collection = FakeCollection()
+        write_concern = WriteConcern(w='majority')
+        BulkProductWriter(collection, write_concern=write_concern)
+
+        assert collection.write_concern == write_concern
+
+
+class TestParseWriteConcern:
+    """Test class for parse_write_concern function."""
+
+    @pytest.mark.parametrize("value,expected_w", [
+        ("0", 0),
+        ("1", 1),
+        ("majority", "majority"),
+        (" 2 ", 2),
+    ])
+    def test_parse_write_concern(self, value, expected_w):
+        """Test parsing numeric and tag write concerns."""
+        assert parse_write_concern(value).document['w'] == expected_w
+
+    def test_parse_write_concern_empty(self):
+        """Test that an empty setting keeps the default write concern."""
+        assert parse_write_concern('') is None
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the catalog_indexes module.
+Checks index verification and the once-per-collection bootstrap.
+"""
+
+import pytest
+
+from catalog_indexes import REQUIRED_INDEXES, bootstrap_indexes, has_index, missing_indexes, reset_bootstrap_cache
+from test_search_session import FakeSearchCollection
+
+TEXT_INDEX = REQUIRED_INDEXES[0]
+
+
+@pytest.fixture(autouse=True)
+def fresh_index_cache():
+    reset_bootstrap_cache()
+    yield
+    reset_bootstrap_cache()
+
+
+class TestIndexVerification:
+    """Test class for matching existing indexes against the required ones."""
+
+    def test_text_index_matched_on_fields(self):
+        """Test that a text index on search_string matches whatever its name."""
+        existing = {'_id_': {'key': [('_id', 1)]},
+                    'custom_name': {'key': [('_fts', 'text'), ('_ftsx', 1)], 'weights': {'search_string': 1}}}
+
+        assert has_index(existing, TEXT_INDEX)
+
+    def test_other_text_index_does_not_match(self):
+        """Test that a text index on other fields is not taken for the search_string index."""
+        existing = {'name_text': {'key': [('_fts', 'text'), ('_ftsx', 1)], 'weights': {'product_name': 1}}}
+
+        assert not has_index(existing, TEXT_INDEX)
+
+    def test_regular_index_matched_on_keys(self):
+        """Test that regular indexes are matched on their keys and directions."""
+        existing = {'lang_1': {'key': [('lang', 1)]}}
+
+        assert has_index(existing, {'keys': [('lang', 1)], 'name': 'lang_1'})
+        assert not has_index(existing, {'keys': [('lang', -1)], 'name': 'lang_-1'})
+
+
+class TestBootstrapIndexes:
+    """Test class for bootstrap_indexes."""
+
+    def test_creates_missing_indexes_once(self):
+        """Test that missing indexes are created and the check is cached per collection."""
+        collection = FakeSearchCollection([])
+
+        assert bootstrap_indexes(collection) == ['search_string_text']
+        assert missing_indexes(collection) == []
+        assert bootstrap_indexes(collection) == []
+        assert collection.created_indexes == ['search_string_text']
+
+    def test_existing_indexes_are_kept(self):
+        """Test that nothing is created when the indexes exist."""
+        collection = FakeSearchCollection([])
+        collection.indexes['search_string_text'] = {'key': [('_fts', 'text'), ('_ftsx', 1)],
+                                                    'weights': {'search_string': 1}}
+
+        assert bootstrap_indexes(collection) == []
+        assert collection.created_indexes == []
+
+    def test_force_verifies_again(self):
+        """Test that force re-checks a collection, e.g. after its indexes were dropped."""
+        collection = FakeSearchCollection([])
+        bootstrap_indexes(collection)
+        del collection.indexes['search_string_text']
+
+        assert bootstrap_indexes(collection) == []
+        assert bootstrap_indexes(collection, force=True) == ['search_string_text']
+
+    def test_collections_are_cached_separately(self):
+        """Test that every language collection gets its own indexes."""
+        collections = [FakeSearchCollection([], name) for name in ('products-catalog', 'products-catalog-de')]
+
+        for collection in collections:
+            bootstrap_indexes(collection)
+
+        assert [collection.created_indexes for collection in collections] == [['search_string_text']] * 2
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the catalog_snapshot module.
+Writes small snapshots to a temporary directory and reads them back.
+"""
+
+import os
+
+import pytest
+
+from catalog_snapshot import CatalogSnapshotWriter, load_manifest, read_snapshot
+from download_products import build_product
+
+
+def make_product(code):
+    """Build a product document from a minimal dataset record."""
+    return build_product({
+        'code': code,
+        'lang': 'pl',
+        'product_name': [{'lang': 'main', 'text': f'Produkt {code}'}],
+        'categories': 'Food,Spreads',
+        'labels': 'Bio',
+        'popularity_key': 7,
+        'nutriscore_score': None,
+    })
+
+
+class TestCatalogSnapshotWriter:
+    """Test class for CatalogSnapshotWriter."""
+
+    @pytest.mark.parametrize("file_format", ["parquet", "arrow"])
+    def test_snapshot_round_trip(self, tmp_path, file_format):
+        """Test that written products and the manifest are read back unchanged."""
+        products = [make_product(str(i)) for i in range(5)]
+        writer = CatalogSnapshotWriter(str(tmp_path), file_format=file_format, row_group_size=2)
+        writer.prepare()
+        for product in products:
+            writer.add(product)
+        writer.close()
+        manifest = writer.write_manifest(dataset_revision='abc123')
+
+        assert load_manifest(str(tmp_path)) == manifest
+        assert manifest['dataset_revision'] == 'abc123'
+        assert manifest['row_count'] == 5
+        assert manifest['format'] == file_format
+        assert manifest['files'] == [{'path': f'part-000000000000.{file_format}', 'rows': 5}]
+        assert read_snapshot(str(tmp_path)).to_pylist() == products
+        assert read_snapshot(str(tmp_path), columns=['_id']).column_names == ['_id']
+
+    def test_resume_keeps_parts_before_checkpoint(self, tmp_path):
+        """Test that a resumed run keeps the parts closed at earlier checkpoints and drops later ones."""
+        writer = CatalogSnapshotWriter(str(tmp_path))
+        writer.prepare()
+        writer.add(make_product('1'))
+        writer.roll(10)  # Checkpoint after 10 records read
+        writer.add(make_product('2'))
+        writer.flush()  # Written after the checkpoint, then the run is interrupted
+
+        resumed = CatalogSnapshotWriter(str(tmp_path))
+        resumed.prepare(resume_position=10)
+        resumed.add(make_product('3'))
+        resumed.close()
+        manifest = resumed.write_manifest()
+
+        assert sorted(os.listdir(tmp_path)) == ['manifest.json', 'part-000000000000.parquet',
+                                                'part-000000000010.parquet']
+        assert manifest['row_count'] == 2
+        assert read_snapshot(str(tmp_path)).column('_id').to_pylist() == ['1', '3']
+
+    def test_new_run_replaces_previous_snapshot(self, tmp_path):
+        """Test that a run that does not resume removes the parts and manifest of the previous one."""
+        writer = CatalogSnapshotWriter(str(tmp_path))
+        writer.prepare()
+        writer.add(make_product('1'))
+        writer.close()
+        writer.write_manifest()
+
+        CatalogSnapshotWriter(str(tmp_path)).prepare()
+
+        assert os.listdir(tmp_path) == []
+        assert load_manifest(str(tmp_path)) is None
+
+    def test_write_failure_marks_snapshot_incomplete(self, tmp_path):
+        """Test that products not matching the schema stop the snapshot without raising."""
+        writer = CatalogSnapshotWriter(str(tmp_path))
+        writer.prepare()
+        product = make_product('1')
+        product['nutriscore_score'] = 'not a number'
+
+        writer.add(product)
+        writer.close()
+
+        assert writer.failed
+        assert writer.write_manifest() is None
+        with pytest.raises(FileNotFoundError):
+            read_snapshot(str(tmp_path))
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the staged ingest pipeline in the download_products module.
+Runs the pipeline over in-memory records with a recording sink.
+"""
+
+import threading
+
+import pytest
+from download_products import (
+    CHECKPOINT_VERSION,
+    IngestPipeline,
+    IngestAggregates,
+    ProductChangeTracker,
+    ProductSink,
+    build_product,
+    compute_product_hash,
+    is_valid_product,
+    load_checkpoint,
+    load_product_ids,
+    save_checkpoint,
+)
+
+
+def make_record(code, categories='Food,Spreads', names=('Product',), lang='pl'):
+    """Build a minimal dataset record."""
+    return {
+        'code': code,
+        'lang': lang,
+        'product_name': [{'lang': 'main', 'text': name} for name in names],
+        'categories': categories,
+        'food_groups_tags': ['en:sweets'],
+        'quantity': '100 g',
+        'brands': 'Brand',
+        'labels': 'Organic, Vegan',
+    }
+
+
+class RecordingSink:
+    """Sink collecting all written products."""
+
+    def __init__(self):
+        self.products = []
+        self.closed = False
+        self._lock = threading.Lock()
+
+    def write(self, items):
+        with self._lock:
+            self.products.extend(items)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+class RecordingWriter:
+    """Stand-in for BulkProductWriter collecting added products."""
+
+    def __init__(self):
+        self.products = []
+
+    def add(self, product):
+        self.products.append(product)
+
+
+class RecordingStream(RecordingWriter):
+    """Stand-in for PineconeProductStream collecting added products."""
+
+    def __init__(self, skip_unchanged=False):
+        super().__init__()
+        self.skip_unchanged = skip_unchanged
+
+
+class FailingSink(RecordingSink):
+    """Sink raising on the first write."""
+
+    def write(self, items):
+        raise RuntimeError("sink failed")
+
+
+class TestBuildProduct:
+    """Test class for build_product function."""
+
+    def test_build_product_search_string(self):
+        """Test that search_string concatenates names, quantity, brands, categories and labels."""
+        product = build_product(make_record('1', names=('Kawa', 'Kawa', 'Coffee')))
+
+        assert product['_id'] == '1'
+        assert product['search_string'] == 'kawa coffee 100 g brand food spreads organic  vegan'
+        assert product['categories'] == ['Food', 'Spreads']
+        assert product['labels'] == ['Organic', 'Vegan']
+
+    def test_build_product_scoring_fields(self):
+        """Test that the given_name and scoring fields are precomputed on the product."""
+        product = build_product(make_record('1', names=('Kawa', 'KAWA', 'Coffee')))
+
+        assert product['given_name'] == 'Spreads'
+        assert product['scoring']['names'] == ['kawa', 'coffee']
+        assert product['scoring']['categories'] == ['food', 'spreads']
+
+
+class TestIngestPipeline:
+    """Test class for IngestPipeline."""
+
+    @pytest.mark.parametrize("transform_workers,writers,chunk_size", [
+        (1, 1, 1),
+        (3, 2, 7),
+        (4, 4, 100),
+    ])
+    def test_pipeline_matches_sequential_processing(self, transform_workers, writers, chunk_size):
+        """Test that the pipeline writes the same products and aggregates as a sequential loop."""
+        records = [make_record(str(i), categories=f'Food,Group {i % 5},Leaf {i % 3}') for i in range(250)]
+        records[10] = make_record('10', categories='en:only-tags')  # Invalid - skipped
+
+        sinks = [RecordingSink() for _ in range(writers)]
+        pipeline = IngestPipeline(sinks, transform_workers=transform_workers, queue_size=2, chunk_size=chunk_size)
+        aggregates = pipeline.run(iter(records))
+
+        expected = IngestAggregates()
+        expected_products = []
+        for position, record in enumerate(records):
+            if is_valid_product(record):
+                expected_products.append((position, build_product(record)))
+                expected.add(record, position)
+            else:
+                expected.skipped_count += 1
+
+        written = sorted((item for sink in sinks for item in sink.products), key=lambda item: item[0])
+        assert written == expected_products
+        assert all(sink.closed for sink in sinks)
+        assert pipeline.read_count == len(records)
+        assert aggregates.skipped_count == 1
+        assert aggregates.unique_categories == expected.unique_categories
+        assert aggregates.unique_last_categories == expected.unique_last_categories
+        assert aggregates.unique_food_groups == expected.unique_food_groups
+        assert aggregates.langs_map == expected.langs_map
+        assert pipeline.stats['transform'].items == len(records)
+        assert pipeline.stats['write'].items == len(records) - 1
+
+    def test_last_category_mapping_keeps_latest_record(self):
+        """Test that merged last category mappings keep the path from the latest record."""
+        first = IngestAggregates()
+        first.add(make_record('1', categories='Dairy,Cheese'), 5)
+        second = IngestAggregates()
+        second.add(make_record('2', categories='Food,Dairy,Cheese'), 2)
+
+        first.merge(second)
+        assert first.unique_last_categories == {'Cheese': 'Dairy > Cheese'}
+
+        second.merge(first)
+        assert second.unique_last_categories == {'Cheese': 'Dairy > Cheese'}
+
+    def test_sink_failure_stops_pipeline(self):
+        """Test that a failing stage aborts the pipeline and re-raises the error."""
+        records = [make_record(str(i)) for i in range(1000)]
+        pipeline = IngestPipeline([FailingSink()], transform_workers=2, queue_size=1, chunk_size=10)
+
+        with pytest.raises(RuntimeError, match="sink failed"):
+            pipeline.run(iter(records))
+
+    def test_checkpoints_cover_only_written_records(self):
+        """Test that each checkpoint is taken after all records read so far were written."""
+        records = [make_record(str(i)) for i in range(100)]
+        sinks = [RecordingSink(), RecordingSink()]
+        checkpoints = []
+
+        def on_checkpoint(state, read_count, aggregates):
+            written = sum(len(sink.products) for sink in sinks)
+            checkpoints.append((read_count, written, aggregates.langs_map.get('pl', 0)))
+
+        pipeline = IngestPipeline(sinks, transform_workers=3, queue_size=2, chunk_size=5,
+                                  checkpoint_interval=20, on_checkpoint=on_checkpoint)
+        pipeline.run(iter(records))
+
+        assert [read_count for read_count, _, _ in checkpoints] == [20, 40, 60, 80, 100]
+        assert all(read_count == written == counted for read_count, written, counted in checkpoints)
+
+    def test_resume_continues_counts_and_aggregates(self):
+        """Test that a resumed pipeline continues positions and aggregates from a checkpoint."""
+        checkpoint_aggregates = IngestAggregates()
+        checkpoint_aggregates.add(make_record('0', categories='Old,Category'), 0)
+        checkpoint_aggregates.skipped_count = 3
+        restored = IngestAggregates.from_dict(checkpoint_aggregates.to_dict())
+
+        sink = RecordingSink()
+        pipeline = IngestPipeline([sink], aggregates=restored, start_count=50)
+        aggregates = pipeline.run(iter([make_record('51', categories='New,Category')]))
+
+        assert pipeline.read_count == 51
+        assert sink.products[0][0] == 50
+        assert aggregates.skipped_count == 3
+        assert aggregates.unique_categories == {'Old', 'New', 'Category'}
+        assert aggregates.unique_last_categories == {'Category': 'New > Category'}
+        assert aggregates.langs_map == {'pl': 2}
+
+
+class TestCheckpointFile:
+    """Test class for checkpoint persistence."""
+
+    def test_save_and_load_checkpoint(self, tmp_path):
+        """Test that a saved checkpoint is loaded back unchanged."""
+        filename = str(tmp_path / 'checkpoint.json')
+        checkpoint = {'version': CHECKPOINT_VERSION, 'source': 'parquet', 'read_count': 10,
+                      'source_state': {'shard': 1, 'row_group': 2, 'row': 3}}
+
+        save_checkpoint(filename, checkpoint)
+
+        assert load_checkpoint(filename) == checkpoint
+        assert not (tmp_path / 'checkpoint.json.tmp').exists()
+
+    def test_load_missing_or_invalid_checkpoint(self, tmp_path):
+        """Test that missing, corrupt or outdated checkpoints are ignored."""
+        assert load_checkpoint(str(tmp_path / 'missing.json')) is None
+
+        corrupt = tmp_path / 'corrupt.json'
+        corrupt.write_text('{"version": 1, ')
+        assert load_checkpoint(str(corrupt)) is None
+
+        outdated = tmp_path / 'outdated.json'
+        outdated.write_text('{"version": 0}')
+        assert load_checkpoint(str(outdated)) is None
+
+
+class TestIncrementalIngest:
+    """Test class for content hashes and change tracking."""
+
+    def test_product_hash_is_stable(self):
+        """Test that the content hash depends only on the document content."""
+        product = build_product(make_record('1'))
+        reordered = dict(reversed(list(product.items())))
+
+        assert product['content_hash'] == compute_product_hash(product)
+        assert compute_product_hash(reordered) == product['content_hash']
+        assert build_product(make_record('1', names=('Other',)))['content_hash'] != product['content_hash']
+
+    def test_change_tracker_classification(self):
+        """Test that products are classified as added, changed or unchanged."""
+        unchanged = build_product(make_record('1'))
+        changed = build_product(make_record('2', names=('New name',)))
+        added = build_product(make_record('3'))
+        tracker = ProductChangeTracker({'1': unchanged['content_hash'], '2': 'old-hash', '4': 'gone'})
+
+        assert tracker.classify(unchanged) == ProductChangeTracker.UNCHANGED
+        assert tracker.classify(changed) == ProductChangeTracker.CHANGED
+        assert tracker.classify(added) == ProductChangeTracker.ADDED
+        assert tracker.counts == {'added': 1, 'changed': 1, 'unchanged': 1}
+        assert tracker.removed_ids() == ['4']
+
+    def test_removals_from_stored_ids(self):
+        """Test that a tracker of the stored ids merges shard results and detects removed products."""
+        class IdCollection:
+            def find(self, query, projection):
+                assert projection == {'_id': 1}
+                return [{'_id': '1'}, {'_id': '2'}, {'_id': '3'}]
+
+        tracker = ProductChangeTracker(load_product_ids(IdCollection()))
+        tracker.merge({'added': 1, 'unchanged': 2}, ['1', '3', '5'])
+
+        assert tracker.counts == {'added': 1, 'changed': 0, 'unchanged': 2}
+        assert tracker.removed_ids() == ['2']
+
+    def test_sink_skips_unchanged_products(self):
+        """Test that unchanged products are not written to MongoDB, but still to Pinecone and the snapshot."""
+        unchanged = build_product(make_record('1'))
+        added = build_product(make_record('2'))
+        mongo_writer = RecordingWriter()
+        pinecone_stream = RecordingStream()
+        snapshot_writer = RecordingWriter()
+        sink = ProductSink(mongo_writer, pinecone_stream, ProductChangeTracker({'1': unchanged['content_hash']}),
+                           snapshot_writer)
+
+        sink.write([(0, unchanged), (1, added)])
+
+        assert mongo_writer.products == [added]
+        assert pinecone_stream.products == [unchanged, added]
+        assert snapshot_writer.products == [unchanged, added]
+
+    def test_sink_skips_unchanged_pinecone_products_when_configured(self):
+        """Test that a Pinecone stream with skip_unchanged only gets added and changed products."""
+        unchanged = build_product(make_record('1'))
+        added = build_product(make_record('2'))
+        pinecone_stream = RecordingStream(skip_unchanged=True)
+        sink = ProductSink(RecordingWriter(), pinecone_stream, ProductChangeTracker({'1': unchanged['content_hash']}))
+
+        sink.write([(0, unchanged), (1, added)])
+
+        assert pinecone_stream.products == [added]
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the ingest_progress module.
+Covers latency percentiles, progress intervals and the progress counters of the ingest pipeline.
+"""
+
+import json
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from download_products import BulkProductWriter, IngestPipeline, ProductSink
+from ingest_progress import LatencyRecorder, ProgressReporter, format_bytes, save_summary
+from parquet_source import FileRecordSource
+from test_bulk_writer import FakeCollection
+from test_ingest_pipeline import make_record
+
+
+class TestLatencyRecorder:
+    """Test class for LatencyRecorder."""
+
+    def test_percentiles(self):
+        """Test count, mean, percentiles and maximum in milliseconds."""
+        recorder = LatencyRecorder()
+        for millis in range(1, 101):
+            recorder.record(millis / 1000)
+
+        summary = recorder.summary()
+
+        assert summary['count'] == 100
+        assert summary['mean_ms'] == pytest.approx(50.5)
+        assert summary['p50_ms'] == pytest.approx(50, abs=1)
+        assert summary['p95_ms'] == pytest.approx(95, abs=1)
+        assert summary['p99_ms'] == pytest.approx(99, abs=1)
+        assert summary['max_ms'] == pytest.approx(100)
+
+    def test_empty_recorder(self):
+        """Test that an empty recorder reports no latencies."""
+        summary = LatencyRecorder().summary()
+
+        assert summary['count'] == 0
+        assert summary['p50_ms'] is None
+        assert summary['max_ms'] is None
+
+    def test_sample_is_bounded(self):
+        """Test that the reservoir keeps at most max_samples latencies but counts all of them."""
+        recorder = LatencyRecorder(max_samples=50)
+        for i in range(1000):
+            recorder.record(i / 1000)
+
+        assert recorder.count == 1000
+        assert len(recorder.to_dict()['samples']) == 50
+        assert recorder.summary()['max_ms'] == pytest.approx(999)
+
+    def test_merge_through_plain_data(self):
+        """Test merging recorders converted to plain data, as done across processes."""
+        fast, slow = LatencyRecorder(max_samples=100), LatencyRecorder(max_samples=100)
+        for _ in range(300):
+            fast.record(0.001)
+        for _ in range(100):
+            slow.record(0.1)
+
+        merged = LatencyRecorder.from_dict(fast.to_dict(), max_samples=100)
+        merged.merge(LatencyRecorder.from_dict(slow.to_dict()))
+
+        assert merged.count == 400
+        assert len(merged.to_dict()['samples']) == 100
+        assert merged.summary()['p50_ms'] == pytest.approx(1)
+        assert merged.summary()['p99_ms'] == pytest.approx(100)
+
+
+class TestProgressReporter:
+    """Test class for ProgressReporter."""
+
+    def test_report_every_interval_records(self, capsys):
+        """Test that progress lines are printed once interval_records more records were read."""
+        progress = ProgressReporter(interval_seconds=0, interval_records=100)
+
+        printed = []
+        for _ in range(5):
+            progress.record_read(50, byte_count=2048)
+            printed.append(progress.report())
+
+        assert printed == [False, True, False, True, False]
+        lines = capsys.readouterr().out.splitlines()
+        assert lines[-1].startswith('Progress: 200 records read')
+        assert '8.0 KiB read' in lines[-1]
+
+    def test_quiet_level_prints_nothing(self, capsys):
+        """Test that the quiet log level suppresses progress lines."""
+        progress = ProgressReporter(interval_records=1, log_level='quiet')
+        progress.record_read(10)
+
+        assert not progress.report(force=True)
+        assert capsys.readouterr().out == ''
+
+    def test_invalid_log_level(self):
+        """Test that unknown log levels are rejected."""
+        with pytest.raises(ValueError):
+            ProgressReporter(log_level='verbose')
+
+    def test_summary_and_merge(self, tmp_path):
+        """Test the summary counters, skip rate and latencies merged from another reporter."""
+        worker = ProgressReporter()
+        recorder = LatencyRecorder()
+        recorder.record(0.02)
+        worker.add_latency('mongo_bulk_write', recorder)
+        worker.record_read(100, byte_count=1000)
+        worker.record_transformed(valid=75, skipped=25)
+        worker.record_written(70, unchanged=5)
+
+        progress = ProgressReporter()
+        progress.merge(json.loads(json.dumps(worker.to_dict())))
+        summary = progress.summary(source='local')
+
+        assert summary['source'] == 'local'
+        assert summary['records_read'] == 100
+        assert summary['bytes_read'] == 1000
+        assert summary['skip_rate'] == 0.25
+        assert summary['written_count'] == 70
+        assert summary['unchanged_count'] == 5
+        assert summary['latency']['mongo_bulk_write']['count'] == 1
+
+        save_summary(str(tmp_path / 'summary.json'), summary)
+        with open(tmp_path / 'summary.json', 'r', encoding='utf-8') as f:
+            assert json.load(f) == summary
+
+    def test_format_bytes(self):
+        """Test byte count formatting."""
+        assert format_bytes(512) == '512 B'
+        assert format_bytes(1536) == '1.5 KiB'
+        assert format_bytes(3 * 1024 ** 3) == '3.0 GiB'
+
+
+class TestPipelineProgress:
+    """Test class for the progress counters of the ingest pipeline."""
+
+    def test_pipeline_counts_records(self, capsys):
+        """Test that the pipeline counts records read, skipped and written without per-record lines."""
+        records = [make_record(str(i)) for i in range(40)] + [make_record('bad', categories='en:tag')]
+        progress = ProgressReporter(interval_seconds=0)
+        writer = BulkProductWriter(FakeCollection(), batch_size=10)
+        progress.add_latency('mongo_bulk_write', writer.latency)
+
+        pipeline = IngestPipeline([ProductSink(writer, progress=progress)], chunk_size=7, progress=progress)
+        pipeline.run(records)
+
+        assert (progress.records_read, progress.valid_count, progress.skipped_count) == (41, 40, 1)
+        assert progress.written_count == writer.written_count == 40
+        assert progress.summary()['latency']['mongo_bulk_write']['count'] == writer.batches_flushed
+        assert 'Record ' not in capsys.readouterr().out
+
+    def test_debug_level_prints_records(self, capsys):
+        """Test that the debug log level keeps a line per product."""
+        progress = ProgressReporter(interval_seconds=0, log_level='debug')
+
+        IngestPipeline([ProductSink(BulkProductWriter(FakeCollection()), progress=progress)], progress=progress).run(
+            [make_record('1'), make_record('2')])
+
+        assert capsys.readouterr().out.count('Queued for MongoDB') == 2
+
+    @pytest.mark.parametrize("vectorized", [False, True])
+    def test_bytes_read_from_parquet(self, tmp_path, vectorized):
+        """Test that the compressed size of the parquet column chunks read is counted."""
+        path = str(tmp_path / 'food.parquet')
+        pq.write_table(pa.Table.from_pylist([make_record(str(i)) for i in range(20)]), path, row_group_size=5)
+        progress = ProgressReporter(interval_seconds=0)
+
+        source = FileRecordSource([path])
+        IngestPipeline([ProductSink(progress=progress)], progress=progress, vectorized=vectorized).run(source)
+
+        metadata = pq.ParquetFile(path).metadata
+        expected = sum(metadata.row_group(g).column(c).total_compressed_size
+                       for g in range(metadata.num_row_groups) for c in range(metadata.num_columns))
+        assert progress.records_read == 20
+        assert progress.bytes_read == source.bytes_read == expected
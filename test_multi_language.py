@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the multi-language ingest in the download_products module.
+Checks that one pass over mixed-language records gives the same results as one pass per language.
+"""
+
+import pytest
+
+from download_products import (
+    IngestAggregates,
+    IngestPipeline,
+    LanguageAggregates,
+    LanguageSink,
+    catalog_collection_name,
+    is_valid_product,
+    language_filename,
+    parse_languages,
+)
+from test_arrow_transform import TableSource, make_record as make_table_record
+from test_ingest_pipeline import RecordingSink, make_record
+
+LANGUAGES = ['pl', 'de', 'fr']
+
+
+def mixed_records(factory):
+    """Records cycling through the languages, with overlapping categories and some invalid records."""
+    records = []
+    for i in range(90):
+        language = LANGUAGES[i % 3]
+        categories = f'Food,Group {i % 4},Leaf {i % 5}' if i % 11 else 'en:only'
+        records.append(factory(f'{language}-{i}', categories=categories, lang=language))
+    return records
+
+
+def per_language_aggregates(records, language):
+    """Sequential aggregates of the records of one language, at their positions in the mixed dataset."""
+    aggregates = IngestAggregates()
+    for position, record in enumerate(records):
+        if record['lang'] != language:
+            continue
+        if is_valid_product(record):
+            aggregates.add(record, position)
+        else:
+            aggregates.add_skipped(record)
+    return aggregates
+
+
+def assert_same_aggregates(actual, expected):
+    assert actual.unique_categories == expected.unique_categories
+    assert actual.unique_last_categories == expected.unique_last_categories
+    assert actual.unique_food_groups == expected.unique_food_groups
+    assert actual.langs_map == expected.langs_map
+    assert actual.skipped_count == expected.skipped_count
+
+
+class TestLanguageHelpers:
+    """Test class for the language configuration helpers."""
+
+    def test_parse_languages(self):
+        """Test that language lists are normalized and deduplicated in order."""
+        assert parse_languages('pl') == ['pl']
+        assert parse_languages(' PL, de,,pl , fr') == ['pl', 'de', 'fr']
+        assert parse_languages('') == []
+
+    def test_primary_language_keeps_names(self):
+        """Test that Polish keeps the existing collection and file names."""
+        assert catalog_collection_name('pl') == 'products-catalog'
+        assert catalog_collection_name('de') == 'products-catalog-de'
+        assert language_filename('unique_categories.json', 'pl') == 'unique_categories.json'
+        assert language_filename('unique_categories.json', 'de') == 'unique_categories_de.json'
+
+
+class TestMultiLanguageIngest:
+    """Test class for one-pass multi-language ingest."""
+
+    @pytest.mark.parametrize("vectorized", [False, True])
+    def test_one_pass_matches_per_language_runs(self, vectorized):
+        """Test that per-language aggregates of a mixed run equal those of separate runs."""
+        factory = make_table_record if vectorized else make_record
+        records = mixed_records(factory)
+        source = TableSource(records) if vectorized else records
+
+        pipeline = IngestPipeline([RecordingSink()], transform_workers=2, chunk_size=8,
+                                  aggregates=LanguageAggregates(), vectorized=vectorized, batch_size=10)
+        aggregates = pipeline.run(source)
+
+        assert sorted(aggregates.languages) == sorted(LANGUAGES)
+        for language in LANGUAGES:
+            assert_same_aggregates(aggregates.for_language(language), per_language_aggregates(records, language))
+        assert aggregates.langs_map == {'pl': 27, 'de': 27, 'fr': 27}
+        assert aggregates.skipped_count == 9
+
+    def test_vectorized_products_keep_positions(self):
+        """Test that batches mixing languages are split without reordering products."""
+        records = mixed_records(make_table_record)
+        sink = RecordingSink()
+
+        IngestPipeline([sink], transform_workers=1, aggregates=LanguageAggregates(), batch_size=10).run(
+            TableSource(records))
+
+        assert [(position, product['_id']) for position, product in sink.products] == [
+            (position, record['code']) for position, record in enumerate(records) if record['categories'] != 'en:only']
+
+    def test_language_sink_routes_products(self):
+        """Test that products reach the sink of their language."""
+        sinks = {language: RecordingSink() for language in LANGUAGES}
+        language_sink = LanguageSink(sinks)
+
+        language_sink.write([(0, {'_id': '1', 'lang': 'de'}), (1, {'_id': '2', 'lang': 'pl'}),
+                             (2, {'_id': '3', 'lang': 'de'})])
+        language_sink.close()
+
+        assert [product['_id'] for _, product in sinks['de'].products] == ['1', '3']
+        assert [product['_id'] for _, product in sinks['pl'].products] == ['2']
+        assert sinks['fr'].products == []
+        assert all(sink.closed for sink in sinks.values())
+
+    def test_aggregates_round_trip(self):
+        """Test that per-language aggregates survive serialization, e.g. in checkpoints."""
+        aggregates = LanguageAggregates()
+        aggregates.add(make_record('1', categories='Dairy,Cheese', lang='de'), 5)
+        aggregates.add_skipped(make_record('2', lang='pl'))
+
+        restored = LanguageAggregates.from_dict(aggregates.to_dict())
+
+        assert restored.for_language('de').unique_last_categories == {'Cheese': 'Dairy > Cheese'}
+        assert restored.for_language('pl').skipped_count == 1
+        assert restored.skipped_count == 1
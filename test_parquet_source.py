@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the parquet_source module.
+Writes small parquet, Arrow IPC and JSON files locally and checks the language filter and column projection.
+"""
+
+import json
+import os
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+import parquet_source
+from parquet_source import (
+    PRODUCT_COLUMNS,
+    FileRecordSource,
+    detect_file_format,
+    iter_parquet_records,
+    iter_row_group_tables,
+    list_local_files,
+)
+
+
+@pytest.fixture
+def parquet_path(tmp_path):
+    """Parquet file with three row groups: mixed languages, no Polish records, Polish only."""
+    table = pa.table({
+        'code': ['1', '2', '3', '4', '5', '6'],
+        'lang': ['pl', 'fr', 'en', 'de', 'pl', 'pl'],
+        'product_name': [[{'lang': 'main', 'text': f'Product {i}'}] for i in range(6)],
+        'categories': ['Food,Dairy'] * 6,
+        'ingredients_text': ['not projected'] * 6,
+    })
+    path = tmp_path / 'food.parquet'
+    pq.write_table(table, path, row_group_size=2)
+    return str(path)
+
+
+class TestParquetSource:
+    """Test class for the Arrow parquet reader."""
+
+    def test_records_are_filtered_by_language(self, parquet_path):
+        """Test that only records in the requested languages are returned."""
+        records = list(iter_parquet_records([parquet_path], languages=['pl']))
+
+        assert [record['code'] for record in records] == ['1', '5', '6']
+        assert records[0]['product_name'] == [{'lang': 'main', 'text': 'Product 0'}]
+
+    def test_columns_are_projected(self, parquet_path):
+        """Test that only product columns present in the file are read."""
+        record = next(iter_parquet_records([parquet_path], languages=['pl']))
+
+        assert set(record) == {'code', 'lang', 'product_name', 'categories'}
+        assert 'ingredients_text' not in record
+        assert set(record) <= set(PRODUCT_COLUMNS)
+
+    def test_row_groups_without_matches_are_skipped(self, parquet_path):
+        """Test that row groups without a matching language yield no table."""
+        row_groups = list(iter_row_group_tables(parquet_path, languages=['pl']))
+
+        assert [row_group for row_group, _ in row_groups] == [0, 1, 2]
+        assert row_groups[1][1] is None
+        assert row_groups[2][1].num_rows == 2
+
+    def test_multiple_languages(self, parquet_path):
+        """Test filtering on several languages at once."""
+        records = list(iter_parquet_records([parquet_path, parquet_path], languages=['fr', 'de']))
+
+        assert [record['code'] for record in records] == ['2', '4', '2', '4']
+
+    def test_filesystem_files_are_closed(self, parquet_path):
+        """Test that files opened through an fsspec filesystem are closed after reading, also early."""
+        local = pytest.importorskip('fsspec.implementations.local')
+        opened = []
+
+        class RecordingFileSystem(local.LocalFileSystem):
+            def _open(self, path, mode='rb', **kwargs):
+                handle = super()._open(path, mode, **kwargs)
+                opened.append(handle)
+                return handle
+
+        filesystem = RecordingFileSystem(skip_instance_cache=True)
+        records = list(iter_parquet_records([parquet_path], filesystem=filesystem))
+        row_groups = iter_row_group_tables(parquet_path, filesystem=filesystem)
+        next(row_groups)
+        row_groups.close()
+
+        assert [record['code'] for record in records] == ['1', '5', '6']
+        assert opened and all(handle.closed for handle in opened)
+
+    def test_record_source_resumes_from_state(self, parquet_path):
+        """Test that a source restored from state_dict() continues with the next record."""
+        source = FileRecordSource([parquet_path, parquet_path], languages=['pl'])
+        iterator = iter(source)
+        first = [next(iterator)['code'] for _ in range(4)]
+        state = source.state_dict()
+
+        resumed = FileRecordSource([parquet_path, parquet_path], languages=['pl'])
+        resumed.load_state_dict(state)
+        rest = [record['code'] for record in resumed]
+
+        assert first == ['1', '5', '6', '1']
+        assert rest == ['5', '6']
+        assert state == {'shard': 1, 'row_group': 0, 'row': 1}
+
+    def test_batches_resume_from_state(self, parquet_path):
+        """Test that batches are sliced from the blocks and share the position tracking of records."""
+        source = FileRecordSource([parquet_path, parquet_path], languages=['pl'])
+        batches = source.iter_batches(batch_size=1)
+        first = [next(batches).column('code').to_pylist() for _ in range(4)]
+        state = source.state_dict()
+
+        resumed = FileRecordSource([parquet_path, parquet_path], languages=['pl'])
+        resumed.load_state_dict(state)
+        rest = [batch.column('code').to_pylist() for batch in resumed.iter_batches(batch_size=5)]
+
+        assert first == [['1'], ['5'], ['6'], ['1']]
+        assert state == {'shard': 1, 'row_group': 0, 'row': 1}
+        assert rest == [['5', '6']]
+
+
+@pytest.fixture
+def snapshot_table():
+    """Small table in the dataset schema."""
+    return pa.table({
+        'code': ['1', '2', '3'],
+        'lang': ['pl', 'fr', 'pl'],
+        'categories': ['Food,Dairy', 'Food', 'Food,Drinks'],
+        'ingredients_text': ['not projected'] * 3,
+    })
+
+
+class TestLocalSnapshots:
+    """Test class for reading local Arrow IPC, JSON and JSONL snapshots."""
+
+    @pytest.mark.parametrize("writer", ["file", "stream"])
+    def test_arrow_ipc_files(self, tmp_path, snapshot_table, writer):
+        """Test that Arrow IPC files in file and stream format are read with filter and projection."""
+        path = tmp_path / 'food.arrow'
+        with pa.OSFile(str(path), 'wb') as sink:
+            new_writer = pa.ipc.new_file if writer == 'file' else pa.ipc.new_stream
+            with new_writer(sink, snapshot_table.schema) as ipc_writer:
+                ipc_writer.write_table(snapshot_table, max_chunksize=2)
+
+        records = list(iter_parquet_records([str(path)], languages=['pl']))
+
+        assert records == [
+            {'code': '1', 'lang': 'pl', 'categories': 'Food,Dairy'},
+            {'code': '3', 'lang': 'pl', 'categories': 'Food,Drinks'},
+        ]
+
+    def test_json_and_jsonl_files(self, tmp_path, snapshot_table):
+        """Test that JSON arrays and JSONL files give the same records as columnar files."""
+        rows = snapshot_table.to_pylist()
+        json_path = tmp_path / 'food.json'
+        json_path.write_text(json.dumps(rows), encoding='utf-8')
+        jsonl_path = tmp_path / 'food.jsonl'
+        jsonl_path.write_text('\n'.join(json.dumps(row) for row in rows) + '\n\n', encoding='utf-8')
+
+        from_json = list(iter_parquet_records([str(json_path)], languages=['pl']))
+        from_jsonl = list(iter_parquet_records([str(jsonl_path)], languages=['pl']))
+
+        assert from_json == from_jsonl
+        assert [record['code'] for record in from_json] == ['1', '3']
+        assert 'ingredients_text' not in from_json[0]
+
+    def test_jsonl_source_resumes_from_state(self, tmp_path, monkeypatch):
+        """Test resuming a JSONL file in the middle of a block."""
+        monkeypatch.setattr(parquet_source, 'JSON_BLOCK_SIZE', 2)
+        path = tmp_path / 'food.jsonl'
+        path.write_text('\n'.join(json.dumps({'code': str(i), 'lang': 'pl'}) for i in range(5)), encoding='utf-8')
+
+        source = FileRecordSource([str(path)])
+        iterator = iter(source)
+        first = [next(iterator)['code'] for _ in range(3)]
+        resumed = FileRecordSource([str(path)])
+        resumed.load_state_dict(source.state_dict())
+
+        assert first == ['0', '1', '2']
+        assert [record['code'] for record in resumed] == ['3', '4']
+
+    def test_json_array_read_in_chunks(self, tmp_path, monkeypatch):
+        """Test that a JSON array split across many small reads gives every record and resumes."""
+        monkeypatch.setattr(parquet_source, 'JSON_BLOCK_SIZE', 2)
+        monkeypatch.setattr(parquet_source, 'JSON_READ_SIZE', 7)
+        rows = [{'code': str(i), 'lang': 'pl', 'product_name': 'Mleko, "łaciate" [%d]' % i} for i in range(5)]
+        path = tmp_path / 'food.json'
+        path.write_text(json.dumps(rows, indent=2, ensure_ascii=False), encoding='utf-8')
+
+        source = FileRecordSource([str(path)])
+        iterator = iter(source)
+        first = [next(iterator) for _ in range(3)]
+        resumed = FileRecordSource([str(path)])
+        resumed.load_state_dict(source.state_dict())
+
+        assert first + list(resumed) == rows
+        assert list(iter_parquet_records([str(path)])) == rows
+
+    def test_json_single_record_and_unclosed_array(self, tmp_path):
+        """Test reading a JSON file holding one record and rejecting a truncated array."""
+        single = tmp_path / 'one.json'
+        single.write_text(json.dumps({'code': '1', 'lang': 'pl'}), encoding='utf-8')
+        truncated = tmp_path / 'truncated.json'
+        truncated.write_text('[{"code": "1", "lang": "pl"}, {"code": "2"', encoding='utf-8')
+
+        assert list(iter_parquet_records([str(single)])) == [{'code': '1', 'lang': 'pl'}]
+        with pytest.raises(ValueError):
+            list(iter_parquet_records([str(truncated)]))
+
+    @pytest.mark.parametrize('text', ['[,{"lang": "pl"}]', '[{"lang": "pl"},,{"lang": "pl"}]',
+                                      '[{"lang": "pl"} {"lang": "pl"}]', '[{"lang": "pl"},]'])
+    def test_json_array_separators_checked(self, tmp_path, monkeypatch, text):
+        """Test that missing, repeated and trailing commas between array items are rejected."""
+        monkeypatch.setattr(parquet_source, 'JSON_READ_SIZE', 4)
+        path = tmp_path / 'food.json'
+        path.write_text(text, encoding='utf-8')
+
+        with pytest.raises(ValueError):
+            list(iter_parquet_records([str(path)]))
+
+    def test_empty_json_array(self, tmp_path):
+        """Test that an empty JSON array gives no records."""
+        path = tmp_path / 'food.json'
+        path.write_text(' [ ] ', encoding='utf-8')
+
+        assert list(iter_parquet_records([str(path)])) == []
+
+    def test_list_local_files(self, tmp_path):
+        """Test listing supported files from a directory, a file and a glob pattern."""
+        (tmp_path / 'nested').mkdir()
+        for name in ['a.parquet', 'nested/b.arrow', 'c.jsonl', 'notes.txt']:
+            (tmp_path / name).write_text('')
+
+        assert [os.path.basename(path) for path in list_local_files(str(tmp_path))] == ['a.parquet', 'c.jsonl', 'b.arrow']
+        assert list_local_files(str(tmp_path / 'c.jsonl')) == [str(tmp_path / 'c.jsonl')]
+        assert list_local_files(str(tmp_path / '*.parquet')) == [str(tmp_path / 'a.parquet')]
+
+    def test_unsupported_format(self):
+        """Test that unsupported extensions are rejected."""
+        with pytest.raises(ValueError):
+            detect_file_format('food.csv')
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the PineconeProductStream and the embedding model registry in the pinecone_integration module.
+Uses a fake index and model so no Pinecone account or model download is required.
+"""
+
+import sys
+import threading
+import time
+import types
+
+import numpy as np
+import pytest
+
+import pinecone_integration
+from pinecone_integration import (PineconeProductStream, clear_embedding_models, close_pinecone, get_embedding_model,
+                                  get_pinecone_index)
+
+
+class FakeModel:
+    """Fake SentenceTransformer returning constant embeddings."""
+
+    def __init__(self):
+        self.calls = []
+
+    def encode(self, texts, show_progress_bar=False):
+        self.calls.append(list(texts))
+        return np.ones((len(texts), 4), dtype=np.float32)
+
+
+class FakeIndex:
+    """Fake Pinecone index recording upserts."""
+
+    def __init__(self, fail=False, fail_calls=()):
+        self.upserts = []
+        self.fail = fail
+        self.fail_calls = set(fail_calls)
+        self.calls = 0
+
+    def upsert(self, vectors):
+        self.calls += 1
+        if self.fail or self.calls in self.fail_calls:
+            raise RuntimeError("upsert failed")
+        self.upserts.append(vectors)
+
+
+def make_product(product_id):
+    """Build a minimal product document."""
+    return {
+        '_id': product_id,
+        'product_name': [{'lang': 'main', 'text': f'Product {product_id}'}],
+        'quantity': None,
+        'categories': ['Food'],
+        'labels': None,
+        'search_string': f'product {product_id}',
+    }
+
+
+class TestPineconeProductStream:
+    """Test class for PineconeProductStream."""
+
+    def test_products_are_uploaded_in_chunks(self):
+        """Test that each full chunk is embedded and upserted immediately."""
+        index, model = FakeIndex(), FakeModel()
+        stream = PineconeProductStream(chunk_size=3, upsert_batch_size=2, index=index, model=model)
+
+        for i in range(7):
+            stream.add(make_product(str(i)))
+
+        assert [len(texts) for texts in model.calls] == [3, 3]
+        assert [len(batch) for batch in index.upserts] == [2, 1, 2, 1]
+        assert stream.uploaded_count == 6
+
+        stream.close()
+        assert stream.uploaded_count == 7
+        assert index.upserts[-1][0]['id'] == '6'
+
+    def test_vector_metadata_has_no_null_values(self):
+        """Test that uploaded vectors carry Pinecone-compatible metadata."""
+        index = FakeIndex()
+        stream = PineconeProductStream(chunk_size=1, index=index, model=FakeModel())
+
+        stream.add(make_product('42'))
+
+        vector = index.upserts[0][0]
+        assert vector['values'] == [1.0, 1.0, 1.0, 1.0]
+        assert vector['metadata']['quantity'] == ''
+        assert vector['metadata']['labels'] == []
+        assert vector['metadata']['product_names'] == ['Product 42']
+
+    def test_invalid_ids_and_failures_are_counted(self):
+        """Test that empty IDs are skipped and failed uploads do not raise."""
+        stream = PineconeProductStream(chunk_size=2, index=FakeIndex(fail=True), model=FakeModel())
+
+        stream.add(make_product(''))
+        stream.add(make_product('1'))
+        stream.add(make_product('2'))
+
+        assert stream.skipped_count == 1
+        assert stream.failed_count == 2
+        assert stream.uploaded_count == 0
+
+    def test_failures_counted_per_upsert_batch(self):
+        """Test that a failed upsert batch only counts its own vectors as failed."""
+        index = FakeIndex(fail_calls=[2])
+        stream = PineconeProductStream(chunk_size=5, upsert_batch_size=2, index=index, model=FakeModel())
+
+        for i in range(5):
+            stream.add(make_product(str(i)))
+
+        assert [[vector['id'] for vector in batch] for batch in index.upserts] == [['0', '1'], ['4']]
+        assert stream.uploaded_count == 3
+        assert stream.failed_count == 2
+
+    def test_embedding_failure_fails_chunk(self):
+        """Test that a failed embedding counts the whole chunk as failed."""
+        model = FakeModel()
+        model.encode = lambda texts, show_progress_bar=False: 1 / 0
+        index = FakeIndex()
+        stream = PineconeProductStream(chunk_size=3, index=index, model=model)
+
+        for i in range(3):
+            stream.add(make_product(str(i)))
+
+        assert index.upserts == []
+        assert stream.failed_count == 3
+        assert stream.uploaded_count == 0
+
+
+class CountingModelClass:
+    """Stand-in for the SentenceTransformer class counting how often a model is loaded."""
+
+    loads = []
+
+    def __init__(self, model_name):
+        time.sleep(0.05)  # Let concurrent first calls overlap
+        CountingModelClass.loads.append(model_name)
+        self.model_name = model_name
+
+    def encode(self, texts, show_progress_bar=False):
+        return np.zeros((len(texts), 4), dtype=np.float32)
+
+
+class TestEmbeddingModelRegistry:
+    """Test class for the process-wide SentenceTransformer model cache."""
+
+    @pytest.fixture(autouse=True)
+    def counting_models(self, monkeypatch):
+        monkeypatch.setitem(sys.modules, 'sentence_transformers',
+                            types.SimpleNamespace(SentenceTransformer=CountingModelClass))
+        CountingModelClass.loads = []
+        clear_embedding_models()
+        yield
+        clear_embedding_models()
+
+    def test_model_loaded_once(self):
+        """Test that repeated calls share one model instance."""
+        model = get_embedding_model()
+
+        assert get_embedding_model() is model
+        assert CountingModelClass.loads == [pinecone_integration.EMBEDDING_MODEL_NAME]
+
+    def test_concurrent_first_calls_load_once(self):
+        """Test that threads asking for the model at the same time wait for one load."""
+        models = []
+        threads = [threading.Thread(target=lambda: models.append(get_embedding_model())) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(CountingModelClass.loads) == 1
+        assert all(model is models[0] for model in models)
+
+    def test_models_cached_per_name(self):
+        """Test that different model names are loaded separately."""
+        get_embedding_model('model-a')
+        get_embedding_model('model-b')
+        get_embedding_model('model-a')
+
+        assert CountingModelClass.loads == ['model-a', 'model-b']
+
+    def test_stream_uses_shared_model(self):
+        """Test that the ingest stream takes the shared model when none is passed."""
+        stream = PineconeProductStream(index=FakeIndex())
+
+        assert stream.model is get_embedding_model()
+        assert len(CountingModelClass.loads) == 1
+
+
+class FakePineconeClient:
+    """Stand-in for the Pinecone client class recording clients and index handles."""
+
+    clients = []
+
+    def __init__(self, api_key):
+        self.api_key = api_key
+        self.indexes = []
+        self.closed = False
+        FakePineconeClient.clients.append(self)
+
+    def Index(self, name):
+        index = FakeIndex()
+        index.name = name
+        index.closed = False
+        index.close = lambda: setattr(index, 'closed', True)
+        self.indexes.append(index)
+        return index
+
+    def close(self):
+        self.closed = True
+
+
+class TestPineconeIndexCache:
+    """Test class for the shared Pinecone client and index handles."""
+
+    @pytest.fixture(autouse=True)
+    def fake_pinecone(self, monkeypatch):
+        monkeypatch.setitem(sys.modules, 'pinecone', types.SimpleNamespace(Pinecone=FakePineconeClient))
+        monkeypatch.setenv('PINECONE_API_KEY', 'key')
+        monkeypatch.setenv('PINECONE_INDEX_NAME', 'products')
+        FakePineconeClient.clients = []
+        close_pinecone()
+        yield
+        close_pinecone()
+
+    def test_handle_reused(self, monkeypatch):
+        """Test that the client, index handle and configuration are created once."""
+        index = get_pinecone_index()
+        monkeypatch.setenv('PINECONE_INDEX_NAME', 'other')
+
+        assert get_pinecone_index() is index
+        assert index.name == 'products'
+        assert len(FakePineconeClient.clients) == 1
+
+    def test_handle_shared_by_threads(self):
+        """Test that concurrent first calls share one client and index handle."""
+        indexes = []
+        threads = [threading.Thread(target=lambda: indexes.append(get_pinecone_index())) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(FakePineconeClient.clients) == 1
+        assert all(index is indexes[0] for index in indexes)
+
+    def test_close(self):
+        """Test that close_pinecone() closes the handles and a later call connects again."""
+        index = get_pinecone_index()
+        client = FakePineconeClient.clients[0]
+
+        close_pinecone()
+
+        assert index.closed and client.closed
+        assert get_pinecone_index() is not index
+        assert len(FakePineconeClient.clients) == 2
+
+    def test_missing_configuration(self, monkeypatch):
+        """Test that a missing API key raises and is not cached."""
+        monkeypatch.delenv('PINECONE_API_KEY')
+
+        with pytest.raises(ValueError):
+            get_pinecone_index()
+        monkeypatch.setenv('PINECONE_API_KEY', 'key')
+        assert get_pinecone_index().name == 'products'
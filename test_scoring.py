@@ -12,7 +12,9 @@ from utils import (
     score_categories, 
     score_labels, 
     score_quantity, 
-    compute_rapidfuzz_score
+    compute_rapidfuzz_score,
+    prepare_scoring_fields,
+    score_prepared_fields
 )
 
 
@@ -273,6 +275,60 @@ class TestComputeRapidFuzzScore:
         assert score > 0  # Should still work with just product name
 
 
+
+class TestPreparedScoringFields:
+    """Test class for the scoring fields precomputed at ingest time."""
+    
+    DOCUMENT = {
+        "product_name": [
+            {"lang": "main", "text": "Nutella Hazelnut Spread"},
+            {"lang": "en", "text": "NUTELLA hazelnut spread"},
+            {"lang": "fr", "text": ""}
+        ],
+        "brands": "Ferrero",
+        "quantity": "350 G",
+        "categories": ["Spreads", " Sweet spreads ", "", "Hazelnut Spreads"],
+        "categories_tags": ["en:spreads", "EN:Sweet-spreads", ""],
+        "labels": "Gluten-free, Green Dot,"
+    }
+    
+    def test_prepare_scoring_fields(self):
+        """Test that the fields are deduplicated, split, cleaned and lowercased."""
+        assert prepare_scoring_fields(self.DOCUMENT) == {
+            "names": ["nutella hazelnut spread"],
+            "brands": "ferrero",
+            "quantity": "350 g",
+            "categories": ["spreads", "sweet spreads", "hazelnut spreads"],
+            "category_tags": ["spreads", "en:sweet spreads"],
+            "labels": ["gluten-free", "green dot"]
+        }
+        assert prepare_scoring_fields({}) == {
+            "names": [], "brands": "", "quantity": "", "categories": [], "category_tags": [], "labels": []
+        }
+    
+    @pytest.mark.parametrize("search_string", ["nutella", "FERRERO 350g", "hazelnut", "gluten", "sweet", "xyz"])
+    def test_prepared_score_matches_field_scores(self, search_string):
+        """Test that scoring the prepared fields gives the same score as scoring the raw fields."""
+        document = self.DOCUMENT
+        expected = (
+            score_product_names(search_string, extract_product_names(document["product_name"])) * 3.0
+            + score_brands(search_string, document["brands"]) * 2.0
+            + score_categories(search_string, document["categories"], document["categories_tags"]) * 1.5
+            + score_labels(search_string, document["labels"]) * 1.0
+            + score_quantity(search_string, document["quantity"]) * 0.5
+        )
+        
+        assert score_prepared_fields(search_string, prepare_scoring_fields(document)) == pytest.approx(expected)
+        assert compute_rapidfuzz_score(search_string, document) == pytest.approx(expected)
+    
+    def test_stored_scoring_fields_are_used(self):
+        """Test that compute_rapidfuzz_score scores the stored fields instead of the raw ones."""
+        document = {"product_name": [{"lang": "en", "text": "Something else"}],
+                    "scoring": prepare_scoring_fields(self.DOCUMENT)}
+        
+        assert compute_rapidfuzz_score("nutella", document) == compute_rapidfuzz_score("nutella", self.DOCUMENT)
+
+
 if __name__ == "__main__":
     # Allow running tests directly
     pytest.main([__file__])
\ No newline at end of file
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the search_cache module.
+Covers the result cache tiers, catalog generations and the query embedding cache.
+"""
+
+import numpy as np
+import pytest
+
+import pinecone_integration
+import search_cache
+import search_products
+from search_cache import (EmbeddingCache, LRUCache, QueryResultCache, read_catalog_generation,
+                          record_catalog_generation)
+from search_products import SearchSession
+from test_pinecone_stream import FakeModel
+from test_search_session import FakeClient, make_collection
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controllable replacement of time.monotonic() and time.time() in search_cache."""
+    now = [1000.0]
+    monkeypatch.setattr(search_cache.time, 'monotonic', lambda: now[0])
+    monkeypatch.setattr(search_cache.time, 'time', lambda: now[0])
+    return now
+
+
+class TestLRUCache:
+    """Test class for LRUCache."""
+
+    def test_evicts_least_recently_used(self):
+        """Test that the least recently used entry is evicted first."""
+        cache = LRUCache(2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.get('a')
+        cache.put('c', 3)
+
+        assert (cache.get('a'), cache.get('b'), cache.get('c')) == (1, None, 3)
+
+    def test_entries_expire(self, clock):
+        """Test that entries older than the TTL are dropped."""
+        cache = LRUCache(10, ttl_seconds=60)
+        cache.put('a', 1)
+
+        clock[0] += 59
+        assert cache.get('a') == 1
+        clock[0] += 2
+        assert cache.get('a') is None
+        assert len(cache) == 0
+
+
+class TestQueryResultCache:
+    """Test class for QueryResultCache."""
+
+    def test_returns_copies(self):
+        """Test that callers can modify cached results without changing the cache."""
+        cache = QueryResultCache()
+        key = cache.make_key('mongo', 'kawa', {'limit': 50})
+        cache.put(key, [{'_id': '1'}])
+
+        cache.get(key)[0]['rapidfuzz_score'] = 10.0
+
+        assert cache.get(key) == [{'_id': '1'}]
+        assert cache.stats()['hits'] == 2
+
+    def test_key_depends_on_backend_and_params(self):
+        """Test that backends and parameters do not share entries."""
+        cache = QueryResultCache()
+
+        keys = {cache.make_key('mongo', 'kawa', {'limit': 50}), cache.make_key('pinecone', 'kawa', {'limit': 50}),
+                cache.make_key('mongo', 'kawa', {'limit': 10}), cache.make_key('mongo', 'herbata', {'limit': 50})}
+
+        assert len(keys) == 4
+
+    def test_disk_tier_shared_between_caches(self, tmp_path):
+        """Test that results on disk survive a restart and are not returned after their TTL."""
+        first = QueryResultCache(directory=str(tmp_path), ttl_seconds=60)
+        key = first.make_key('mongo', 'kawa')
+        first.put(key, [{'_id': '1'}])
+
+        second = QueryResultCache(max_entries=0, directory=str(tmp_path), ttl_seconds=60)
+        assert second.get(key) == [{'_id': '1'}]
+
+        expired = QueryResultCache(directory=str(tmp_path), ttl_seconds=1e-9)
+        assert expired.get(key) is None
+
+    def test_generation_change_drops_results(self, tmp_path):
+        """Test that switching the catalog generation drops the results of the older one."""
+        cache = QueryResultCache(directory=str(tmp_path))
+        cache.set_generation('g1')
+        key = cache.make_key('mongo', 'kawa')
+        cache.put(key, [{'_id': '1'}])
+
+        assert not cache.set_generation('g1')
+        assert cache.set_generation('g2')
+        assert cache.get(key) is None
+        assert cache.make_key('mongo', 'kawa') != key
+        assert QueryResultCache(directory=str(tmp_path)).get(key) is None
+
+    def test_from_environment(self, monkeypatch, tmp_path):
+        """Test the cache configuration from the environment."""
+        monkeypatch.setenv('SEARCH_CACHE_SIZE', '0')
+        assert QueryResultCache.from_environment() is None
+
+        monkeypatch.setenv('SEARCH_CACHE_DISK', 'true')
+        monkeypatch.setenv('SEARCH_CACHE_DIR', str(tmp_path))
+        cache = QueryResultCache.from_environment()
+        assert cache.disk is not None and cache.memory.max_entries == 0
+
+
+class TestCatalogGeneration:
+    """Test class for the catalog generations recorded by the ingest."""
+
+    def test_record_and_read(self):
+        """Test that every ingest records a new generation."""
+        collection = make_collection()
+        FakeClient(collection)
+
+        assert read_catalog_generation(collection) is None
+        first = record_catalog_generation(collection)
+        assert read_catalog_generation(collection) == first
+        assert record_catalog_generation(collection) != first
+
+
+class TestSessionCache:
+    """Test class for the result cache of the search session."""
+
+    @pytest.fixture(autouse=True)
+    def counting_pinecone(self, monkeypatch):
+        calls = []
+
+        def query_pinecone(search_string, top_k=10):
+            calls.append(search_string)
+            return [{'id': '1', 'score': 0.9, 'given_name': 'Kawa', 'text': 'kawa', 'metadata': {}}]
+
+        monkeypatch.setattr(search_products, 'query_pinecone', query_pinecone)
+        return calls
+
+    def test_repeated_queries_use_cache(self, counting_pinecone):
+        """Test that queries with the same formatted string run the backends once."""
+        collection = make_collection()
+        with SearchSession(client=FakeClient(collection), cache=QueryResultCache()) as session:
+            first = session.search('Kawa Miel.')
+            second = session.search('kawa miel.')
+
+        assert collection.find_count == 1
+        assert counting_pinecone == ['Kawa Miel.']
+        assert second['input_string'] == 'kawa miel.'
+        assert second['rapidfuzz_search']['results'] == first['rapidfuzz_search']['results']
+        assert second['pinecone_search'] == first['pinecone_search']
+
+    def test_errors_are_not_cached(self, monkeypatch):
+        """Test that a failed backend query is retried by the next search."""
+        collection = make_collection()
+        monkeypatch.setattr(search_products, 'query_pinecone',
+                            lambda search_string, top_k=10: (_ for _ in ()).throw(RuntimeError('down')))
+
+        with SearchSession(client=FakeClient(collection), cache=QueryResultCache()) as session:
+            results = session.search('kawa')
+            assert results['pinecone_search']['count'] == 0
+            key = session.cache.make_key('pinecone', 'kawa', {'top_k': search_products.PINECONE_TOP_K})
+            assert session.cache.get(key) is None
+
+    def test_new_generation_invalidates(self):
+        """Test that an ingest recording a new generation invalidates cached results."""
+        collection = make_collection()
+        client = FakeClient(collection)
+        with SearchSession(client=client, cache=QueryResultCache(), generation_check_interval=0) as session:
+            session.search('kawa')
+            session.search('kawa')
+            record_catalog_generation(collection)
+            session.search('kawa')
+
+        assert collection.find_count == 2
+
+
+class TestEmbeddingCache:
+    """Test class for the query embedding cache."""
+
+    def test_float32_round_trip(self, tmp_path):
+        """Test that embeddings are stored compactly on disk and read back as float32."""
+        path = str(tmp_path / 'embeddings.sqlite')
+        EmbeddingCache('model@1', path).put('kawa', [0.5, 0.25, 1.0])
+
+        vector = EmbeddingCache('model@1', path).get('kawa')
+
+        assert vector.dtype == np.float32
+        assert vector.tolist() == [0.5, 0.25, 1.0]
+
+    def test_model_change_invalidates(self, tmp_path):
+        """Test that embeddings of another model name or version are not returned."""
+        path = str(tmp_path / 'embeddings.sqlite')
+        EmbeddingCache('model@1', path).put('kawa', [1.0])
+
+        assert EmbeddingCache('model@2', path).get('kawa') is None
+        assert EmbeddingCache('model@1', path).get('kawa') is None
+
+    def test_embed_query_skips_inference(self, monkeypatch, tmp_path):
+        """Test that repeated queries are embedded once, also after a restart."""
+        model = FakeModel()
+        monkeypatch.setattr(pinecone_integration, 'get_embedding_model', lambda: model)
+        monkeypatch.setenv('SEARCH_CACHE_DIR', str(tmp_path))
+        monkeypatch.setattr(pinecone_integration, '_query_embedding_cache', None)
+
+        first = pinecone_integration.embed_query('kawa miel')
+        second = pinecone_integration.embed_query('kawa miel')
+        monkeypatch.setattr(pinecone_integration, '_query_embedding_cache', None)
+        third = pinecone_integration.embed_query('kawa miel')
+
+        assert first == second == third == [1.0] * 4
+        assert model.calls == [['kawa miel']]
+
+    def test_embed_query_without_cache(self, monkeypatch):
+        """Test that the cache can be disabled."""
+        model = FakeModel()
+        monkeypatch.setattr(pinecone_integration, 'get_embedding_model', lambda: model)
+        monkeypatch.setenv('QUERY_EMBEDDING_CACHE', 'false')
+
+        pinecone_integration.embed_query('kawa')
+        pinecone_integration.embed_query('kawa')
+
+        assert len(model.calls) == 2
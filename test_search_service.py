@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the search_service module.
+Starts the HTTP service on a free port with a fake MongoDB client and queries it concurrently.
+"""
+
+import http.client
+import json
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+import pytest
+
+import search_products
+from search_cache import QueryResultCache
+from search_products import SearchSession
+from search_service import MAX_BODY_BYTES, create_server
+from test_search_session import FakeClient, make_collection
+
+
+@pytest.fixture(autouse=True)
+def no_pinecone(monkeypatch):
+    """Keep the searches offline."""
+    monkeypatch.setattr(search_products, 'query_pinecone', lambda search_string, top_k=10: [])
+
+
+@pytest.fixture
+def service():
+    """Running service and the fake client of its session."""
+    client = FakeClient(make_collection())
+    session = SearchSession(client=client, cache=QueryResultCache())
+    session.warm_up()
+    server = create_server(session, port=0, log_requests=False)
+    thread = threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_address[1]}', client
+    server.shutdown()
+    server.server_close()
+    session.close()
+
+
+def post_with_length(url, length):
+    """Send a POST /search request with an arbitrary Content-Length header and no body."""
+    host, port = url.rsplit('/', 1)[-1].split(':')
+    connection = http.client.HTTPConnection(host, int(port), timeout=10)
+    try:
+        connection.putrequest('POST', '/search')
+        connection.putheader('Content-Length', length)
+        connection.endheaders()
+        response = connection.getresponse()
+        return response.status, json.loads(response.read())
+    finally:
+        connection.close()
+
+
+def request_json(url, body=None):
+    """Send a GET (or POST with a JSON body) request and return the status and decoded response."""
+    data = json.dumps(body).encode('utf-8') if body is not None else None
+    request = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+class TestSearchService:
+    """Test class for the HTTP search service."""
+
+    def test_get_search(self, service):
+        """Test that GET /search returns the search_products() result structure."""
+        url, _ = service
+
+        status, results = request_json(f'{url}/search?q={quote("Herbata")}')
+
+        assert status == 200
+        assert results['input_string'] == 'Herbata'
+        assert results['formatted_string'] == 'herbata'
+        assert set(results) >= {'direct_search', 'rapidfuzz_search', 'pinecone_search'}
+        assert results['rapidfuzz_search']['results'][0]['_id'] == '2'
+
+    def test_post_search(self, service):
+        """Test that POST /search takes the query from a JSON body."""
+        url, _ = service
+
+        status, results = request_json(f'{url}/search', {'query': 'Kawa mielona'})
+
+        assert status == 200
+        assert results['rapidfuzz_search']['results'][0]['_id'] == '1'
+
+    def test_concurrent_requests_share_connection(self, service):
+        """Test that concurrent requests are answered over the warm connection."""
+        url, client = service
+        queries = ['kawa', 'herbata'] * 10
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            responses = list(executor.map(lambda q: request_json(f'{url}/search?q={q}'), queries))
+
+        assert [status for status, _ in responses] == [200] * len(queries)
+        assert [results['input_string'] for _, results in responses] == queries
+        assert client.ping_count == 1
+        status, health = request_json(f'{url}/health')
+        assert (status, health['status'], health['queries']) == (200, 'ok', len(queries))
+        assert health['cache']['hits'] + health['cache']['misses'] == 2 * len(queries)
+
+    @pytest.mark.parametrize("path, body, status", [
+        ('/search?q=', None, 400),
+        ('/search', {'query': '  '}, 400),
+        ('/search', ['kawa'], 400),
+        ('/other', None, 404),
+    ])
+    def test_invalid_requests(self, service, path, body, status):
+        """Test that empty queries and unknown paths are rejected."""
+        url, _ = service
+
+        response_status, results = request_json(f'{url}{path}', body)
+
+        assert response_status == status
+        assert 'error' in results
+
+    @pytest.mark.parametrize("length, status", [
+        ('abc', 400),
+        ('-1', 400),
+        (str(MAX_BODY_BYTES + 1), 413),
+    ])
+    def test_invalid_content_length(self, service, length, status):
+        """Test that malformed, negative and too large body lengths are answered without reading the body."""
+        url, _ = service
+
+        response_status, results = post_with_length(url, length)
+
+        assert response_status == status
+        assert 'error' in results
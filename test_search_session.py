@@ -0,0 +1,422 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the SearchSession in the search_products module.
+Uses an in-memory fake MongoClient to check that one connection serves many searches.
+"""
+
+import threading
+import time
+
+import pytest
+
+import search_batch
+import search_products
+from catalog_indexes import reset_bootstrap_cache
+from download_products import build_product
+from search_cache import METADATA_COLLECTION
+from search_products import SEARCH_FIELDS, SearchSession, build_search_projection, parse_search_fields
+from test_ingest_pipeline import make_record
+
+
+class FakeCursor:
+    """Cursor supporting the sort/limit chain of the text search."""
+
+    def __init__(self, documents):
+        self.documents = documents
+
+    def sort(self, *args, **kwargs):
+        return self
+
+    def limit(self, count):
+        return self.documents[:count]
+
+
+class FakeSearchCollection:
+    """Collection returning the same text search results for every query."""
+
+    def __init__(self, documents, name='products-catalog'):
+        self.documents = documents
+        self.name = name
+        self.full_name = f'test.{name}'
+        self.find_count = 0
+        self.projections = []
+        self.queries = []
+        self.indexes = {'_id_': {'key': [('_id', 1)]}}
+        self.created_indexes = []
+
+    def index_information(self):
+        return dict(self.indexes)
+
+    def create_index(self, keys, name=None, **kwargs):
+        self.created_indexes.append(name)
+        self.indexes[name] = {'key': [('_fts', 'text'), ('_ftsx', 1)],
+                              'weights': {field: 1 for field, _ in keys}}
+        return name
+
+    def find(self, query, projection=None):
+        self.find_count += 1
+        self.projections.append(projection)
+        self.queries.append(query)
+        fields = [field for field, value in (projection or {}).items() if value == 1]
+        documents = self.documents
+        if fields:
+            documents = [{key: value for key, value in document.items() if key in fields or key == '_id'}
+                         for document in documents]
+        return FakeCursor([dict(document, score=1.0) for document in documents])
+
+
+class FakeAdmin:
+    def __init__(self, client):
+        self.client = client
+
+    def command(self, name):
+        self.client.ping_count += 1
+        if self.client.fail_ping:
+            from pymongo.errors import ConnectionFailure
+            raise ConnectionFailure('unreachable')
+        return {'ok': 1}
+
+
+class FakeMetadataCollection:
+    """Collection of catalog metadata documents."""
+
+    def __init__(self):
+        self.documents = {}
+
+    def find_one(self, query):
+        return self.documents.get(query['_id'])
+
+    def update_one(self, query, update, upsert=False):
+        self.documents.setdefault(query['_id'], {'_id': query['_id']}).update(update['$set'])
+
+
+class FakeDatabase:
+    """Database holding one products collection and the catalog metadata collection."""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.metadata = FakeMetadataCollection()
+        collection.database = self
+
+    def __getitem__(self, name):
+        return self.metadata if name == METADATA_COLLECTION else self.collection
+
+
+class FakeClient:
+    """MongoClient stand-in counting pings and close calls."""
+
+    def __init__(self, collection, fail_ping=False):
+        self.collection = collection
+        self.fail_ping = fail_ping
+        self.ping_count = 0
+        self.closed = False
+        self.admin = FakeAdmin(self)
+        self.database = FakeDatabase(collection)
+
+    def get_database(self):
+        return self.database
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture(autouse=True)
+def no_pinecone(monkeypatch):
+    """Keep the searches offline."""
+    monkeypatch.setattr(search_products, 'query_pinecone', lambda search_string, top_k=10: [])
+
+
+@pytest.fixture(autouse=True)
+def fresh_index_cache():
+    """Verify the indexes of the fake collections in every test."""
+    reset_bootstrap_cache()
+    yield
+    reset_bootstrap_cache()
+
+
+def make_collection():
+    products = [build_product(make_record('1', names=('Kawa mielona',))),
+                build_product(make_record('2', names=('Herbata',)))]
+    return FakeSearchCollection(products)
+
+
+class TestSearchSession:
+    """Test class for SearchSession."""
+
+    def test_connects_once_for_many_searches(self):
+        """Test that the client is pinged once and reused by every search."""
+        collection = make_collection()
+        client = FakeClient(collection)
+
+        with SearchSession(client=client) as session:
+            results = [session.search(query) for query in ('kawa', 'herbata', 'kawa mielona')]
+
+        assert client.ping_count == 1
+        assert collection.find_count == 3
+        assert session.query_count == 3
+        assert client.closed
+        assert results[1]['rapidfuzz_search']['results'][0]['_id'] == '2'
+        assert results[0]['direct_search']['results'][0]['given_name'] == 'Spreads'
+
+    def test_indexes_bootstrapped_once(self):
+        """Test that the text index is created when connecting, not per query or per session."""
+        collection = make_collection()
+
+        for _ in range(2):
+            with SearchSession(client=FakeClient(collection)) as session:
+                session.search('kawa')
+                session.search('herbata')
+
+        assert collection.created_indexes == ['search_string_text']
+
+    def test_search_products_reuses_session(self):
+        """Test that search_products() does not close a session passed by the caller."""
+        client = FakeClient(make_collection())
+        session = SearchSession(client=client)
+
+        search_products.search_products('kawa', session=session)
+        search_products.search_products('herbata', session=session)
+
+        assert client.ping_count == 1
+        assert not client.closed
+
+    def test_connection_failure_is_reported(self):
+        """Test that a failed ping returns an error and closes the client."""
+        client = FakeClient(make_collection(), fail_ping=True)
+        session = SearchSession(client=client)
+
+        results = session.search('kawa')
+
+        assert results['error'].startswith('MongoDB connection failed')
+        assert client.closed
+        assert session.client is None
+
+    def test_missing_uri(self, monkeypatch):
+        """Test that a session without MONGO_URI reports it instead of raising."""
+        monkeypatch.delenv('MONGO_URI', raising=False)
+
+        assert SearchSession().search('kawa') == {'error': 'MONGO_URI not set'}
+
+    def test_pool_size_from_environment(self, monkeypatch):
+        """Test that the connection pool size can be configured."""
+        monkeypatch.setenv('MONGO_MAX_POOL_SIZE', '8')
+
+        assert SearchSession().max_pool_size == 8
+        assert SearchSession(max_pool_size=4).max_pool_size == 4
+
+
+class TestSearchProjection:
+    """Test class for the field projection of the text search."""
+
+    def test_default_projection(self):
+        """Test that the search returns only the fields used for scoring, given_name and output."""
+        collection = make_collection()
+
+        with SearchSession(client=FakeClient(collection), extra_fields=[]) as session:
+            results = session.search('kawa')
+
+        assert collection.projections[0] == build_search_projection()
+        document = results['rapidfuzz_search']['results'][0]
+        assert set(document) == {'_id', 'score', 'rapidfuzz_score'} | set(SEARCH_FIELDS)
+        assert 'popularity_tags' not in document
+
+    def test_projected_scores_match_full_documents(self):
+        """Test that the projected fields give the same RapidFuzz scores as full documents."""
+        scores = []
+        for extra_fields in ([], ['*']):
+            with SearchSession(client=FakeClient(make_collection()), extra_fields=extra_fields) as session:
+                results = session.search('kawa mielona')
+            scores.append([(result['_id'], result['rapidfuzz_score'])
+                           for result in results['rapidfuzz_search']['results']])
+
+        assert scores[0] == scores[1]
+
+    def test_extra_fields(self, monkeypatch):
+        """Test that callers can request more fields or full documents."""
+        monkeypatch.setenv('SEARCH_EXTRA_FIELDS', 'nutriscore_grade, labels_tags')
+
+        assert SearchSession().projection['nutriscore_grade'] == 1
+        assert build_search_projection(['*']) == {'score': {'$meta': 'textScore'}}
+        assert parse_search_fields(' a,,b ') == ['a', 'b']
+
+
+class SlowSearchCollection(FakeSearchCollection):
+    """Collection whose text search takes a fixed time."""
+
+    def __init__(self, documents, delay):
+        super().__init__(documents)
+        self.delay = delay
+
+    def find(self, query, projection=None):
+        time.sleep(self.delay)
+        return super().find(query, projection)
+
+
+class TestConcurrentBackends:
+    """Test class for the concurrent backend queries of a search."""
+
+    def test_backends_run_concurrently(self, monkeypatch):
+        """Test that a search takes about as long as the slowest backend, not their sum."""
+        collection = SlowSearchCollection(make_collection().documents, delay=0.3)
+
+        def slow_pinecone(search_string, top_k=10):
+            time.sleep(0.3)
+            return [{'id': '1', 'score': 0.9}]
+
+        monkeypatch.setattr(search_products, 'query_pinecone', slow_pinecone)
+        with SearchSession(client=FakeClient(collection)) as session:
+            session.connect()
+            started_at = time.monotonic()
+            results = session.search('kawa')
+            elapsed = time.monotonic() - started_at
+
+        assert elapsed < 0.55
+        assert results['direct_search']['count'] == 2
+        assert results['pinecone_search']['count'] == 1
+        assert results['timed_out'] == []
+
+    def test_slow_pinecone_times_out(self, monkeypatch):
+        """Test that a Pinecone search over its timeout does not hold back the MongoDB results."""
+        release = threading.Event()
+
+        def stuck_pinecone(search_string, top_k=10):
+            release.wait(5)
+            return [{'id': '1', 'score': 0.9}]
+
+        monkeypatch.setattr(search_products, 'query_pinecone', stuck_pinecone)
+        try:
+            with SearchSession(client=FakeClient(make_collection()), pinecone_timeout=0.1) as session:
+                started_at = time.monotonic()
+                results = session.search('kawa')
+                elapsed = time.monotonic() - started_at
+        finally:
+            release.set()
+
+        assert elapsed < 1.0
+        assert results['timed_out'] == ['pinecone']
+        assert results['pinecone_search'] == {'count': 0, 'results': []}
+        assert results['rapidfuzz_search']['results'][0]['_id'] == '1'
+
+    def test_slow_mongo_times_out(self):
+        """Test that a text search over its timeout is reported without results."""
+        collection = SlowSearchCollection(make_collection().documents, delay=0.5)
+
+        with SearchSession(client=FakeClient(collection), mongo_timeout=0.1) as session:
+            results = session.search('kawa')
+
+        assert results['timed_out'] == ['mongo']
+        assert results['direct_search']['count'] == 0
+        assert results['rapidfuzz_search']['count'] == 0
+
+    def test_timeouts_from_environment(self, monkeypatch):
+        """Test that the timeouts and pool size can be configured, 0 disabling a timeout."""
+        monkeypatch.setenv('SEARCH_MONGO_TIMEOUT', '0')
+        monkeypatch.setenv('SEARCH_PINECONE_TIMEOUT', '2.5')
+        monkeypatch.setenv('SEARCH_BACKEND_WORKERS', '4')
+
+        session = SearchSession()
+
+        assert session.timeouts == {'text': 0.0, 'vector': 2.5}
+        assert session.backend_workers == 4
+
+
+def make_pool_collection(match_position, size=300):
+    """Collection whose text search ranks the 'Kawa mielona' product at match_position."""
+    products = [build_product(make_record(str(i), names=(f'Herbata {i}',))) for i in range(size)]
+    products.insert(match_position, build_product(make_record('match', names=('Kawa mielona',))))
+    return FakeSearchCollection(products)
+
+
+class TestAdaptiveCandidates:
+    """Test class for the adaptive candidate pool of the RapidFuzz reranking."""
+
+    def test_confident_query_scores_few_candidates(self):
+        """Test that a good match among the first candidates ends the search after one round."""
+        with SearchSession(client=FakeClient(make_pool_collection(3)), adaptive_candidates=True) as session:
+            results = session.search('Kawa mielona')
+
+        assert results['rapidfuzz_search']['rounds'] == 1
+        assert results['rapidfuzz_search']['count'] == 10
+        assert results['rapidfuzz_search']['results'][0]['_id'] == 'match'
+
+    def test_hard_query_widens_pool(self, monkeypatch):
+        """Test that the pool grows until the good match is found, scoring every candidate once."""
+        scored = []
+        compute = search_products.compute_rapidfuzz_score
+
+        def counting_score(search_string, result):
+            scored.append(result['_id'])
+            return compute(search_string, result)
+
+        monkeypatch.setattr(search_products, 'compute_rapidfuzz_score', counting_score)
+        collection = make_pool_collection(120)
+
+        with SearchSession(client=FakeClient(collection), adaptive_candidates=True) as session:
+            results = session.search('Kawa mielona')
+
+        assert results['rapidfuzz_search']['rounds'] == 3
+        assert results['direct_search']['count'] == 160
+        assert results['rapidfuzz_search']['results'][0]['_id'] == 'match'
+        assert collection.find_count == 3
+        assert sorted(scored) == sorted({document['_id'] for document in collection.documents[:160]})
+
+    def test_pool_limited_to_max_candidates(self):
+        """Test that the pool does not grow past max_candidates."""
+        with SearchSession(client=FakeClient(make_pool_collection(120)), adaptive_candidates=True,
+                           max_candidates=50) as session:
+            results = session.search('Kawa mielona')
+
+        assert results['rapidfuzz_search']['rounds'] == 3
+        assert results['rapidfuzz_search']['count'] == 50
+        assert results['rapidfuzz_search']['results'][0]['_id'] != 'match'
+
+    def test_exhausted_candidates_end_search(self):
+        """Test that a text search returning fewer candidates than asked is not repeated."""
+        collection = make_collection()
+
+        with SearchSession(client=FakeClient(collection), adaptive_candidates=True) as session:
+            results = session.search('czekolada')
+
+        assert results['rapidfuzz_search']['rounds'] == 1
+        assert collection.find_count == 1
+
+    def test_fixed_pool_by_default(self):
+        """Test that without the adaptive mode the top SEARCH_LIMIT candidates are reranked."""
+        with SearchSession(client=FakeClient(make_pool_collection(120))) as session:
+            results = session.search('Kawa mielona')
+
+        assert results['rapidfuzz_search']['rounds'] == 1
+        assert results['rapidfuzz_search']['count'] == search_products.SEARCH_LIMIT
+
+    def test_configuration_from_environment(self, monkeypatch):
+        """Test that the mode and limits can be configured and invalid limits are rejected."""
+        monkeypatch.setenv('SEARCH_ADAPTIVE_CANDIDATES', 'yes')
+        monkeypatch.setenv('SEARCH_MIN_CANDIDATES', '5')
+        monkeypatch.setenv('SEARCH_MAX_CANDIDATES', '80')
+        monkeypatch.setenv('SEARCH_CONFIDENCE_THRESHOLD', '250')
+
+        session = SearchSession()
+
+        assert session.adaptive_candidates
+        assert (session.min_candidates, session.max_candidates, session.confidence_threshold) == (5, 80, 250.0)
+        with pytest.raises(ValueError):
+            SearchSession(min_candidates=100)
+
+
+class TestBatchSearch:
+    """Test class for the batch search over one session."""
+
+    def test_batch_uses_one_connection(self, tmp_path):
+        """Test that every line of the batch file is searched over the same connection."""
+        batch_file = tmp_path / 'batch.txt'
+        batch_file.write_text('kawa\nherbata\nkawa mielona\n', encoding='utf-8')
+        collection = make_collection()
+        client = FakeClient(collection)
+        session = SearchSession(client=client)
+
+        output_file = search_batch.search_batch_products(str(batch_file), str(tmp_path / 'out.csv'), session=session)
+
+        assert output_file == str(tmp_path / 'out.csv')
+        assert client.ping_count == 1
+        assert collection.find_count == 3
+        assert not client.closed
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the sharded multi-process ingest in the download_products module.
+Ingests small local parquet files and compares the results with a single sequential pipeline.
+"""
+
+import os
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from download_products import (
+    IngestPipeline,
+    ingest_shards,
+    merge_aggregate_files,
+    merge_shard_results,
+    save_shard_aggregates,
+    select_shard_files,
+)
+from parquet_source import FileRecordSource
+from test_ingest_pipeline import RecordingSink
+
+NAME_TYPE = pa.list_(pa.struct([('lang', pa.string()), ('text', pa.string())]))
+
+
+@pytest.fixture
+def dataset_files(tmp_path):
+    """Three parquet files whose last categories overlap, so merge order matters."""
+    paths = []
+    for file_index in range(3):
+        table = pa.table({
+            'code': [f'{file_index}-{i}' for i in range(30)],
+            'lang': ['pl'] * 30,
+            'product_name': pa.array([[{'lang': 'main', 'text': f'Produkt {i}'}] for i in range(30)], type=NAME_TYPE),
+            'categories': [f'Food,Group {(i + file_index) % 4},Leaf {i % 3}' for i in range(30)],
+        })
+        path = tmp_path / f'food-{file_index}.parquet'
+        pq.write_table(table, path, row_group_size=7)
+        paths.append(str(path))
+    return paths
+
+
+def make_options(snapshot_dir=None):
+    """Ingest options without MongoDB and Pinecone."""
+    return {
+        'languages': ['pl'],
+        'save_to_mongo': False,
+        'save_to_pinecone': False,
+        'incremental': False,
+        'writer_count': 2,
+        'snapshot_dir': snapshot_dir,
+        'pipeline': {'transform_workers': 2, 'chunk_size': 5, 'batch_size': 4},
+        'progress': {'log_level': 'quiet'},
+    }
+
+
+def sequential_aggregates(paths):
+    """Aggregates of a single pipeline reading all files in order."""
+    pipeline = IngestPipeline([RecordingSink()], transform_workers=1)
+    return pipeline.run(FileRecordSource(paths, languages=['pl']))
+
+
+def assert_same_aggregates(actual, expected):
+    actual = actual.for_language('pl')
+    assert actual.unique_categories == expected.unique_categories
+    assert actual.unique_last_categories == expected.unique_last_categories
+    assert actual.unique_food_groups == expected.unique_food_groups
+    assert actual.langs_map == expected.langs_map
+    assert actual.skipped_count == expected.skipped_count
+
+
+class TestShardedIngest:
+    """Test class for sharded ingest."""
+
+    def test_select_shard_files(self):
+        """Test the round-robin assignment of files to shards."""
+        files = ['a', 'b', 'c', 'd', 'e']
+
+        assert select_shard_files(files, 0, 2) == [(0, 'a'), (2, 'c'), (4, 'e')]
+        assert select_shard_files(files, 1, 2) == [(1, 'b'), (3, 'd')]
+        assert select_shard_files(files, 0, 1) == list(enumerate(files))
+
+    @pytest.mark.parametrize("processes", [1, 2])
+    def test_shards_match_sequential_ingest(self, dataset_files, tmp_path, processes):
+        """Test that merged shard results equal a sequential run, whatever the process count."""
+        snapshot_dir = str(tmp_path / 'snapshot')
+        results = ingest_shards(list(enumerate(dataset_files)), make_options(snapshot_dir), processes=processes)
+
+        assert [result['file_index'] for result in results] == [0, 1, 2]
+        assert sum(result['read_count'] for result in results) == 90
+        assert_same_aggregates(merge_shard_results(results), sequential_aggregates(dataset_files))
+        assert sorted(os.listdir(snapshot_dir)) == [f'shard-0000{i}-000000000000.parquet' for i in range(3)]
+
+    def test_merge_order_does_not_matter(self, dataset_files):
+        """Test that shard results merge to the same aggregates in any order."""
+        results = ingest_shards(list(enumerate(dataset_files)), make_options())
+
+        assert_same_aggregates(merge_shard_results(results[::-1]), merge_shard_results(results).for_language('pl'))
+
+    def test_resume_skips_completed_files(self, dataset_files):
+        """Test that completed files from a checkpoint are not ingested again."""
+        completed = ingest_shards([(0, dataset_files[0])], make_options())
+        finished = []
+
+        results = ingest_shards(list(enumerate(dataset_files)), make_options(), completed=completed,
+                                on_shard_done=lambda done: finished.append(len(done)))
+
+        assert finished == [2, 3]
+        assert results[0] is completed[0]
+        assert_same_aggregates(merge_shard_results(results), sequential_aggregates(dataset_files))
+
+    def test_multi_machine_aggregates_merge(self, dataset_files, tmp_path, monkeypatch):
+        """Test that aggregates saved by separate machines merge to the sequential result."""
+        monkeypatch.chdir(tmp_path)
+        filenames = []
+        for shard_index in range(2):
+            tasks = select_shard_files(dataset_files, shard_index, 2)
+            aggregates = merge_shard_results(ingest_shards(tasks, make_options()))
+            filenames.append(save_shard_aggregates(aggregates, shard_index, 2))
+
+        merged = merge_aggregate_files(filenames[::-1])
+
+        assert_same_aggregates(merged, sequential_aggregates(dataset_files))
@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the text_index module.
+Builds small BM25 indexes in a temporary directory and checks the scores against a
+direct computation of the BM25 formula.
+"""
+
+import math
+import os
+import time
+from collections import Counter
+
+import pytest
+
+import search_products
+from catalog_snapshot import CatalogSnapshotWriter
+from download_products import build_product
+from search_products import SEARCH_FIELDS, SearchSession, build_search_projection, search_products_direct
+from test_ingest_pipeline import make_record
+from test_search_session import FakeClient, make_collection
+from text_index import (BM25Index, PrefixVocabulary, build_text_index, iter_snapshot_documents, open_arrow,
+                        tokenize)
+
+NAMES = [('Kawa mielona',), ('Kawa ziarnista', 'Kawa'), ('Herbata czarna',), ('Herbata zielona', 'Kawa zielona'),
+         ('Mleko',)]
+RECEIPT_NAMES = [('Kawa zbożowa',), ('Kawa zbożowa rozpuszczalna',), ('Zbożowe płatki',), ('Jaja ściółkowe',),
+                 ('Kawałki ananasa',)]
+
+
+def make_products():
+    return [build_product(make_record(str(i), names=names)) for i, names in enumerate(NAMES, 1)]
+
+
+def make_receipt_products():
+    return [build_product(make_record(str(i), names=names)) for i, names in enumerate(RECEIPT_NAMES, 1)]
+
+
+def bm25_scores(products, query, k1=1.2, b=0.75):
+    """Score the products with the BM25 formula, term by term."""
+    documents = [tokenize(product['search_string']) for product in products]
+    average_length = sum(len(tokens) for tokens in documents) / len(documents)
+    scores = {}
+    for product, tokens in zip(products, documents):
+        counts = Counter(tokens)
+        score = 0.0
+        for term in dict.fromkeys(tokenize(query)):
+            if not counts[term]:
+                continue
+            frequency = sum(1 for other in documents if term in other)
+            idf = math.log(1 + (len(documents) - frequency + 0.5) / (frequency + 0.5))
+            score += idf * counts[term] * (k1 + 1) / (
+                counts[term] + k1 * (1 - b + b * len(tokens) / average_length))
+        if score:
+            scores[product['_id']] = score
+    return scores
+
+
+@pytest.fixture
+def index(tmp_path):
+    """Index of the test products."""
+    build_text_index(make_products(), str(tmp_path / 'index'))
+    return BM25Index(str(tmp_path / 'index'))
+
+
+class TestBuildTextIndex:
+    """Test class for build_text_index()."""
+
+    def test_manifest(self, tmp_path):
+        """Test that the manifest describes the index and the files are written."""
+        manifest = build_text_index(make_products(), str(tmp_path))
+
+        assert manifest['documents'] == 5
+        assert manifest['fields'] == ['_id'] + SEARCH_FIELDS
+        assert manifest['terms'] == len({term for product in make_products()
+                                         for term in tokenize(product['search_string'])})
+        assert sorted(os.listdir(tmp_path)) == ['documents.arrow', 'manifest.json', 'postings_docs.npy',
+                                                'postings_weights.npy', 'term_offsets.npy', 'terms.arrow',
+                                                'vocabulary.arrow']
+
+    def test_empty_catalog(self, tmp_path):
+        """Test that an empty catalog gives an index without results."""
+        build_text_index([], str(tmp_path))
+
+        assert BM25Index(str(tmp_path)).search('kawa') == []
+
+    def test_from_snapshot(self, tmp_path):
+        """Test that the index can be built from the catalog snapshot."""
+        writer = CatalogSnapshotWriter(str(tmp_path / 'snapshot'))
+        writer.prepare()
+        for product in make_products():
+            writer.add(product)
+        writer.close()
+        writer.write_manifest()
+
+        build_text_index(iter_snapshot_documents(str(tmp_path / 'snapshot')), str(tmp_path / 'index'))
+
+        assert BM25Index(str(tmp_path / 'index')).search('mleko')[0]['_id'] == '5'
+
+    def test_from_snapshot_of_two_languages(self, tmp_path):
+        """Test that only the products of the requested language are indexed from a shared snapshot."""
+        writer = CatalogSnapshotWriter(str(tmp_path / 'snapshot'))
+        writer.prepare()
+        writer.add(build_product(make_record('1', names=('Mleko łaciate',))))
+        writer.add(build_product(make_record('2', names=('Mleko Milch',), lang='de')))
+        writer.close()
+        writer.write_manifest()
+        snapshot = str(tmp_path / 'snapshot')
+
+        build_text_index(iter_snapshot_documents(snapshot), str(tmp_path / 'pl'))
+        build_text_index(iter_snapshot_documents(snapshot, lang='de'), str(tmp_path / 'de'))
+
+        assert [result['_id'] for result in BM25Index(str(tmp_path / 'pl')).search('mleko')] == ['1']
+        assert [result['_id'] for result in BM25Index(str(tmp_path / 'de')).search('mleko')] == ['2']
+        assert {document['_id'] for document in iter_snapshot_documents(snapshot, lang=None)} == {'1', '2'}
+        assert 'lang' not in next(iter(iter_snapshot_documents(snapshot)))
+
+
+class TestBM25Index:
+    """Test class for BM25Index."""
+
+    @pytest.mark.parametrize("query", ["kawa", "kawa zielona", "herbata zielona kawa", "mleko 100 g"])
+    def test_scores_match_bm25(self, index, query):
+        """Test that the scores and order follow the BM25 formula."""
+        expected = bm25_scores(make_products(), query)
+
+        results = index.search(query)
+
+        assert {result['_id']: result['score'] for result in results} == pytest.approx(expected, rel=1e-5)
+        assert [result['score'] for result in results] == pytest.approx(sorted(expected.values(), reverse=True),
+                                                                         rel=1e-5)
+
+    def test_unknown_terms(self, index):
+        """Test that terms missing from the catalog match nothing."""
+        assert index.search('czekolada') == []
+        assert index.search('') == []
+
+    def test_limit(self, index):
+        """Test that only the best results are returned."""
+        results = index.search('kawa herbata', limit=2)
+
+        assert [result['_id'] for result in results] == \
+            [result['_id'] for result in index.search('kawa herbata')][:2]
+
+    def test_stored_documents(self, index):
+        """Test that results hold the stored product fields like a projected MongoDB result."""
+        product = make_products()[4]
+
+        result = index.search('mleko')[0]
+
+        assert result == dict({field: product[field] for field in ['_id'] + SEARCH_FIELDS},
+                              score=result['score'])
+
+    def test_projection(self, index):
+        """Test that a projection selects the returned fields."""
+        result = index.search('mleko', {'score': {'$meta': 'textScore'}, 'brands': 1})[0]
+
+        assert set(result) == {'_id', 'brands', 'score'}
+
+    def test_missing_index(self, tmp_path):
+        """Test that searching a directory without an index raises."""
+        with pytest.raises(FileNotFoundError):
+            BM25Index(str(tmp_path)).search('kawa')
+
+    def test_search_products_direct(self, index):
+        """Test that the index can stand in for the collection of search_products_direct()."""
+        results = search_products_direct(index, 'Kawa', 'kawa', build_search_projection())
+
+        assert [result['_id'] for result in results] == [result['_id'] for result in index.search('kawa')]
+        assert all('score' in result for result in results)
+
+
+class TestPrefixExpansion:
+    """Test class for the expansion of truncated query tokens."""
+
+    @pytest.fixture
+    def receipt_index(self, tmp_path):
+        build_text_index(make_receipt_products(), str(tmp_path))
+        return BM25Index(str(tmp_path))
+
+    def test_vocabulary(self, receipt_index):
+        """Test that the vocabulary counts the documents of every name and category word."""
+        table = open_arrow(f'{receipt_index.directory}/vocabulary.arrow')
+        counts = dict(zip(table.column('term').to_pylist(), table.column('documents').to_pylist()))
+
+        assert counts['kawa'] == 2
+        assert counts['zbożowa'] == 2
+        assert counts['spreads'] == 5
+        assert table.column('term').to_pylist() == sorted(counts)
+
+    def test_expand(self, receipt_index):
+        """Test that a truncated token is kept and expanded to the words it starts, most frequent first."""
+        receipt_index.load()
+        vocabulary = receipt_index.vocabulary
+
+        assert vocabulary.expand('zbożo') == ['zbożo', 'zbożowa', 'zbożowe']
+        assert vocabulary.expand('zbożo', limit=2) == ['zbożo', 'zbożowa']
+        assert vocabulary.expand('ściół') == ['ściół', 'ściółkowe']
+        assert vocabulary.expand('kawa') == ['kawa', 'kawałki']
+
+    @pytest.mark.parametrize("token", ["ka", "500", "czekol"])
+    def test_tokens_kept(self, receipt_index, token):
+        """Test that short and numeric tokens and tokens no word starts are not expanded."""
+        receipt_index.load()
+
+        assert receipt_index.vocabulary.expand(token) == [token]
+
+    def test_search_finds_truncated_tokens(self, receipt_index):
+        """Test that a truncated receipt line only finds products with prefix expansion."""
+        assert receipt_index.search('zbożo') == []
+
+        results = receipt_index.search('kawa zbożo', expand_prefixes=True)
+
+        assert [result['_id'] for result in results][:2] == ['1', '2']
+        assert {result['_id'] for result in results} == {'1', '2', '3', '5'}
+
+    def test_brand_token_kept(self, tmp_path):
+        """Test that a brand token that starts a name word still finds the products of the brand."""
+        brand_record = make_record('1', names=('Jogurt naturalny',))
+        brand_record['brands'] = 'Eko'
+        build_text_index([build_product(brand_record),
+                          build_product(make_record('2', names=('Mleko ekologiczne',)))], str(tmp_path))
+        index = BM25Index(str(tmp_path))
+
+        assert index.expand_query('eko') == [['eko', 'ekologiczne']]
+        assert {result['_id'] for result in index.search('eko', expand_prefixes=True)} == {'1', '2'}
+
+    def test_group_scores_best_expansion(self, receipt_index):
+        """Test that a document matching several expansions of a token scores its best one."""
+        expected = {}
+        for word in ['kawa', 'kawałki']:
+            for result in receipt_index.search(word):
+                expected[result['_id']] = max(expected.get(result['_id'], 0.0), result['score'])
+
+        results = receipt_index.search('kawa', expand_prefixes=True)
+
+        assert {result['_id']: result['score'] for result in results} == pytest.approx(expected)
+
+    def test_index_without_vocabulary(self, receipt_index):
+        """Test that an index built before the vocabulary searches without expansion."""
+        os.remove(f'{receipt_index.directory}/vocabulary.arrow')
+
+        assert receipt_index.search('zbożo', expand_prefixes=True) == []
+        assert receipt_index.expand_query('kawa zbożo') == [['kawa'], ['zbożo']]
+
+    def test_empty_vocabulary(self, tmp_path):
+        """Test that an empty vocabulary keeps every token."""
+        build_text_index([], str(tmp_path))
+
+        vocabulary = PrefixVocabulary(open_arrow(f'{tmp_path}/vocabulary.arrow'))
+
+        assert len(vocabulary) == 0
+        assert vocabulary.expand_query('kawa zbożo') == [['kawa'], ['zbożo']]
+
+    def test_local_session_expands(self, receipt_index, monkeypatch):
+        """Test that a session on the local index expands truncated tokens, unless disabled."""
+        monkeypatch.setattr(search_products, 'query_pinecone', lambda search_string, top_k=10: [])
+
+        with SearchSession(text_backend='local', local_index_dir=receipt_index.directory) as session:
+            expanded = session.search('Jaja Ściół')
+        with SearchSession(text_backend='local', local_index_dir=receipt_index.directory,
+                           prefix_expansion=False) as session:
+            plain = session.search('Jaja Ściół')
+
+        assert [result['_id'] for result in expanded['direct_search']['results']] == ['4']
+        assert expanded['direct_search']['results'][0]['score'] > plain['direct_search']['results'][0]['score']
+
+    def test_mongo_session_sends_expanded_query(self, receipt_index, monkeypatch):
+        """Test that the MongoDB text search gets one query with the expanded words."""
+        monkeypatch.setattr(search_products, 'query_pinecone', lambda search_string, top_k=10: [])
+        collection = make_collection()
+
+        with SearchSession(client=FakeClient(collection), local_index_dir=receipt_index.directory) as session:
+            session.search('Kawa Zbożo')
+
+        assert [query['$text']['$search'] for query in collection.queries] == ['kawa kawałki zbożo zbożowa zbożowe']
+
+    def test_mongo_session_without_index(self, tmp_path, monkeypatch):
+        """Test that the MongoDB text search gets the formatted string without a local index."""
+        monkeypatch.setattr(search_products, 'query_pinecone', lambda search_string, top_k=10: [])
+        collection = make_collection()
+
+        with SearchSession(client=FakeClient(collection), local_index_dir=str(tmp_path)) as session:
+            session.search('Kawa Zbożo')
+
+        assert [query['$text']['$search'] for query in collection.queries] == ['kawa zbożo']
+
+
+class TestLocalTextBackend:
+    """Test class for search sessions on the local text index."""
+
+    @pytest.fixture(autouse=True)
+    def no_pinecone(self, monkeypatch):
+        monkeypatch.setattr(search_products, 'query_pinecone', lambda search_string, top_k=10: [])
+
+    def test_search_without_database(self, index, monkeypatch):
+        """Test that a session on the local index searches without MONGO_URI."""
+        monkeypatch.delenv('MONGO_URI', raising=False)
+        monkeypatch.setenv('SEARCH_TEXT_BACKEND', 'local')
+        monkeypatch.setenv('LOCAL_TEXT_INDEX_DIR', index.directory)
+
+        with SearchSession() as session:
+            results = session.search('Kawa zielona')
+
+        assert results['direct_search']['results'][0]['_id'] == '4'
+        assert results['rapidfuzz_search']['count'] == 3
+        assert session.cache.generation == index.generation
+
+    def test_missing_index_is_reported(self, tmp_path):
+        """Test that a session without a local index returns an error."""
+        session = SearchSession(text_backend='local', local_index_dir=str(tmp_path))
+
+        assert 'No text index manifest' in session.search('kawa')['error']
+
+    def test_slow_index_times_out(self, index, monkeypatch):
+        """Test that the text search timeout also applies to the local index."""
+        def slow_search(self, *args, **kwargs):
+            time.sleep(0.5)
+            return []
+
+        monkeypatch.setattr(BM25Index, 'search', slow_search)
+        with SearchSession(text_backend='local', local_index_dir=index.directory, mongo_timeout=0.1) as session:
+            results = session.search('kawa')
+
+        assert results['timed_out'] == ['local']
+        assert results['direct_search']['count'] == 0
+
+    def test_unknown_backend(self):
+        """Test that unknown text backends are rejected."""
+        with pytest.raises(ValueError):
+            SearchSession(text_backend='elastic')
+
+
+class TestRebuild:
+    """Test class for rebuilding an index that is in use."""
+
+    def test_rebuild_keeps_open_index_readable(self, index):
+        """Test that an index searched by another process still reads its files after a rebuild."""
+        before = index.search('kawa')
+
+        build_text_index(make_products()[:2], index.directory)
+
+        assert index.search('kawa') == before
+        assert len(BM25Index(index.directory).search('kawa')) == 2
+        assert not [name for name in os.listdir(index.directory) if name.endswith('.tmp')]
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the vector_index module.
+Builds small indexes of random vectors in a temporary directory and compares the
+approximate search with brute force.
+"""
+
+import time
+
+import numpy as np
+import pytest
+
+import search_products
+import vector_index
+from catalog_snapshot import CatalogSnapshotWriter
+from download_products import build_product
+from pinecone_integration import build_product_metadata
+from search_cache import QueryResultCache
+from search_products import SearchSession
+from test_ingest_pipeline import make_record
+from test_search_session import FakeClient, make_collection
+from vector_index import (VectorIndex, build_vector_index, close_vector_indexes, default_list_count,
+                          iter_snapshot_embeddings, query_vector_index)
+
+DIMENSION = 16
+
+
+@pytest.fixture(autouse=True)
+def fresh_vector_indexes():
+    """Open the indexes of every test from their files."""
+    close_vector_indexes()
+    yield
+    close_vector_indexes()
+
+
+def make_embeddings(count, seed=0):
+    """Random embeddings with the metadata of test products."""
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(count, DIMENSION)).astype(np.float32)
+    return [(str(i), vectors[i].tolist(),
+             build_product_metadata(build_product(make_record(str(i), names=(f'Produkt {i}',)))))
+            for i in range(count)]
+
+
+def brute_force(embeddings, query, top_k):
+    """IDs and cosine similarities of the top_k most similar embeddings."""
+    vectors = np.array([vector for _, vector, _ in embeddings], dtype=np.float64)
+    scores = vectors @ query / (np.linalg.norm(vectors, axis=1) * np.linalg.norm(query))
+    best = np.argsort(-scores, kind='stable')[:top_k]
+    return [embeddings[i][0] for i in best], scores[best]
+
+
+class TestBuildVectorIndex:
+    """Test class for build_vector_index()."""
+
+    def test_manifest(self, tmp_path):
+        """Test that the manifest describes the index."""
+        manifest = build_vector_index(make_embeddings(50), str(tmp_path), lists=5)
+
+        assert (manifest['vectors'], manifest['dimension'], manifest['lists']) == (50, DIMENSION, 5)
+        assert manifest['model'] == vector_index.EMBEDDING_MODEL_NAME
+
+    def test_snapshot_of_two_languages(self, tmp_path, monkeypatch):
+        """Test that only the products of the requested language are embedded from a shared snapshot."""
+        writer = CatalogSnapshotWriter(str(tmp_path))
+        writer.prepare()
+        writer.add(build_product(make_record('1', names=('Mleko łaciate',))))
+        writer.add(build_product(make_record('2', names=('Milch',), lang='de')))
+        writer.close()
+        writer.write_manifest()
+        monkeypatch.setattr(vector_index, 'create_product_embeddings',
+                            lambda products: [(product['_id'], [1.0] * DIMENSION, {}) for product in products])
+
+        assert [vector_id for vector_id, _, _ in iter_snapshot_embeddings(str(tmp_path))] == ['1']
+        assert [vector_id for vector_id, _, _ in iter_snapshot_embeddings(str(tmp_path), 'de')] == ['2']
+
+    def test_default_list_count(self):
+        """Test that small indexes are exact and larger ones get about sqrt(n) lists."""
+        assert default_list_count(5000) == 0
+        assert default_list_count(40000) == 200
+
+    def test_empty_index(self, tmp_path):
+        """Test that an index without vectors returns no results."""
+        build_vector_index([], str(tmp_path))
+
+        assert VectorIndex(str(tmp_path)).query([1.0] * DIMENSION) == []
+
+
+class TestVectorIndex:
+    """Test class for VectorIndex."""
+
+    @pytest.mark.parametrize("lists", [0, 8])
+    def test_exact_search_matches_brute_force(self, tmp_path, lists):
+        """Test that the exact search returns the most similar vectors with their cosine similarity."""
+        embeddings = make_embeddings(200)
+        build_vector_index(embeddings, str(tmp_path), lists=lists)
+        query = np.random.default_rng(1).normal(size=DIMENSION)
+
+        matches = VectorIndex(str(tmp_path)).query(query, top_k=5, exact=True)
+
+        expected_ids, expected_scores = brute_force(embeddings, query, 5)
+        assert [vector_id for vector_id, _, _ in matches] == expected_ids
+        assert [score for _, score, _ in matches] == pytest.approx(expected_scores.tolist(), abs=1e-5)
+        assert matches[0][2] == embeddings[int(expected_ids[0])][2]
+
+    def test_ivf_probing_all_lists_is_exact(self, tmp_path):
+        """Test that an approximate search over every list finds the exact results."""
+        build_vector_index(make_embeddings(300), str(tmp_path), lists=10)
+        index = VectorIndex(str(tmp_path))
+        query = np.random.default_rng(2).normal(size=DIMENSION)
+
+        assert index.query(query, top_k=10, nprobe=10) == index.query(query, top_k=10, exact=True)
+
+    def test_ivf_recall(self, tmp_path):
+        """Test that probing a few lists finds most of the exact results."""
+        build_vector_index(make_embeddings(2000), str(tmp_path), lists=20)
+        index = VectorIndex(str(tmp_path))
+        queries = np.random.default_rng(3).normal(size=(20, DIMENSION))
+
+        summaries = vector_index.benchmark(index, queries, top_k=10, nprobe=6)
+
+        assert summaries['ivf']['recall'] >= 0.6
+        assert summaries['exact']['count'] == 20
+
+    def test_missing_index(self, tmp_path):
+        """Test that searching a directory without an index raises."""
+        with pytest.raises(FileNotFoundError):
+            VectorIndex(str(tmp_path)).query([1.0] * DIMENSION)
+
+
+class TestQueryVectorIndex:
+    """Test class for the Pinecone-compatible search functions."""
+
+    @pytest.fixture
+    def embeddings(self, tmp_path, monkeypatch):
+        embeddings = make_embeddings(20)
+        build_vector_index(embeddings, str(tmp_path))
+        monkeypatch.setenv('LOCAL_VECTOR_INDEX_DIR', str(tmp_path))
+        monkeypatch.setattr(vector_index, 'embed_query', lambda formatted: embeddings[3][1])
+        return embeddings
+
+    def test_results_shaped_like_pinecone(self, embeddings):
+        """Test that results have the keys and values of search_pinecone() results."""
+        results = query_vector_index('Produkt 3', top_k=3)
+
+        assert len(results) == 3
+        assert results[0] == {'id': '3', 'score': pytest.approx(1.0, abs=1e-5), 'given_name': 'Produkt 3',
+                              'text': embeddings[3][2]['search_string'], 'metadata': embeddings[3][2]}
+
+    def test_model_mismatch(self, embeddings, tmp_path):
+        """Test that an index of another embedding model is rejected."""
+        build_vector_index(embeddings, str(tmp_path), model_name='other-model')
+
+        with pytest.raises(ValueError):
+            query_vector_index('Produkt 3')
+        assert vector_index.search_vector_index('Produkt 3') == []
+
+    def test_slow_index_times_out(self, embeddings, monkeypatch):
+        """Test that the semantic search timeout also applies to the local vector index."""
+        def slow_query(*args, **kwargs):
+            # Runs on after the test, so it must not call the real embedding model
+            time.sleep(0.5)
+            return []
+
+        monkeypatch.setattr(vector_index, 'query_vector_index', slow_query)
+        with SearchSession(client=FakeClient(make_collection()), vector_backend='local',
+                           pinecone_timeout=0.1) as session:
+            results = session.search('Produkt 3')
+
+        assert results['timed_out'] == ['local-vectors']
+        assert results['pinecone_search']['count'] == 0
+
+    def test_session_uses_local_vectors(self, embeddings, monkeypatch):
+        """Test that a session with the local vector backend does not query Pinecone."""
+        monkeypatch.setattr(search_products, 'query_pinecone',
+                            lambda search_string, top_k=10: pytest.fail('Pinecone queried'))
+
+        with SearchSession(client=FakeClient(make_collection()), vector_backend='local',
+                           cache=QueryResultCache()) as session:
+            results = session.search('Produkt 3')
+            cached = session.search('produkt 3')
+
+        assert results['pinecone_search']['count'] == search_products.PINECONE_TOP_K
+        assert results['pinecone_search']['results'][0]['id'] == '3'
+        assert cached['pinecone_search'] == results['pinecone_search']
+        assert session.cache.stats()['hits'] == 2
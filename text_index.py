@@ -0,0 +1,540 @@
+#!/usr/bin/env python3
+"""
+Local BM25 inverted index over the search_string field of the product catalog.
+A local alternative to the MongoDB $text search: built from the catalog snapshot, stored
+in memory-mapped files and loaded on first use, so lookups and batch jobs run without a
+database round trip. The index answers the find().sort().limit() calls of
+search_products_direct() like a collection, with the BM25 score in the 'score' field.
+
+Files of an index directory:
+- manifest.json - Build parameters, document and term counts and the index generation;
+  written last, so an index without it is incomplete
+- terms.arrow - Sorted vocabulary, the position of a term is its term number
+- term_offsets.npy - Start of the postings of every term (int64, one entry more than terms)
+- postings_docs.npy - Document numbers of the postings, ascending per term (uint32)
+- postings_weights.npy - BM25 weight of every posting with the IDF applied (float32)
+- documents.arrow - Stored product fields, one row per document number
+- vocabulary.arrow - Sorted words of the product names and categories with the number of
+  documents containing them, used to expand truncated query tokens (see PrefixVocabulary)
+"""
+
+import argparse
+import bisect
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from array import array
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from catalog_snapshot import PRODUCT_SCHEMA, read_snapshot
+from ingest_progress import LatencyRecorder
+from search_products import SEARCH_FIELDS, SEARCH_LIMIT
+from utils import format_search_string, prepare_scoring_fields
+
+DEFAULT_INDEX_DIR = 'text_index'
+MANIFEST_FILENAME = 'manifest.json'
+MANIFEST_VERSION = 1
+DEFAULT_K1 = 1.2
+DEFAULT_B = 0.75
+DOCUMENT_BATCH_SIZE = 10000
+MIN_PREFIX_LENGTH = 3
+MAX_PREFIX_EXPANSIONS = 8
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+
+def tokenize(text: str) -> List[str]:
+    """Split a search string into lowercase word tokens."""
+    return TOKEN_PATTERN.findall(text.lower()) if text else []
+
+
+def _temporary_path(path: str) -> str:
+    """
+    Path a file is written to before it is renamed into place, so processes that have
+    the previous index memory-mapped keep reading intact files.
+    """
+    return f"{path}.tmp"
+
+
+def save_array(path: str, values: np.ndarray) -> None:
+    """Write a NumPy array for memory-mapping, replacing an existing file atomically."""
+    with open(_temporary_path(path), 'wb') as f:
+        np.save(f, values)
+    os.replace(_temporary_path(path), path)
+
+
+def write_arrow(path: str, table: pa.Table) -> None:
+    """Write a table as an Arrow IPC file, replacing an existing file atomically."""
+    with pa.OSFile(_temporary_path(path), 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(_temporary_path(path), path)
+
+
+def write_manifest(path: str, manifest: Dict[str, Any]) -> None:
+    """Write an index manifest, replacing an existing file atomically."""
+    with open(_temporary_path(path), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(_temporary_path(path), path)
+
+
+def open_arrow(path: str) -> pa.Table:
+    """Memory-map an Arrow IPC file; the table keeps the map open while it is referenced."""
+    return pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+
+
+def vocabulary_words(document: Dict[str, Any]) -> set:
+    """Return the words of the product names and categories of a document."""
+    scoring = document.get('scoring')
+    if not isinstance(scoring, dict):
+        scoring = prepare_scoring_fields(document)
+    words = set()
+    for text in (scoring.get('names') or []) + (scoring.get('categories') or []):
+        words.update(tokenize(text))
+    return words
+
+
+def expanded_search_string(groups: List[List[str]]) -> str:
+    """Join expanded query tokens into one search string for the MongoDB $text search."""
+    return ' '.join(dict.fromkeys(term for group in groups for term in group))
+
+
+def build_text_index(documents: Iterable[Dict[str, Any]], directory: str = DEFAULT_INDEX_DIR,
+                     fields: Optional[List[str]] = None, k1: float = DEFAULT_K1,
+                     b: float = DEFAULT_B) -> Dict[str, Any]:
+    """
+    Build a BM25 index over the search_string field of product documents.
+
+    Args:
+        documents: Product documents as built by download_products.build_product()
+        directory: Index directory; an existing index in it is replaced
+        fields: Product fields stored for the results (default: SEARCH_FIELDS)
+        k1: BM25 term frequency saturation
+        b: BM25 document length normalization
+
+    Returns:
+        The manifest of the new index
+    """
+    fields = ['_id'] + [field for field in (fields or SEARCH_FIELDS) if field != '_id']
+    schema = pa.schema([PRODUCT_SCHEMA.field(field) for field in fields])
+    os.makedirs(directory, exist_ok=True)
+    manifest_path = os.path.join(directory, MANIFEST_FILENAME)
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+
+    term_numbers = {}
+    vocabulary = Counter()
+    posting_terms, posting_docs, posting_counts, doc_lengths = array('I'), array('I'), array('I'), array('I')
+    rows = []
+    documents_path = os.path.join(directory, 'documents.arrow')
+    with pa.OSFile(_temporary_path(documents_path), 'wb') as sink:
+        with pa.ipc.new_file(sink, schema) as writer:
+            for document in documents:
+                doc_number = len(doc_lengths)
+                tokens = tokenize(document.get('search_string') or '')
+                doc_lengths.append(len(tokens))
+                for term, count in Counter(tokens).items():
+                    posting_terms.append(term_numbers.setdefault(term, len(term_numbers)))
+                    posting_docs.append(doc_number)
+                    posting_counts.append(count)
+                vocabulary.update(vocabulary_words(document))
+                rows.append({field: document.get(field) for field in fields})
+                if len(rows) >= DOCUMENT_BATCH_SIZE:
+                    writer.write_table(pa.Table.from_pylist(rows, schema))
+                    rows = []
+            if rows:
+                writer.write_table(pa.Table.from_pylist(rows, schema))
+
+    # Renumber the terms in sorted order and group the postings by term; a stable sort
+    # keeps the document numbers of a term ascending
+    terms = sorted(term_numbers)
+    sorted_numbers = np.empty(len(terms), dtype=np.uint32)
+    sorted_numbers[[term_numbers[term] for term in terms]] = np.arange(len(terms), dtype=np.uint32)
+    posting_terms = sorted_numbers[np.frombuffer(posting_terms, dtype=np.uint32)]
+    order = np.argsort(posting_terms, kind='stable')
+    posting_terms = posting_terms[order]
+    docs = np.frombuffer(posting_docs, dtype=np.uint32)[order]
+    counts = np.frombuffer(posting_counts, dtype=np.uint32)[order].astype(np.float64)
+
+    document_count = len(doc_lengths)
+    lengths = np.frombuffer(doc_lengths, dtype=np.uint32).astype(np.float64)
+    average_length = float(lengths.mean()) if document_count and lengths.mean() > 0 else 1.0
+    document_frequencies = np.bincount(posting_terms, minlength=len(terms))
+    idf = np.log(1.0 + (document_count - document_frequencies + 0.5) / (document_frequencies + 0.5))
+    weights = idf[posting_terms] * counts * (k1 + 1) / (
+        counts + k1 * (1 - b + b * lengths[docs] / average_length))
+
+    offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(document_frequencies)
+    os.replace(_temporary_path(documents_path), documents_path)
+    save_array(os.path.join(directory, 'term_offsets.npy'), offsets)
+    save_array(os.path.join(directory, 'postings_docs.npy'), docs)
+    save_array(os.path.join(directory, 'postings_weights.npy'), weights.astype(np.float32))
+    write_arrow(os.path.join(directory, 'terms.arrow'), pa.table({'term': pa.array(terms, pa.string())}))
+    words = sorted(vocabulary)
+    write_arrow(os.path.join(directory, 'vocabulary.arrow'), pa.table({
+        'term': pa.array(words, pa.string()),
+        'documents': pa.array([vocabulary[word] for word in words], pa.uint32()),
+    }))
+
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'generation': uuid.uuid4().hex,
+        'documents': document_count,
+        'terms': len(terms),
+        'postings': int(len(docs)),
+        'vocabulary': len(words),
+        'average_length': average_length,
+        'k1': k1,
+        'b': b,
+        'fields': fields,
+        'built_at': datetime.now().isoformat(),
+    }
+    write_manifest(manifest_path, manifest)
+    return manifest
+
+
+def iter_snapshot_documents(snapshot_dir: str, fields: Optional[List[str]] = None,
+                            lang: Optional[str] = 'pl') -> Iterable[Dict[str, Any]]:
+    """
+    Yield the product documents of a catalog snapshot with the given fields and _id.
+
+    The snapshot holds the products of every ingested language, while each language is
+    searched in its own MongoDB collection, so only the products of `lang` are yielded
+    (None yields all of them).
+    """
+    columns = ['_id'] + [field for field in (fields or SEARCH_FIELDS) if field != '_id']
+    read_columns = columns if lang is None or 'lang' in columns else columns + ['lang']
+    for batch in read_snapshot(snapshot_dir, columns=read_columns).to_batches(DOCUMENT_BATCH_SIZE):
+        if lang is not None:
+            batch = batch.filter(pc.equal(batch.column('lang'), lang)).select(columns)
+        yield from batch.to_pylist()
+
+
+class _TermList:
+    """Sequence view of the memory-mapped vocabulary, for binary search with bisect."""
+
+    def __init__(self, terms: pa.Array):
+        self.terms = terms
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def __getitem__(self, position: int) -> str:
+        return self.terms[position].as_py()
+
+    def prefix_range(self, prefix: str) -> Tuple[int, int]:
+        """Positions [start, end) of the terms starting with prefix."""
+        return bisect.bisect_left(self, prefix), bisect.bisect_left(self, prefix + '\U0010ffff')
+
+
+class PrefixVocabulary:
+    """
+    Sorted vocabulary of the words of product names and categories, expanding truncated
+    query tokens, like the receipt abbreviations 'zbożo' or 'ściół', to the catalog words
+    they start with a binary search.
+    """
+
+    def __init__(self, table: pa.Table):
+        """
+        Args:
+            table: Contents of vocabulary.arrow
+        """
+        self._terms = _TermList(table.column('term').combine_chunks())
+        self._documents = table.column('documents').combine_chunks().to_numpy()
+
+    def __len__(self) -> int:
+        return len(self._terms)
+
+    def expand(self, token: str, limit: int = MAX_PREFIX_EXPANSIONS) -> List[str]:
+        """
+        Expand a query token to the catalog words starting with it.
+
+        Args:
+            token: Lowercase query token
+            limit: Maximum number of words
+
+        Returns:
+            The token itself, followed by the most frequent words it is a prefix of; only the
+            token for short or numeric tokens and tokens no word starts with. The token is kept
+            even if it is no name or category word, since it may still match a brand, label or
+            quantity of the search string
+        """
+        if len(token) < MIN_PREFIX_LENGTH or token.isdigit():
+            return [token]
+        start, end = self._terms.prefix_range(token)
+        # The token itself sorts first among the words it starts
+        if start < end and self._terms[start] == token:
+            start += 1
+        positions = start + np.argsort(-self._documents[start:end].astype(np.int64), kind='stable')
+        return [token] + [self._terms[int(position)] for position in positions[:limit - 1]]
+
+    def expand_query(self, formatted_string: str, limit: int = MAX_PREFIX_EXPANSIONS) -> List[List[str]]:
+        """Expand every distinct token of a search string, see expand()."""
+        return [self.expand(token, limit) for token in dict.fromkeys(tokenize(formatted_string))]
+
+
+class _TextCursor:
+    """Result of BM25Index.find(), evaluated by limit() or iteration."""
+
+    def __init__(self, index: 'BM25Index', formatted_string: str, projection: Optional[Dict[str, Any]]):
+        self.index = index
+        self.formatted_string = formatted_string
+        self.projection = projection
+
+    def sort(self, *args, **kwargs) -> '_TextCursor':
+        # Results are always ordered by score
+        return self
+
+    def limit(self, count: int) -> List[Dict[str, Any]]:
+        return self.index.search(self.formatted_string, self.projection, count)
+
+    def __iter__(self):
+        return iter(self.index.search(self.formatted_string, self.projection, None))
+
+
+class BM25Index:
+    """
+    Read-only BM25 index built by build_text_index().
+
+    The files are memory-mapped when the index is first searched (or by load()), so
+    opening an index is cheap and its pages are shared by every process using it.
+    An index can be searched by threads concurrently.
+    """
+
+    def __init__(self, directory: str = DEFAULT_INDEX_DIR):
+        """
+        Args:
+            directory: Index directory
+        """
+        self.directory = directory
+        self.name = os.path.basename(os.path.normpath(directory))
+        self.manifest = None
+        self.vocabulary = None
+        self._lock = threading.Lock()
+
+    @property
+    def generation(self) -> Optional[str]:
+        """Identifier of the build of the index."""
+        self.load()
+        return self.manifest['generation']
+
+    def load(self) -> None:
+        """
+        Memory-map the index files if not done yet.
+
+        Raises:
+            FileNotFoundError: If the directory has no complete index
+        """
+        with self._lock:
+            if self.manifest is not None:
+                return
+            manifest_path = os.path.join(self.directory, MANIFEST_FILENAME)
+            if not os.path.exists(manifest_path):
+                raise FileNotFoundError(f"No text index manifest in '{self.directory}'")
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            self._offsets = np.load(os.path.join(self.directory, 'term_offsets.npy'), mmap_mode='r')
+            self._docs = np.load(os.path.join(self.directory, 'postings_docs.npy'), mmap_mode='r')
+            self._weights = np.load(os.path.join(self.directory, 'postings_weights.npy'), mmap_mode='r')
+            self._terms = _TermList(open_arrow(os.path.join(self.directory, 'terms.arrow')).column('term')
+                                    .combine_chunks())
+            self._documents = open_arrow(os.path.join(self.directory, 'documents.arrow'))
+            # Indexes built before the vocabulary existed do not expand prefixes
+            vocabulary_path = os.path.join(self.directory, 'vocabulary.arrow')
+            self.vocabulary = PrefixVocabulary(open_arrow(vocabulary_path)) if os.path.exists(vocabulary_path) else None
+            self.manifest = manifest
+
+    def term_number(self, term: str) -> Optional[int]:
+        """Return the number of a term, or None if no document contains it."""
+        position = bisect.bisect_left(self._terms, term)
+        if position < len(self._terms) and self._terms[position] == term:
+            return position
+        return None
+
+    def expand_query(self, formatted_string: str) -> List[List[str]]:
+        """
+        Expand the truncated tokens of a search string with the prefix vocabulary.
+
+        Returns:
+            One group of terms per distinct token, only the token itself if the index
+            has no vocabulary
+        """
+        self.load()
+        if self.vocabulary is None:
+            return [[token] for token in dict.fromkeys(tokenize(formatted_string))]
+        return self.vocabulary.expand_query(formatted_string)
+
+    def _postings(self, terms: List[str]) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Documents and weights of a group of terms, scoring each document by its best term."""
+        postings = []
+        for term in terms:
+            number = self.term_number(term)
+            if number is not None:
+                start, end = self._offsets[number], self._offsets[number + 1]
+                postings.append((self._docs[start:end], self._weights[start:end]))
+        if len(postings) <= 1:
+            return postings[0] if postings else None
+        docs, positions = np.unique(np.concatenate([docs for docs, _ in postings]), return_inverse=True)
+        weights = np.zeros(len(docs), dtype=np.float32)
+        np.maximum.at(weights, positions, np.concatenate([weights for _, weights in postings]))
+        return docs, weights
+
+    def find(self, query: Dict[str, Any], projection: Optional[Dict[str, Any]] = None) -> _TextCursor:
+        """
+        Collection-style entry point for search_products_direct().
+
+        Args:
+            query: {"$text": {"$search": formatted_string}}
+            projection: Fields to return as in a MongoDB projection (default: all stored fields)
+
+        Returns:
+            Cursor whose limit() runs the search
+        """
+        return _TextCursor(self, query['$text']['$search'], projection)
+
+    def search(self, formatted_string: str, projection: Optional[Dict[str, Any]] = None,
+               limit: Optional[int] = SEARCH_LIMIT, expand_prefixes: bool = False) -> List[Dict[str, Any]]:
+        """
+        Find the documents containing any term of the search string, best BM25 score first.
+
+        With expand_prefixes, every token also matches the catalog words it is a prefix of
+        (see expand_query()); a document scores the best weight among the words of a token,
+        so a token matching several of its expansions is not counted twice.
+
+        Args:
+            formatted_string: Output of format_search_string()
+            projection: Fields to return as in a MongoDB projection (default: all stored fields)
+            limit: Maximum number of results, None for all
+            expand_prefixes: Expand truncated tokens with the prefix vocabulary
+
+        Returns:
+            Stored product documents with their BM25 score in 'score'; ties are ordered
+            by document number
+        """
+        self.load()
+        if expand_prefixes:
+            groups = self.expand_query(formatted_string)
+        else:
+            groups = [[token] for token in dict.fromkeys(tokenize(formatted_string))]
+        postings = [group_postings for group_postings in map(self._postings, groups) if group_postings is not None]
+        if not postings:
+            return []
+
+        if len(postings) == 1:
+            docs, scores = np.asarray(postings[0][0]), np.asarray(postings[0][1], dtype=np.float64)
+        else:
+            docs, positions = np.unique(np.concatenate([docs for docs, _ in postings]), return_inverse=True)
+            scores = np.bincount(positions, weights=np.concatenate([weights for _, weights in postings]))
+
+        if limit is not None and len(docs) > limit:
+            if limit <= 0:
+                return []
+            candidates = np.argpartition(-scores, limit - 1)[:limit]
+            docs, scores = docs[candidates], scores[candidates]
+        order = np.lexsort((docs, -scores))
+        docs, scores = docs[order], scores[order]
+        if limit is not None:
+            docs, scores = docs[:limit], scores[:limit]
+
+        fields = [field for field, value in (projection or {}).items() if value == 1]
+        table = self._documents.take(pa.array(docs, pa.uint32()))
+        if fields:
+            table = table.select(['_id'] + [field for field in fields if field in table.column_names
+                                            and field != '_id'])
+        results = []
+        for document, score in zip(table.to_pylist(), scores.tolist()):
+            # Drop the fields the original document did not have, like a MongoDB result
+            result = {key: value for key, value in document.items() if value is not None}
+            result['score'] = score
+            results.append(result)
+        return results
+
+
+def benchmark(index: BM25Index, queries: List[str], mongo: bool = False) -> Dict[str, Dict[str, Any]]:
+    """
+    Time the text search of every query on the local index and optionally on MongoDB,
+    after one untimed warm-up query per backend.
+
+    Args:
+        index: Local index
+        queries: Search strings
+        mongo: Also time the MongoDB $text search (needs MONGO_URI)
+
+    Returns:
+        Latency summary per backend in milliseconds
+    """
+    # The search session uses this module for its local backend, so it is only imported here
+    from search_products import SearchSession, find_products
+
+    backends = {'local': index}
+    if mongo:
+        session = SearchSession()
+        backends['mongo'] = session.collection
+    index.load()
+
+    summaries = {}
+    for name, collection in backends.items():
+        # The first query also pays for one-time initialization, e.g. of the Arrow kernels
+        if queries:
+            find_products(collection, format_search_string(queries[0]))
+        recorder = LatencyRecorder()
+        for query in queries:
+            formatted_string = format_search_string(query)
+            started = time.perf_counter()
+            find_products(collection, formatted_string)
+            recorder.record(time.perf_counter() - started)
+        summaries[name] = recorder.summary()
+    if mongo:
+        session.close()
+    return summaries
+
+
+def main():
+    """Main function to build or benchmark the local text index."""
+    parser = argparse.ArgumentParser(description='Local BM25 text index of the product catalog')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help='Build the index from the catalog snapshot')
+    build_parser.add_argument('--snapshot', default='catalog_snapshot', help='Catalog snapshot directory')
+    build_parser.add_argument('--lang', default='pl', help='Language of the indexed products (default: pl)')
+    build_parser.add_argument('--output', default=os.getenv('LOCAL_TEXT_INDEX_DIR', DEFAULT_INDEX_DIR),
+                              help=f'Index directory (default: LOCAL_TEXT_INDEX_DIR or {DEFAULT_INDEX_DIR})')
+
+    benchmark_parser = subparsers.add_parser('benchmark', help='Time the text search of the queries in a file')
+    benchmark_parser.add_argument('queries', help='File with one search string per line')
+    benchmark_parser.add_argument('--index', default=os.getenv('LOCAL_TEXT_INDEX_DIR', DEFAULT_INDEX_DIR),
+                                  help=f'Index directory (default: LOCAL_TEXT_INDEX_DIR or {DEFAULT_INDEX_DIR})')
+    benchmark_parser.add_argument('--mongo', action='store_true', help='Also time the MongoDB $text search')
+
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'build':
+            started = time.perf_counter()
+            manifest = build_text_index(iter_snapshot_documents(args.snapshot, lang=args.lang), args.output)
+            print(f"Indexed {manifest['documents']} documents, {manifest['terms']} terms and "
+                  f"{manifest['postings']} postings into '{args.output}' in {time.perf_counter() - started:.1f}s")
+        else:
+            with open(args.queries, 'r', encoding='utf-8') as f:
+                queries = [line.strip() for line in f if line.strip()]
+            for name, summary in benchmark(BM25Index(args.index), queries, args.mongo).items():
+                print(f"{name}: {summary['count']} queries, mean {summary['mean_ms']} ms, "
+                      f"p50 {summary['p50_ms']} ms, p95 {summary['p95_ms']} ms, max {summary['max_ms']} ms")
+    except Exception as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -114,19 +114,9 @@ def score_product_names(search_string: str, product_names: List[str]) -> float:
     Returns:
         Best matching score (0-100)
     """
-    if not search_string or not product_names:
+    if not search_string:
         return 0.0
-    
-    best_score = 0.0
-    for name in product_names:
-        if name:
-            # Use both partial_ratio and token_sort_ratio, take the better one
-            partial_score = fuzz.partial_ratio(search_string.lower(), name.lower())
-            token_score = fuzz.token_sort_ratio(search_string.lower(), name.lower())
-            name_score = max(partial_score, token_score)
-            best_score = max(best_score, name_score)
-    
-    return best_score
+    return _best_ratio_of(search_string.lower(), [name.lower() for name in product_names or [] if name])
 
 
 def score_brands(search_string: str, brands: str) -> float:
@@ -142,12 +132,7 @@ def score_brands(search_string: str, brands: str) -> float:
     """
     if not search_string or not brands:
         return 0.0
-    
-    # Use both partial_ratio and token_sort_ratio, take the better one
-    partial_score = fuzz.partial_ratio(search_string.lower(), brands.lower())
-    token_score = fuzz.token_sort_ratio(search_string.lower(), brands.lower())
-    
-    return max(partial_score, token_score)
+    return _best_ratio(search_string.lower(), brands.lower())
 
 
 def score_categories(search_string: str, categories, categories_tags: List[str] = None) -> float:
@@ -164,41 +149,9 @@ def score_categories(search_string: str, categories, categories_tags: List[str]
     """
     if not search_string:
         return 0.0
-    
-    scores = []
-    
-    # Score the categories (handle both string and list formats)
-    if categories:
-        if isinstance(categories, list):
-            category_list = [cat.strip() for cat in categories if cat and cat.strip()]
-        else:
-            category_list = [cat.strip() for cat in categories.split(',') if cat.strip()]
-        for i, category in enumerate(category_list):
-            # Use both partial_ratio and token_sort_ratio
-            partial_score = fuzz.partial_ratio(search_string.lower(), category.lower())
-            token_score = fuzz.token_sort_ratio(search_string.lower(), category.lower())
-            cat_score = max(partial_score, token_score)
-            
-            # Weight by specificity (later categories are more specific)
-            specificity_weight = 1.0 + (i * 0.1)  # Increase weight for later categories
-            weighted_score = cat_score * specificity_weight
-            scores.append(weighted_score)
-    
-    # Score the category tags if available
-    if categories_tags:
-        for tag in categories_tags:
-            if tag:
-                # Remove language prefixes like "en:", "fr:" for better matching
-                clean_tag = re.sub(r'^[a-z]{2}:', '', tag)
-                clean_tag = clean_tag.replace('-', ' ')  # Convert dashes to spaces
-                
-                partial_score = fuzz.partial_ratio(search_string.lower(), clean_tag.lower())
-                token_score = fuzz.token_sort_ratio(search_string.lower(), clean_tag.lower())
-                tag_score = max(partial_score, token_score)
-                scores.append(tag_score)
-    
-    # Return the best score, capped at 100
-    return min(max(scores) if scores else 0.0, 100.0)
+    return _score_categories(search_string.lower(),
+                             [category.lower() for category in _split_list_field(categories)],
+                             [_clean_category_tag(tag) for tag in categories_tags or [] if tag])
 
 
 def score_labels(search_string: str, labels) -> float:
@@ -212,23 +165,9 @@ def score_labels(search_string: str, labels) -> float:
     Returns:
         Matching score (0-100)
     """
-    if not search_string or not labels:
+    if not search_string:
         return 0.0
-    
-    scores = []
-    
-    # Handle both string and list formats
-    if isinstance(labels, list):
-        label_list = [label.strip() for label in labels if label and label.strip()]
-    else:
-        label_list = [label.strip() for label in labels.split(',') if label.strip()]
-    
-    for label in label_list:
-        partial_score = fuzz.partial_ratio(search_string.lower(), label.lower())
-        token_score = fuzz.token_sort_ratio(search_string.lower(), label.lower())
-        scores.append(max(partial_score, token_score))
-    
-    return max(scores) if scores else 0.0
+    return _best_ratio_of(search_string.lower(), [label.lower() for label in _split_list_field(labels)])
 
 
 def score_quantity(search_string: str, quantity: str) -> float:
@@ -244,12 +183,7 @@ def score_quantity(search_string: str, quantity: str) -> float:
     """
     if not search_string or not quantity:
         return 0.0
-    
-    # Use both partial_ratio and token_sort_ratio
-    partial_score = fuzz.partial_ratio(search_string.lower(), quantity.lower())
-    token_score = fuzz.token_sort_ratio(search_string.lower(), quantity.lower())
-    
-    return max(partial_score, token_score)
+    return _best_ratio(search_string.lower(), quantity.lower())
 
 
 def compute_given_name(document: Dict[str, Any]) -> str:
@@ -301,10 +235,107 @@ def compute_given_name(document: Dict[str, Any]) -> str:
     return ""
 
 
+def _split_list_field(value) -> List[str]:
+    """Split a comma-separated string or list field into its stripped, non-empty entries."""
+    if not value:
+        return []
+    if isinstance(value, list):
+        return [entry.strip() for entry in value if entry and entry.strip()]
+    return [entry.strip() for entry in value.split(',') if entry.strip()]
+
+
+def prepare_scoring_fields(document: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Precompute the normalized document fields used by RapidFuzz scoring.
+    
+    The downloader stores the result in the 'scoring' field of every product, so
+    the search path does not extract, split and lowercase the fields per query.
+    
+    Args:
+        document: MongoDB document or dataset record
+        
+    Returns:
+        Dictionary with the lowercased unique product names, brands, quantity,
+        categories (in order), cleaned category tags and labels
+    """
+    names = []
+    for name in extract_product_names(document.get('product_name', [])):
+        name = name.lower()
+        if name not in names:
+            names.append(name)
+    
+    category_tags = [_clean_category_tag(tag) for tag in document.get('categories_tags') or [] if tag]
+    
+    return {
+        'names': names,
+        'brands': (document.get('brands') or '').lower(),
+        'quantity': (document.get('quantity') or '').lower(),
+        'categories': [category.lower() for category in _split_list_field(document.get('categories'))],
+        'category_tags': category_tags,
+        'labels': [label.lower() for label in _split_list_field(document.get('labels'))],
+    }
+
+
+def _clean_category_tag(tag: str) -> str:
+    """Remove the language prefix like "en:" of a category tag, convert dashes to spaces and lowercase it."""
+    return re.sub(r'^[a-z]{2}:', '', tag).replace('-', ' ').lower()
+
+
+def _best_ratio(search_string: str, text: str) -> float:
+    """Better of partial_ratio and token_sort_ratio for already lowercased strings."""
+    return max(fuzz.partial_ratio(search_string, text), fuzz.token_sort_ratio(search_string, text))
+
+
+def _best_ratio_of(search_string: str, texts: List[str]) -> float:
+    """Best _best_ratio() of a list of already lowercased strings, 0 for an empty list."""
+    return max((_best_ratio(search_string, text) for text in texts), default=0.0)
+
+
+def _score_categories(search_string: str, categories: List[str], category_tags: List[str]) -> float:
+    """Category score of lowercased categories and cleaned category tags, capped at 100."""
+    # Later categories are more specific and get a higher weight
+    scores = [_best_ratio(search_string, category) * (1.0 + i * 0.1) for i, category in enumerate(categories)]
+    scores += [_best_ratio(search_string, tag) for tag in category_tags]
+    return min(max(scores, default=0.0), 100.0)
+
+
+def score_prepared_fields(search_string: str, fields: Dict[str, Any]) -> float:
+    """
+    Compute the combined RapidFuzz score from precomputed scoring fields.
+    
+    The per-field helpers score_product_names(), score_brands(), score_categories(),
+    score_labels() and score_quantity() score raw document fields the same way.
+    
+    Args:
+        search_string: The search query string
+        fields: Scoring fields from prepare_scoring_fields()
+        
+    Returns:
+        Combined weighted score
+    """
+    if not search_string:
+        return 0.0
+    query = search_string.lower()
+    
+    name_score = _best_ratio_of(query, fields.get('names', []))
+    brands = fields.get('brands')
+    brand_score = _best_ratio(query, brands) if brands else 0.0
+    category_score = _score_categories(query, fields.get('categories', []), fields.get('category_tags', []))
+    label_score = _best_ratio_of(query, fields.get('labels', []))
+    quantity = fields.get('quantity')
+    quantity_score = _best_ratio(query, quantity) if quantity else 0.0
+    
+    # Weights: names 3.0, brands 2.0, categories 1.5, labels 1.0, quantity 0.5
+    return name_score * 3.0 + brand_score * 2.0 + category_score * 1.5 + label_score * 1.0 + quantity_score * 0.5
+
+
 def compute_rapidfuzz_score(search_string: str, document: Dict[str, Any]) -> float:
     """
     Compute custom relevance score using RapidFuzz for a MongoDB document.
     
+    Uses the precomputed 'scoring' field of the document when present and
+    prepares the scoring fields from the raw document fields otherwise.
+    
     Args:
         search_string: The search query string
         document: MongoDB document
@@ -315,28 +346,7 @@ def compute_rapidfuzz_score(search_string: str, document: Dict[str, Any]) -> flo
     if not search_string:
         return 0.0
     
-    # Extract and score product names (weight: 3.0)
-    product_names = extract_product_names(document.get('product_name', []))
-    name_score = score_product_names(search_string, product_names) * 3.0
-    
-    # Score brands (weight: 2.0)
-    brands = document.get('brands', '')
-    brand_score = score_brands(search_string, brands) * 2.0
-    
-    # Score categories with specificity (weight: 1.5)
-    categories = document.get('categories', '')
-    categories_tags = document.get('categories_tags', [])
-    category_score = score_categories(search_string, categories, categories_tags) * 1.5
-    
-    # Score labels (optional, no explicit weight mentioned, using 1.0)
-    labels = document.get('labels', '')
-    label_score = score_labels(search_string, labels) * 1.0
-    
-    # Score quantity (weight: 0.5)
-    quantity = document.get('quantity', '')
-    quantity_score = score_quantity(search_string, quantity) * 0.5
-    
-    # Combine all scores
-    total_score = name_score + brand_score + category_score + label_score + quantity_score
-    
-    return total_score
\ No newline at end of file
+    fields = document.get('scoring')
+    if not isinstance(fields, dict):
+        fields = prepare_scoring_fields(document)
+    return score_prepared_fields(search_string, fields)
\ No newline at end of file
@@ -0,0 +1,410 @@
+#!/usr/bin/env python3
+"""
+Local vector index of product embeddings, a stand-in for the Pinecone index.
+Built from the embeddings create_product_embeddings() produces and stored in memory-mapped
+files, so semantic search runs offline, in tests and in benchmarks. Searches are exact
+(brute force over all vectors) or approximate with an inverted file (IVF): the vectors are
+clustered with spherical k-means and a query only scans the lists of its nearest centroids.
+Results have the same shape as the results of search_pinecone().
+
+Files of an index directory:
+- manifest.json - Model, dimension, vector and list counts and the index generation;
+  written last, so an index without it is incomplete
+- vectors.npy - L2-normalized float32 vectors, grouped by IVF list; the score is the
+  cosine similarity, like a Pinecone index with the cosine metric
+- list_offsets.npy - Start row of every IVF list (int64, one entry more than lists)
+- centroids.npy - Normalized IVF centroids (float32, no rows for an exact-only index)
+- metadata.arrow - Vector IDs and their metadata as JSON, one row per vector
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pyarrow as pa
+
+from ingest_progress import LatencyRecorder
+from pinecone_integration import EMBEDDING_MODEL_NAME, build_search_result, create_product_embeddings, embed_query
+from text_index import iter_snapshot_documents, open_arrow, save_array, write_arrow, write_manifest
+from utils import format_search_string
+
+DEFAULT_INDEX_DIR = 'vector_index'
+MANIFEST_FILENAME = 'manifest.json'
+MANIFEST_VERSION = 1
+IVF_MIN_VECTORS = 10000  # Smaller indexes are searched exactly
+IVF_TRAINING_ITERATIONS = 10
+IVF_TRAINING_SAMPLES_PER_LIST = 256
+DEFAULT_NPROBE = 8
+EMBEDDING_CHUNK_SIZE = 1000
+SNAPSHOT_FIELDS = ['product_name', 'brands', 'quantity', 'categories', 'labels', 'search_string']
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1.0)
+
+
+def default_list_count(vector_count: int) -> int:
+    """Number of IVF lists for an index of vector_count vectors, 0 for exact search only."""
+    return int(np.sqrt(vector_count)) if vector_count >= IVF_MIN_VECTORS else 0
+
+
+def train_ivf(vectors: np.ndarray, lists: int, iterations: int = IVF_TRAINING_ITERATIONS,
+              seed: int = 0) -> np.ndarray:
+    """
+    Cluster normalized vectors with spherical k-means on a sample.
+
+    Args:
+        vectors: Normalized vectors
+        lists: Number of clusters
+        iterations: Number of k-means iterations
+        seed: Random seed of the sample and the initial centroids
+
+    Returns:
+        Normalized centroids, one row per list
+    """
+    rng = np.random.default_rng(seed)
+    sample_size = min(len(vectors), lists * IVF_TRAINING_SAMPLES_PER_LIST)
+    sample = vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))]
+    centroids = sample[rng.choice(len(sample), lists, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, sample)
+        filled = np.bincount(assignment, minlength=lists) > 0
+        # Empty lists keep their previous centroid
+        centroids[filled] = _normalize(sums[filled])
+    return centroids
+
+
+def assign_lists(vectors: np.ndarray, centroids: np.ndarray, chunk_size: int = 65536) -> np.ndarray:
+    """Return the list of the nearest centroid of every vector."""
+    assignment = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), chunk_size):
+        assignment[start:start + chunk_size] = np.argmax(vectors[start:start + chunk_size] @ centroids.T, axis=1)
+    return assignment
+
+
+def build_vector_index(embeddings_data: Iterable[Tuple[str, Sequence[float], Dict[str, Any]]],
+                       directory: str = DEFAULT_INDEX_DIR, lists: Optional[int] = None,
+                       model_name: str = EMBEDDING_MODEL_NAME) -> Dict[str, Any]:
+    """
+    Build a vector index from product embeddings.
+
+    Args:
+        embeddings_data: Tuples (product_id, embedding, metadata) as returned by
+                         create_product_embeddings()
+        directory: Index directory; an existing index in it is replaced
+        lists: Number of IVF lists, 0 for exact search only
+               (default: square root of the vector count from IVF_MIN_VECTORS vectors on)
+        model_name: Embedding model the vectors were created with
+
+    Returns:
+        The manifest of the new index
+    """
+    ids, metadata, vectors = [], [], []
+    for product_id, embedding, product_metadata in embeddings_data:
+        ids.append(str(product_id))
+        metadata.append(json.dumps(product_metadata, ensure_ascii=False))
+        vectors.append(np.asarray(embedding, dtype=np.float32))
+    dimension = len(vectors[0]) if vectors else 0
+    vectors = _normalize(np.vstack(vectors)) if vectors else np.zeros((0, 0), dtype=np.float32)
+
+    if lists is None:
+        lists = default_list_count(len(vectors))
+    lists = min(lists, len(vectors))
+    if lists > 0:
+        centroids = train_ivf(vectors, lists)
+        assignment = assign_lists(vectors, centroids)
+        order = np.argsort(assignment, kind='stable')
+        counts = np.bincount(assignment, minlength=lists)
+    else:
+        centroids = np.zeros((0, dimension), dtype=np.float32)
+        order = np.arange(len(vectors))
+        counts = np.zeros(0, dtype=np.int64)
+    offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(counts)
+
+    os.makedirs(directory, exist_ok=True)
+    manifest_path = os.path.join(directory, MANIFEST_FILENAME)
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+    save_array(os.path.join(directory, 'vectors.npy'), vectors[order].astype(np.float32))
+    save_array(os.path.join(directory, 'list_offsets.npy'), offsets)
+    save_array(os.path.join(directory, 'centroids.npy'), centroids.astype(np.float32))
+    write_arrow(os.path.join(directory, 'metadata.arrow'), pa.table({
+        'id': pa.array([ids[i] for i in order], pa.string()),
+        'metadata': pa.array([metadata[i] for i in order], pa.string()),
+    }))
+
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'generation': uuid.uuid4().hex,
+        'model': model_name,
+        'dimension': dimension,
+        'vectors': len(vectors),
+        'lists': lists,
+        'built_at': datetime.now().isoformat(),
+    }
+    write_manifest(manifest_path, manifest)
+    return manifest
+
+
+def iter_snapshot_embeddings(snapshot_dir: str,
+                             lang: Optional[str] = 'pl') -> Iterable[Tuple[str, List[float], Dict[str, Any]]]:
+    """
+    Embed the products of a catalog snapshot in the given language (None: all languages)
+    chunk by chunk with create_product_embeddings().
+    """
+    chunk = []
+    for document in iter_snapshot_documents(snapshot_dir, SNAPSHOT_FIELDS, lang=lang):
+        chunk.append(document)
+        if len(chunk) >= EMBEDDING_CHUNK_SIZE:
+            yield from create_product_embeddings(chunk)
+            chunk = []
+    if chunk:
+        yield from create_product_embeddings(chunk)
+
+
+class VectorIndex:
+    """
+    Read-only vector index built by build_vector_index().
+
+    The files are memory-mapped when the index is first searched (or by load()).
+    An index can be searched by threads concurrently.
+    """
+
+    def __init__(self, directory: str = DEFAULT_INDEX_DIR):
+        """
+        Args:
+            directory: Index directory
+        """
+        self.directory = directory
+        self.manifest = None
+        self._lock = threading.Lock()
+
+    @property
+    def generation(self) -> str:
+        """Identifier of the build of the index."""
+        self.load()
+        return self.manifest['generation']
+
+    def load(self) -> None:
+        """
+        Memory-map the index files if not done yet.
+
+        Raises:
+            FileNotFoundError: If the directory has no complete index
+        """
+        with self._lock:
+            if self.manifest is not None:
+                return
+            manifest_path = os.path.join(self.directory, MANIFEST_FILENAME)
+            if not os.path.exists(manifest_path):
+                raise FileNotFoundError(f"No vector index manifest in '{self.directory}'")
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            self._vectors = np.load(os.path.join(self.directory, 'vectors.npy'), mmap_mode='r')
+            self._offsets = np.load(os.path.join(self.directory, 'list_offsets.npy'), mmap_mode='r')
+            self._centroids = np.load(os.path.join(self.directory, 'centroids.npy'))
+            self._metadata = open_arrow(os.path.join(self.directory, 'metadata.arrow'))
+            self.manifest = manifest
+
+    def query(self, vector: Sequence[float], top_k: int = 10, exact: bool = False,
+              nprobe: int = DEFAULT_NPROBE) -> List[Tuple[str, float, Dict[str, Any]]]:
+        """
+        Find the vectors most similar to a query vector.
+
+        Args:
+            vector: Query embedding
+            top_k: Number of results
+            exact: Compare with every vector even if the index has IVF lists
+            nprobe: Number of IVF lists scanned by an approximate search
+
+        Returns:
+            Tuples (vector_id, cosine similarity, metadata), most similar first; ties are
+            ordered by position in the index
+        """
+        self.load()
+        if top_k <= 0 or len(self._vectors) == 0:
+            return []
+        query = _normalize(np.asarray(vector, dtype=np.float32))
+        if exact or len(self._centroids) == 0:
+            rows = None
+            scores = self._vectors @ query
+        else:
+            probes = np.argsort(-(self._centroids @ query), kind='stable')[:max(1, nprobe)]
+            rows = np.concatenate([np.arange(self._offsets[probe], self._offsets[probe + 1]) for probe in probes])
+            scores = self._vectors[rows] @ query
+
+        if len(scores) > top_k:
+            candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+        else:
+            candidates = np.arange(len(scores))
+        positions = candidates if rows is None else rows[candidates]
+        order = np.lexsort((positions, -scores[candidates]))
+        positions, best_scores = positions[order], scores[candidates][order]
+
+        table = self._metadata.take(pa.array(positions, pa.int64())).to_pydict()
+        return [(vector_id, float(score), json.loads(metadata))
+                for vector_id, score, metadata in zip(table['id'], best_scores.tolist(), table['metadata'])]
+
+
+_vector_indexes = {}  # Directory -> opened index, shared by all threads
+_vector_indexes_lock = threading.Lock()
+
+
+def get_vector_index(directory: str = None) -> VectorIndex:
+    """
+    Return a shared, loaded vector index.
+
+    Args:
+        directory: Index directory (default: LOCAL_VECTOR_INDEX_DIR environment variable
+                   or 'vector_index')
+
+    Raises:
+        FileNotFoundError: If the directory has no complete index
+    """
+    directory = directory or os.getenv('LOCAL_VECTOR_INDEX_DIR', DEFAULT_INDEX_DIR)
+    with _vector_indexes_lock:
+        index = _vector_indexes.get(directory)
+        if index is None:
+            index = VectorIndex(directory)
+            index.load()
+            _vector_indexes[directory] = index
+        return index
+
+
+def close_vector_indexes() -> None:
+    """Forget the shared vector indexes; a later call maps the files again."""
+    with _vector_indexes_lock:
+        _vector_indexes.clear()
+
+
+def query_vector_index(search_string: str, top_k: int = 10, directory: str = None) -> List[Dict[str, Any]]:
+    """
+    Search the local vector index for similar products, like query_pinecone().
+
+    Args:
+        search_string: The search query string
+        top_k: Number of top results to return
+        directory: Index directory (default: see get_vector_index())
+
+    Returns:
+        List of search results shaped like the results of search_pinecone()
+
+    Raises:
+        FileNotFoundError: If the index does not exist
+        ValueError: If the index was built with another embedding model
+        ImportError: If the SentenceTransformers package is not installed
+    """
+    index = get_vector_index(directory)
+    if index.manifest['model'] != EMBEDDING_MODEL_NAME:
+        raise ValueError(f"Vector index '{index.directory}' was built with {index.manifest['model']}, "
+                         f"not {EMBEDDING_MODEL_NAME}")
+
+    formatted_search_string = format_search_string(search_string)
+    exact = os.getenv('LOCAL_VECTOR_EXACT', 'false').lower() in ('true', '1', 'yes', 'on')
+    nprobe = int(os.getenv('LOCAL_VECTOR_NPROBE', str(DEFAULT_NPROBE)))
+    matches = index.query(embed_query(formatted_search_string), top_k, exact=exact, nprobe=nprobe)
+    return [build_search_result(vector_id, score, metadata) for vector_id, score, metadata in matches]
+
+
+def search_vector_index(search_string: str, top_k: int = 10, directory: str = None) -> List[Dict[str, Any]]:
+    """
+    Search the local vector index for similar products, like search_pinecone().
+
+    Returns:
+        List of search results, empty if the search failed
+    """
+    try:
+        return query_vector_index(search_string, top_k, directory)
+    except ImportError as e:
+        print(f"Error: Required package not installed. {e}")
+        return []
+    except Exception as e:
+        print(f"Error searching the local vector index: {e}")
+        return []
+
+
+def benchmark(index: VectorIndex, vectors: np.ndarray, top_k: int = 10,
+              nprobe: int = DEFAULT_NPROBE) -> Dict[str, Dict[str, Any]]:
+    """
+    Time exact and approximate searches for query vectors and measure the recall of the
+    approximate search against the exact one.
+
+    Args:
+        index: Vector index
+        vectors: Query vectors
+        top_k: Number of results per query
+        nprobe: Number of IVF lists scanned by the approximate search
+
+    Returns:
+        Latency summary per mode in milliseconds; the approximate mode also holds its recall
+    """
+    recorders = {'exact': LatencyRecorder(), 'ivf': LatencyRecorder()}
+    found, expected = 0, 0
+    for vector in vectors:
+        results = {}
+        for mode, recorder in recorders.items():
+            started = time.perf_counter()
+            results[mode] = index.query(vector, top_k, exact=(mode == 'exact'), nprobe=nprobe)
+            recorder.record(time.perf_counter() - started)
+        exact_ids = {vector_id for vector_id, _, _ in results['exact']}
+        found += len(exact_ids & {vector_id for vector_id, _, _ in results['ivf']})
+        expected += len(exact_ids)
+    summaries = {mode: recorder.summary() for mode, recorder in recorders.items()}
+    summaries['ivf']['recall'] = round(found / expected, 4) if expected else None
+    return summaries
+
+
+def main():
+    """Main function to build or benchmark the local vector index."""
+    parser = argparse.ArgumentParser(description='Local vector index of the product embeddings')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help='Embed the catalog snapshot and build the index')
+    build_parser.add_argument('--snapshot', default='catalog_snapshot', help='Catalog snapshot directory')
+    build_parser.add_argument('--lang', default='pl', help='Language of the indexed products (default: pl)')
+    build_parser.add_argument('--output', default=os.getenv('LOCAL_VECTOR_INDEX_DIR', DEFAULT_INDEX_DIR),
+                              help=f'Index directory (default: LOCAL_VECTOR_INDEX_DIR or {DEFAULT_INDEX_DIR})')
+    build_parser.add_argument('--lists', type=int, default=None,
+                              help=f'Number of IVF lists, 0 for exact search only (default: square root of '
+                                   f'the vector count from {IVF_MIN_VECTORS} vectors on)')
+
+    benchmark_parser = subparsers.add_parser('benchmark', help='Compare exact and IVF search latency and recall')
+    benchmark_parser.add_argument('queries', help='File with one search string per line')
+    benchmark_parser.add_argument('--index', default=os.getenv('LOCAL_VECTOR_INDEX_DIR', DEFAULT_INDEX_DIR),
+                                  help=f'Index directory (default: LOCAL_VECTOR_INDEX_DIR or {DEFAULT_INDEX_DIR})')
+    benchmark_parser.add_argument('--nprobe', type=int, default=DEFAULT_NPROBE, help='IVF lists scanned per query')
+
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'build':
+            started = time.perf_counter()
+            manifest = build_vector_index(iter_snapshot_embeddings(args.snapshot, args.lang), args.output, args.lists)
+            print(f"Indexed {manifest['vectors']} vectors in {manifest['lists']} IVF lists into "
+                  f"'{args.output}' in {time.perf_counter() - started:.1f}s")
+        else:
+            with open(args.queries, 'r', encoding='utf-8') as f:
+                queries = [line.strip() for line in f if line.strip()]
+            vectors = [embed_query(format_search_string(query)) for query in queries]
+            for mode, summary in benchmark(VectorIndex(args.index), vectors, nprobe=args.nprobe).items():
+                recall = f", recall {summary['recall']}" if 'recall' in summary else ''
+                print(f"{mode}: {summary['count']} queries, mean {summary['mean_ms']} ms, "
+                      f"p50 {summary['p50_ms']} ms, p95 {summary['p95_ms']} ms{recall}")
+    except Exception as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()